@@ -0,0 +1,186 @@
+# admission.py - Contrôle d'admission devant les générateurs : rendus simultanés bornés,
+# file d'attente courte avec échéances, refus immédiat (503) quand l'attente estimée est trop longue
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from render_pool import RenderUnavailable, RENDER_POOL_SIZE
+
+# Configuration (modifiable par variables d'environnement)
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1').lower() not in ('0', 'false', 'no', 'non')
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', RENDER_POOL_SIZE or os.cpu_count() or 1))
+ADMISSION_QUEUE_MAX = int(os.environ.get('ADMISSION_QUEUE_MAX', 4 * ADMISSION_MAX_IN_FLIGHT))
+# Échéance par défaut d'une requête (s), sous le timeout des workers gunicorn (30 s) ;
+# le client peut la raccourcir avec l'en-tête X-Request-Timeout
+ADMISSION_DEADLINE = float(os.environ.get('ADMISSION_DEADLINE', 25))
+
+# Coût d'un rendu (s) : fixe + par article, mesuré sur un cœur ; corrigé ensuite
+# par le rapport entre durées observées et estimées (machine plus lente, pool...)
+COUTS_RENDU = {
+    'pdf': (0.010, 0.0011),
+    'docx': (0.020, 0.00002),  # tableau écrit directement en XML au-delà de 100 articles
+}
+_LISSAGE = 0.2  # poids d'une nouvelle mesure dans la correction
+
+
+class AdmissionRejected(RenderUnavailable):
+    """Attente estimée au-delà de l'échéance du client, ou file d'attente pleine"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CostModel:
+    """Durée estimée d'un rendu d'après le format et le nombre d'articles"""
+
+    def __init__(self, costs=COUTS_RENDU):
+        self.costs = costs
+        self._scale = {output_format: 1.0 for output_format in costs}
+        self._lock = threading.Lock()
+
+    def _base_estimate(self, output_format, items):
+        fixed, per_item = self.costs.get(output_format, self.costs['pdf'])
+        return fixed + per_item * items
+
+    def estimate(self, output_format, items):
+        return self._scale.get(output_format, 1.0) * self._base_estimate(output_format, items)
+
+    def observe(self, output_format, items, duration):
+        """Corriger les estimations avec la durée réelle d'un rendu"""
+        if output_format not in self._scale:
+            return
+        ratio = min(10.0, max(0.1, duration / self._base_estimate(output_format, items)))
+        with self._lock:
+            self._scale[output_format] += _LISSAGE * (ratio - self._scale[output_format])
+
+
+class AdmissionTicket:
+    """Place réservée pour un rendu ; release() la rend (une seule fois)"""
+    __slots__ = ('controller', 'output_format', 'items', 'cost', 'started')
+
+    def __init__(self, controller, output_format, items, cost):
+        self.controller = controller
+        self.output_format = output_format
+        self.items = items
+        self.cost = cost
+        self.started = None
+
+    def release(self):
+        if self.started is not None:
+            self.controller._release(self)
+            self.started = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Au plus max_in_flight rendus à la fois ; les suivants attendent dans une file FIFO
+    d'au plus max_queue places. Une requête est refusée tout de suite si le travail
+    en cours et en attente (estimé d'après le nombre d'articles) ne lui laisse pas le
+    temps d'être rendue avant son échéance, et quitte la file si l'échéance approche.
+    """
+
+    def __init__(self, max_in_flight=ADMISSION_MAX_IN_FLIGHT, max_queue=ADMISSION_QUEUE_MAX,
+                 cost_model=None, enabled=ADMISSION_ENABLED):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.cost_model = cost_model or CostModel()
+        self.enabled = enabled
+
+        self._cond = threading.Condition()
+        self._running = set()
+        self._waiting = deque()
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'expired': 0}
+
+    @property
+    def in_flight(self):
+        return len(self._running)
+
+    @property
+    def queued(self):
+        return len(self._waiting)
+
+    def _estimated_wait(self, now, ahead):
+        """Attente estimée (s) derrière les rendus en cours et les ahead premiers de la file"""
+        if len(self._running) + ahead < self.max_in_flight:
+            return 0.0
+        work = sum(max(0.0, ticket.cost - (now - ticket.started)) for ticket in self._running)
+        work += sum(ticket.cost for ticket in list(self._waiting)[:ahead])
+        return work / self.max_in_flight
+
+    def _reject(self, wait, reason):
+        self.stats['rejected'] += 1
+        raise AdmissionRejected(reason, max(1, math.ceil(wait)))
+
+    def admit(self, output_format, items, deadline=None):
+        """
+        Réserver une place pour un rendu de items articles, à terminer avant deadline
+        (time.monotonic()). Retourne un AdmissionTicket ; lève AdmissionRejected.
+        """
+        ticket = AdmissionTicket(self, output_format, items, self.cost_model.estimate(output_format, items))
+        if not self.enabled:
+            ticket.started = time.monotonic()
+            return ticket
+        if deadline is None:
+            deadline = time.monotonic() + ADMISSION_DEADLINE
+
+        with self._cond:
+            now = time.monotonic()
+            wait = self._estimated_wait(now, len(self._waiting))
+            if wait > 0:
+                if len(self._waiting) >= self.max_queue:
+                    self._reject(wait, "File d'attente des rendus pleine, réessayez plus tard")
+                if now + wait + ticket.cost > deadline:
+                    self._reject(wait, f"Serveur chargé : attente estimée {wait:.1f} s, réessayez plus tard")
+
+                self.stats['queued'] += 1
+                self._waiting.append(ticket)
+                try:
+                    while self._waiting[0] is not ticket or len(self._running) >= self.max_in_flight:
+                        # Plus le temps d'être rendu avant l'échéance : on quitte la file
+                        remaining = deadline - ticket.cost - time.monotonic()
+                        if remaining <= 0:
+                            self.stats['expired'] += 1
+                            self._reject(self._estimated_wait(time.monotonic(), self._waiting.index(ticket)),
+                                         "Serveur chargé : échéance dépassée dans la file d'attente")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting.remove(ticket)
+                    # La tête de file a changé
+                    self._cond.notify_all()
+
+            ticket.started = time.monotonic()
+            self._running.add(ticket)
+            self.stats['admitted'] += 1
+        return ticket
+
+    def _release(self, ticket):
+        duration = time.monotonic() - ticket.started
+        with self._cond:
+            self._running.discard(ticket)
+            self._cond.notify_all()
+        self.cost_model.observe(ticket.output_format, ticket.items, duration)
+
+
+def request_deadline(headers, default=ADMISSION_DEADLINE):
+    """Échéance (time.monotonic()) : X-Request-Timeout en secondes, plafonné à ADMISSION_DEADLINE"""
+    timeout = default
+    value = headers.get('X-Request-Timeout')
+    if value:
+        try:
+            timeout = min(default, max(0.0, float(value)))
+        except ValueError:
+            pass
+    return time.monotonic() + timeout
+
+
+# Instance partagée (routes de rendu interactives)
+admission = AdmissionController()
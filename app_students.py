@@ -1,63 +1,198 @@
 # app_students.py - Application Flask pour les élèves
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, make_response, stream_with_context
 from flask_cors import CORS
-from datetime import datetime, timedelta
-import uuid
+from datetime import date, datetime, timedelta
 import os
-from functools import wraps
-from models import Devis, DevisItem, Facture
-from pdf_generator_students import generate_student_style_devis, generate_pdf_facture
-from pdf_generator_students import generate_student_style_devis, generate_pdf_facture, generate_pdf_devis
+from io import BytesIO
+from functools import lru_cache, wraps
+from types import GeneratorType
+from payloads import THEMES_DISPONIBLES, PayloadError, build_devis, build_facture, resolve_theme, resolve_format
+from rendering import render_bytes, render_cached, FORMATS_SUPPORTES, MIMETYPES
+from rendering import download_name as make_download_name
+from storage import storage
+from jobs import job_manager, public_view, JobQueueFull, TERMINE, ECHEC
+from batch import BatchError, NDJSON_MIMETYPES, iter_documents, iter_ndjson, render_batch, stream_zip
+from render_cache import document_fingerprint, render_cache
+from render_pool import RenderUnavailable, render_pool
+from admission import admission, request_deadline
+from logo_cache import logo_cache
+from asset_fetcher import asset_fetcher
+from logo_images import logo_variants
+from json_provider import install_json_provider
+from auth import AuthError, RateLimited, api_auth
+import metrics
+from metrics import stage
 # Créer l'application Flask
 app = Flask(__name__)
 CORS(app)  # Permet les requêtes depuis d'autres domaines
 
-# Configuration
-app.config['UPLOAD_FOLDER'] = 'generated'
+# JSON : orjson si installé (request.json, jsonify), sinon module standard
+install_json_provider(app)
+
+# Configuration (dossier utilisé uniquement pour l'archivage, voir ARCHIVE_GENERATED)
+app.config['UPLOAD_FOLDER'] = storage.root
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Thèmes disponibles
-THEMES_DISPONIBLES = ['bleu', 'vert', 'rouge', 'violet', 'orange', 'noir']
-# Clés API (à stocker dans des variables d'environnement en production)
-# On accepte plusieurs noms possibles pour être tolérant (API_KEY_1 ou X_API_KEY_1)
-API_KEY_1 = (
-    os.environ.get('API_KEY_1')
-    or os.environ.get('X_API_KEY_1')
-    or 'your-secret-key-1-here'
-)
-API_KEY_2 = (
-    os.environ.get('API_KEY_2')
-    or os.environ.get('X_API_KEY_2')
-    or 'your-secret-key-2-here'
-)
+# Taille maximale du corps des requêtes (octets), vérifiée avant la lecture du JSON
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', 4 * 1024 * 1024))  # un document
+BATCH_MAX_BODY_BYTES = int(os.environ.get('BATCH_MAX_BODY_BYTES', 64 * 1024 * 1024))  # /api/batch
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_BODY_BYTES, BATCH_MAX_BODY_BYTES)
+
+# Routes qui acceptent un lot de documents (limite BATCH_MAX_BODY_BYTES)
+ROUTES_LOT = {'create_batch'}
+
+# Rétention bornée du dossier generated/ (âge et quota, nettoyage en arrière-plan)
+storage.start_sweeper()
+
+# Métriques lues au moment de l'export (GET /metrics) : aucun coût entre deux lectures
+metrics.register_cache_stats('devis_render_cache', "Cache des documents rendus", render_cache.stats,
+                             hit_keys=['memory_hits', 'disk_hits'], miss_keys=['misses'])
+metrics.register_cache_stats('devis_logo_cache', "Cache des logos", logo_cache.stats,
+                             hit_keys=['memory_hits', 'disk_hits', 'revalidated'], miss_keys=['downloads', 'errors'])
+metrics.register_cache_stats('devis_logo_variants', "Logos normalisés", logo_variants.stats,
+                             hit_keys=['memory_hits', 'disk_hits'], miss_keys=['normalized'])
+metrics.register_cache_stats('devis_asset_fetcher', "Téléchargements de ressources (logos)", asset_fetcher.stats,
+                             hit_keys=['coalesced'], miss_keys=['downloads'])
+metrics.registry.register(metrics.Gauge('devis_render_pool_in_flight', "Rendus en cours ou en attente dans le pool",
+                                        callback=lambda: render_pool.in_flight))
+metrics.registry.register(metrics.Gauge('devis_render_pool_recycled_total',
+                                        "Redémarrages du pool après des rendus dépassés",
+                                        callback=lambda: render_pool.stats['recycled'], kind='counter'))
+
+metrics.registry.register(metrics.Gauge('devis_admission_queued', "Rendus en attente d'admission",
+                                        callback=lambda: admission.queued))
+metrics.registry.register(metrics.Gauge('devis_admission_rejected_total', "Rendus refusés par le contrôle d'admission (503)",
+                                        callback=lambda: admission.stats['rejected'], kind='counter'))
+metrics.registry.register(metrics.Gauge('devis_api_rate_limited_total', "Requêtes refusées (débit du client)",
+                                        callback=lambda: api_auth.stats['rate_limited'], kind='counter'))
+metrics.registry.register(metrics.Gauge('devis_api_concurrency_limited_total',
+                                        "Requêtes refusées (requêtes simultanées du client)",
+                                        callback=lambda: api_auth.stats['concurrency_limited'], kind='counter'))
+
+def body_limit(endpoint):
+    """Taille maximale du corps pour cette route"""
+    return BATCH_MAX_BODY_BYTES if endpoint in ROUTES_LOT else MAX_BODY_BYTES
+
+@app.before_request
+def check_body_size():
+    """Refuser un corps trop volumineux (413) avant qu'il ne soit lu et décodé"""
+    if request.method not in ('POST', 'PUT', 'PATCH'):
+        return None
+    limit = body_limit(request.endpoint)
+    length = request.content_length
+    if length is None and request.endpoint not in ROUTES_LOT:
+        # Corps envoyé par morceaux : lu au plus jusqu'à la limite de la route
+        data = read_body_limited(limit)
+        if data is None:
+            return body_too_large(limit)
+        return None
+    if length is not None and length > limit:
+        return body_too_large(limit)
+    return None
+
+def read_body_limited(limit, chunk_size=64 * 1024):
+    """
+    Lire le corps par morceaux, sans dépasser limit + 1 octets : None s'il est trop
+    volumineux, sinon ses octets, gardés pour request.get_json() / get_data()
+    """
+    chunks = []
+    size = 0
+    while True:
+        chunk = request.stream.read(min(chunk_size, limit + 1 - size))
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    data = b''.join(chunks)
+    # Même cache que request.get_data(cache=True)
+    request._cached_data = data
+    return data
+
+def body_too_large_message(limit):
+    return f"❌ Requête trop volumineuse (maximum {limit // 1024} Ko)"
+
+def body_too_large(limit):
+    return jsonify({"error": body_too_large_message(limit)}), 413
+
+def static_json(payload):
+    """Corps JSON sérialisé une fois (réponses statiques)"""
+    return app.json.response(payload).get_data()
+
+def json_response(body, status=200):
+    return app.response_class(body, status=status, mimetype=app.json.mimetype)
 
 def require_api_keys(f):
-    """Décorateur pour vérifier les 2 clés API"""
+    """
+    Décorateur pour vérifier les 2 clés API, puis les limites du client
+    (débit, requêtes simultanées) ; la place est libérée une fois la réponse envoyée
+    """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # On accepte X-API-Key-1 ou X_API_KEY_1 dans les headers
-        key1 = request.headers.get('X-API-Key-1') or request.headers.get('X_API_KEY_1')
-        key2 = request.headers.get('X-API-Key-2') or request.headers.get('X_API_KEY_2')
-
-        # Debug temporaire (tu peux enlever après)
-        # print("HEADERS:", dict(request.headers))
-        # print("API_KEY_1 attendu:", API_KEY_1)
-        # print("API_KEY_2 attendu:", API_KEY_2)
-
-        if not key1 or not key2:
-            return jsonify({"error": "Clés API manquantes"}), 401
+        try:
+            g.api_client = api_auth.authenticate(request.headers)
+            release = api_auth.acquire(g.api_client)
+        except AuthError as e:
+            return jsonify({"error": str(e)}), 401
+        except RateLimited as e:
+            return rate_limited(e)
 
-        if key1 != API_KEY_1 or key2 != API_KEY_2:
-            return jsonify({"error": "Clés API invalides"}), 401
-        
-        return f(*args, **kwargs)
+        try:
+            response = make_response(f(*args, **kwargs))
+        except BaseException:
+            release()
+            raise
+        if isinstance(response.response, GeneratorType):
+            # Réponse produite pendant l'envoi (/api/batch) : place gardée jusqu'à la fin
+            response.call_on_close(release)
+        else:
+            release()
+        return response
     return decorated_function
 
-@app.route('/', methods=['GET'])
-def documentation():
+def rate_limited(error):
+    """Réponse 429 quand un client dépasse ses limites"""
+    response = jsonify({"error": f"⏳ {error}"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def send_document(document, doc_type, theme='bleu', output_format='pdf', download_name=None):
     """
-    Page d'accueil avec la documentation de l'API
+    Rendre (ou reprendre du cache) un document et l'envoyer.
+    L'empreinte des données sert d'ETag : un client qui renvoie If-None-Match reçoit un 304.
     """
+    etag = document_fingerprint(document, doc_type, theme, output_format)
+    
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    
+    data, etag, cache_status = render_cached(document, doc_type, theme, output_format, key=etag,
+                                             deadline=request_deadline(request.headers))
+    
+    with stage('send_file'):
+        response = send_file(
+            BytesIO(data),
+            mimetype=MIMETYPES[output_format],
+            as_attachment=True,
+            download_name=download_name or make_download_name(doc_type, document.numero, theme, output_format),
+            etag=etag
+        )
+    response.headers['X-Render-Cache'] = cache_status
+    return response
+
+def render_unavailable(error):
+    """Réponse 503 quand le pool de rendu est saturé ou trop lent"""
+    response = jsonify({"error": f"⏳ {error}"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def documentation_payload():
+    """Documentation de l'API (servie sur /)"""
     doc = {
         "titre": "🧾 API Générateur de Devis - Version Formation",
         "description": "API simple pour générer des devis PDF avec un design professionnel",
@@ -67,10 +202,15 @@ def documentation():
         "endpoints": {
             "GET /": "Cette documentation",
             "GET /health": "Vérifier l'état de l'API",
+            "GET /metrics": "Métriques au format Prometheus (durées par étape, caches, rendus en cours)",
             "GET /api/themes": "Obtenir la liste des thèmes disponibles",
             "GET /api/exemple": "Obtenir un exemple de données JSON",
             "POST /api/devis": "Créer un devis personnalisé",
             "POST /api/facture": "Créer une facture personnalisée",
+            "POST /api/batch": "Créer plusieurs devis/factures (liste JSON ou NDJSON), réponse ZIP",
+            "POST /api/jobs": "Lancer un rendu asynchrone (réponse immédiate avec l'identifiant)",
+            "GET /api/jobs/<id>": "État et progression d'un rendu asynchrone",
+            "GET /api/jobs/<id>/file": "Télécharger le document d'un rendu asynchrone terminé",
             "POST /api/test": "Générer un devis de test rapide",
             "GET /api/test-auth": "Tester l'authentification avec les clés API"
         },
@@ -81,6 +221,7 @@ def documentation():
                 "X-API-Key-1": "Votre première clé API",
                 "X-API-Key-2": "Votre deuxième clé API"
             },
+            "limites": "Débit et requêtes simultanées limités par client : au-delà, réponse 429 avec Retry-After",
             "exemple_curl_auth": """
 curl -X GET http://localhost:5000/api/test-auth \\
   -H "X-API-Key-1: your-secret-key-1-here" \\
@@ -147,7 +288,17 @@ fetch('/api/devis', {
         "note": "📚 Parfait pour apprendre le développement d'API avec Flask !"
     }
     
-    return jsonify(doc), 200
+    return doc
+
+# Documentation statique : sérialisée une fois au démarrage
+DOCUMENTATION_JSON = static_json(documentation_payload())
+
+@app.route('/', methods=['GET'])
+def documentation():
+    """
+    Page d'accueil avec la documentation de l'API
+    """
+    return json_response(DOCUMENTATION_JSON)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -161,6 +312,13 @@ def health_check():
         "version": "1.0.0"
     }), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Exporter les métriques du processus au format texte Prometheus"""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"error": "❌ Métriques désactivées"}), 404
+    return Response(metrics.expose(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/themes', methods=['GET'])
 def get_themes():
     """Retourner la liste des thèmes disponibles"""
@@ -169,16 +327,14 @@ def get_themes():
         "theme_par_defaut": "bleu"
     }), 200
 
-@app.route('/api/exemple', methods=['GET'])
-def get_exemple():
-    """
-    Retourner un exemple complet de données JSON pour créer un devis
-    """
+@lru_cache(maxsize=1)
+def exemple_json(jour):
+    """Exemple de données (dates du jour donné), sérialisé une fois par jour"""
     exemple = {
-        "numero": f"FORM-{datetime.now().strftime('%Y%m%d')}-001",
-        "date_emission": datetime.now().strftime('%d/%m/%Y'),
-        "date_expiration": (datetime.now() + timedelta(days=30)).strftime('%d/%m/%Y'),
-        "date_debut": (datetime.now() + timedelta(days=7)).strftime('%d/%m/%Y'),
+        "numero": f"FORM-{jour.strftime('%Y%m%d')}-001",
+        "date_emission": jour.strftime('%d/%m/%Y'),
+        "date_expiration": (jour + timedelta(days=30)).strftime('%d/%m/%Y'),
+        "date_debut": (jour + timedelta(days=7)).strftime('%d/%m/%Y'),
         
         # Informations fournisseur (modifiables)
         "fournisseur_nom": "Formation Web Academy",
@@ -243,7 +399,7 @@ def get_exemple():
         ]
     }
     
-    return jsonify({
+    return static_json({
         "message": "📝 Exemple de données pour créer un devis",
         "exemple_donnees": exemple,
         "total_exemple": sum((item['prix_unitaire'] * item['quantite']) - item.get('remise', 0) for item in exemple['items']),
@@ -255,7 +411,14 @@ def get_exemple():
             "formats_disponibles": ["pdf", "docx"],
             "note": "💡 Les autres champs ont des valeurs par défaut si non spécifiés"
         }
-    }), 200
+    })
+
+@app.route('/api/exemple', methods=['GET'])
+def get_exemple():
+    """
+    Retourner un exemple complet de données JSON pour créer un devis
+    """
+    return json_response(exemple_json(date.today()))
 
 @app.route('/api/devis', methods=['POST'])
 @require_api_keys
@@ -265,101 +428,27 @@ def create_devis():
     """
     try:
         # Récupérer les données JSON
-        data = request.json
-        
-        if not data:
-            return jsonify({"error": "❌ Aucune donnée reçue"}), 400
+        with stage('parse_json'):
+            data = request.json
         
-        # Récupérer et valider le thème
-        theme = data.get('theme', 'bleu')
-        if theme not in THEMES_DISPONIBLES:
-            theme = 'bleu'  # fallback vers le thème par défaut
-        
-        # Valider les champs obligatoires
-        if not data.get('client_nom'):
-            return jsonify({"error": "❌ Le champ 'client_nom' est obligatoire"}), 400
-        
-        if not data.get('items') or len(data.get('items', [])) == 0:
-            return jsonify({"error": "❌ Au moins un article est requis"}), 400
-        
-        # Créer l'objet devis avec toutes les options modifiables
-        devis = Devis(
-            numero=data.get('numero', f"D-{datetime.now().year}-{str(uuid.uuid4())[:3]}"),
-            date_emission=data.get('date_emission', datetime.now().strftime('%d/%m/%Y')),
-            date_expiration=data.get('date_expiration', (datetime.now() + timedelta(days=30)).strftime('%d/%m/%Y')),
-            
-            # Informations fournisseur (tout modifiable)
-            fournisseur_nom=data.get('fournisseur_nom', 'Infinytia'),
-            fournisseur_adresse=data.get('fournisseur_adresse', '61 Rue De Lyon'),
-            fournisseur_ville=data.get('fournisseur_ville', '75012 Paris, FR'),
-            fournisseur_email=data.get('fournisseur_email', 'contact@infinytia.com'),
-            fournisseur_siret=data.get('fournisseur_siret', '93968736400017'),
-            fournisseur_telephone=data.get('fournisseur_telephone', '+33 1 23 45 67 89'),
-            
-            # Informations client
-            client_nom=data.get('client_nom'),
-            client_adresse=data.get('client_adresse', ''),
-            client_ville=data.get('client_ville', ''),
-            client_siret=data.get('client_siret', ''),
-            client_tva=data.get('client_tva', ''),
-            client_telephone=data.get('client_telephone', ''),
-            client_email=data.get('client_email', ''),
-            
-            # Logo de l'entreprise
-            logo_url=data.get('logo_url', ''),
-            
-            # Informations bancaires (modifiables)
-            banque_nom=data.get('banque_nom', 'BNP Paribas'),
-            banque_iban=data.get('banque_iban', 'FR76 3000 4008 2800 0123 4567 890'),
-            banque_bic=data.get('banque_bic', 'BNPAFRPPXXX'),
-            
-            # Conditions de paiement
-            conditions_paiement=data.get('conditions_paiement', 'Paiement à 30 jours'),
-            penalites_retard=data.get('penalites_retard', 'En cas de retard de paiement, une pénalité de 3 fois le taux d\'intérêt légal sera appliquée'),
-            
-            # Texte personnalisé
-            texte_intro=data.get('texte_intro', ''),
-            texte_conclusion=data.get('texte_conclusion', 'Nous restons à votre disposition pour toute information complémentaire.'),
-            
-            # Articles
-            items=[]
-        )
-        
-        # Ajouter les articles
-        for item_data in data.get('items', []):
-            item = DevisItem(
-                description=item_data.get('description'),
-                details=item_data.get('details', []),
-                quantite=item_data.get('quantite', 1),
-                prix_unitaire=item_data.get('prix_unitaire', 0),
-                tva_taux=item_data.get('tva_taux', 20),
-                remise=item_data.get('remise', 0)
-            )
-            devis.items.append(item)
-        
-        # Calculer les totaux
-        devis.calculate_totals()
+        # Créer l'objet devis (valeurs par défaut, validation, totaux)
+        with stage('build_document'):
+            devis = build_devis(data)
+        theme = resolve_theme(data)
         
         # Format de sortie demandé
-        output_format = data.get('format', 'pdf').lower()
+        output_format = resolve_format(data)
         
-        if output_format == 'pdf':
-            filename = generate_pdf_devis(devis, theme=theme)
-            mimetype = 'application/pdf'
-        elif output_format == 'docx':
-            filename = generate_docx_devis(devis, theme=theme)
-            mimetype = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        else:
+        if output_format not in FORMATS_SUPPORTES:
             return jsonify({"error": "Format non supporté. Utilisez 'pdf' ou 'docx'"}), 400
         
-        # Retourner le fichier
-        return send_file(
-            filename,
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=f"devis_{devis.numero}_{theme}.{output_format}"
-        )
+        # Rendu en mémoire (ou cache si la même requête a déjà été servie)
+        return send_document(devis, 'devis', theme, output_format)
         
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    except RenderUnavailable as e:
+        return render_unavailable(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -368,94 +457,114 @@ def create_devis():
 def create_facture():
     """Créer une nouvelle facture avec les données reçues"""
     try:
-        data = request.json
+        with stage('parse_json'):
+            data = request.json
         
-        # Récupérer et valider le thème
-        theme = data.get('theme', 'bleu')
-        if theme not in THEMES_DISPONIBLES:
-            theme = 'bleu'  # fallback vers le thème par défaut
-        
-        # Créer l'objet facture
-        facture = Facture(
-            numero=data.get('numero', f"F-{datetime.now().year}-{str(uuid.uuid4())[:3]}"),
-            date_emission=data.get('date_emission', datetime.now().strftime('%d/%m/%Y')),
-            date_echeance=data.get('date_echeance', (datetime.now() + timedelta(days=30)).strftime('%d/%m/%Y')),
-            
-            # Informations fournisseur
-            fournisseur_nom=data.get('fournisseur_nom', 'Infinytia'),
-            fournisseur_adresse=data.get('fournisseur_adresse', '61 Rue De Lyon'),
-            fournisseur_ville=data.get('fournisseur_ville', '75012 Paris, FR'),
-            fournisseur_email=data.get('fournisseur_email', 'contact@infinytia.com'),
-            fournisseur_siret=data.get('fournisseur_siret', '93968736400017'),
-            fournisseur_telephone=data.get('fournisseur_telephone', '+33 1 23 45 67 89'),
-            
-            # Informations client
-            client_nom=data.get('client_nom'),
-            client_adresse=data.get('client_adresse'),
-            client_ville=data.get('client_ville'),
-            client_siret=data.get('client_siret'),
-            client_tva=data.get('client_tva'),
-            client_telephone=data.get('client_telephone', ''),
-            client_email=data.get('client_email', ''),
-            
-            # Logo de l'entreprise
-            logo_url=data.get('logo_url', ''),
-            
-            # Informations bancaires
-            banque_nom=data.get('banque_nom', 'BNP Paribas'),
-            banque_iban=data.get('banque_iban', 'FR76 3000 4008 2800 0123 4567 890'),
-            banque_bic=data.get('banque_bic', 'BNPAFRPPXXX'),
-            
-            # Conditions et statut
-            conditions_paiement=data.get('conditions_paiement', 'Paiement à réception'),
-            penalites_retard=data.get('penalites_retard', 'En cas de retard de paiement, une pénalité de 3 fois le taux d\'intérêt légal sera appliquée'),
-            statut_paiement=data.get('statut_paiement', 'En attente'),
-            
-            # Références
-            numero_commande=data.get('numero_commande', ''),
-            reference_devis=data.get('reference_devis', ''),
-            
-            # Articles
-            items=[]
-        )
-        
-        # Ajouter les articles
-        for item_data in data.get('items', []):
-            item = DevisItem(
-                description=item_data.get('description'),
-                details=item_data.get('details', []),
-                quantite=item_data.get('quantite', 1),
-                prix_unitaire=item_data.get('prix_unitaire', 0),
-                tva_taux=item_data.get('tva_taux', 20),
-                remise=item_data.get('remise', 0)
-            )
-            facture.items.append(item)
-        
-        # Calculer les totaux
-        facture.calculate_totals()
+        # Créer l'objet facture (valeurs par défaut, totaux)
+        with stage('build_document'):
+            facture = build_facture(data)
+        theme = resolve_theme(data)
         
         # Format de sortie
-        output_format = data.get('format', 'pdf').lower()
+        output_format = resolve_format(data)
         
-        if output_format == 'pdf':
-            filename = generate_pdf_facture(facture, theme=theme)
-            mimetype = 'application/pdf'
-        elif output_format == 'docx':
-            filename = generate_docx_facture(facture, theme=theme)
-            mimetype = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        else:
+        if output_format not in FORMATS_SUPPORTES:
             return jsonify({"error": "Format non supporté"}), 400
         
-        return send_file(
-            filename,
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=f"facture_{facture.numero}_{theme}.{output_format}"
-        )
+        # Rendu en mémoire (ou cache si la même requête a déjà été servie)
+        return send_document(facture, 'facture', theme, output_format)
         
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    except RenderUnavailable as e:
+        return render_unavailable(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/batch', methods=['POST'])
+@require_api_keys
+def create_batch():
+    """
+    Générer plusieurs devis/factures en une seule requête.
+    Corps : liste JSON (ou NDJSON, un document par ligne) ; chaque document peut
+    préciser "type" ("devis" ou "facture"), "theme" et "format".
+    Réponse : archive ZIP envoyée au fur et à mesure des rendus.
+    """
+    try:
+        if request.mimetype in NDJSON_MIMETYPES:
+            payloads = iter_ndjson(request.stream)
+        else:
+            payloads = iter_documents(request.get_json(silent=True))
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return Response(
+        stream_with_context(stream_zip(render_batch(payloads))),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f"attachment; filename=lot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"}
+    )
+
+@app.route('/api/jobs', methods=['POST'])
+@require_api_keys
+def create_job():
+    """
+    Lancer un rendu asynchrone : la réponse (202) contient l'identifiant du travail.
+    Corps : mêmes données que /api/devis ou /api/facture, avec "type" et
+    optionnellement "callback_url" (notifiée par POST à la fin du rendu).
+    """
+    try:
+        data = request.get_json(silent=True)
+        callback_url = data.get('callback_url') if isinstance(data, dict) else None
+        job_id = job_manager.submit(data, callback_url=callback_url)
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        response = jsonify({"error": f"⏳ {e}"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    response = jsonify(public_view(job_manager.get(job_id)))
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job_id}"
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@require_api_keys
+def get_job(job_id):
+    """Consulter l'état et la progression d'un travail"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "❌ Travail inconnu"}), 404
+    return jsonify(public_view(job)), 200
+
+@app.route('/api/jobs/<job_id>/file', methods=['GET'])
+@require_api_keys
+def get_job_file(job_id):
+    """Télécharger le document produit par un travail terminé"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "❌ Travail inconnu"}), 404
+    if job['statut'] == ECHEC:
+        return jsonify({"error": f"❌ Le rendu a échoué: {job['erreur']}"}), 500
+    if job['statut'] != TERMINE:
+        response = jsonify({"error": "⏳ Document pas encore prêt", "statut": job['statut'],
+                            "progression": job['progression']})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    
+    path = job_manager.result_path(job)
+    if path is None:
+        return jsonify({"error": "❌ Document expiré, relancez le travail"}), 410
+    
+    return send_file(
+        os.path.abspath(path),
+        mimetype=MIMETYPES[job['format']],
+        as_attachment=True,
+        download_name=job['nom_fichier']
+    )
+
 @app.route('/api/test', methods=['POST'])
 @require_api_keys
 def test_devis():
@@ -473,11 +582,14 @@ def test_devis():
             "fournisseur_adresse": "123 Rue de Test",
             "fournisseur_ville": "75001 Paris, France",
             "fournisseur_email": "test@formation.fr",
+            "fournisseur_siret": "12345678901234",
             
             "client_nom": "Client de Test",
             "client_adresse": "456 Avenue du Test",
             "client_ville": "69000 Lyon",
             "client_email": "client.test@exemple.com",
+            "client_siret": "98765432109876",
+            "client_tva": "FR98765432109",
             
             "banque_nom": "Banque de Test",
             "banque_iban": "FR76 1234 5678 9012 3456 7890 123",
@@ -501,55 +613,23 @@ def test_devis():
             ]
         }
         
-        # Créer l'objet devis
-        devis = Devis(
-            numero=test_data['numero'],
-            date_emission=test_data['date_emission'],
-            date_expiration=test_data['date_expiration'],
-            
-            fournisseur_nom=test_data['fournisseur_nom'],
-            fournisseur_adresse=test_data['fournisseur_adresse'],
-            fournisseur_ville=test_data['fournisseur_ville'],
-            fournisseur_email=test_data['fournisseur_email'],
-            fournisseur_siret='12345678901234',
-            
-            client_nom=test_data['client_nom'],
-            client_adresse=test_data['client_adresse'],
-            client_ville=test_data['client_ville'],
-            client_siret='98765432109876',
-            client_tva='FR98765432109',
-            
-            banque_nom=test_data['banque_nom'],
-            banque_iban=test_data['banque_iban'],
-            banque_bic=test_data['banque_bic']
-        )
+        # Créer l'objet devis (même schéma que /api/devis)
+        devis = build_devis(test_data)
         
-        # Ajouter les articles
-        for item_data in test_data['items']:
-            item = DevisItem(
-                description=item_data['description'],
-                prix_unitaire=item_data['prix_unitaire'],
-                quantite=item_data['quantite'],
-                tva_taux=item_data.get('tva_taux', 20),
-                remise=item_data.get('remise', 0)
-            )
-            devis.items.append(item)
-        
-        # Calculer les totaux
-        devis.calculate_totals()
-        
-        # Générer le PDF
-        filename = generate_pdf_devis(devis)
+        # Générer le PDF en mémoire
+        data = render_bytes(devis, 'devis', deadline=request_deadline(request.headers))
         
         print(f"🧪 Devis de test généré : {test_data['numero']}")
         
         return send_file(
-            filename,
-            mimetype='application/pdf',
+            BytesIO(data),
+            mimetype=MIMETYPES['pdf'],
             as_attachment=True,
             download_name=f"devis_test_{test_data['numero']}.pdf"
         )
         
+    except RenderUnavailable as e:
+        return render_unavailable(e)
     except Exception as e:
         print(f"❌ Erreur test: {str(e)}")
         return jsonify({"error": f"Erreur lors du test: {str(e)}"}), 500
@@ -558,7 +638,7 @@ def test_devis():
 @require_api_keys
 def test_auth():
     """Endpoint pour tester l'authentification"""
-    return jsonify({"message": "Authentification réussie!"}), 200
+    return jsonify({"message": "Authentification réussie!", "client": g.api_client.name}), 200
 
 # Gestionnaire d'erreur 404
 @app.errorhandler(404)
@@ -566,9 +646,14 @@ def not_found(error):
     return jsonify({
         "error": "❌ Endpoint non trouvé",
         "message": "Consultez la documentation sur '/' pour voir les endpoints disponibles",
-        "endpoints_disponibles": ["/", "/health", "/api/exemple", "/api/devis", "/api/test", "/api/test-auth", "/api/themes", "/api/facture"]
+        "endpoints_disponibles": ["/", "/health", "/metrics", "/api/exemple", "/api/devis", "/api/test", "/api/test-auth", "/api/themes", "/api/facture", "/api/batch", "/api/jobs"]
     }), 404
 
+# Gestionnaire d'erreur 413 (corps au-delà de MAX_CONTENT_LENGTH) : limite de la route
+@app.errorhandler(413)
+def request_too_large(error):
+    return body_too_large(body_limit(request.endpoint))
+
 # Gestionnaire d'erreur 500
 @app.errorhandler(500)
 def internal_error(error):
@@ -0,0 +1,317 @@
+# asgi_students.py - Variante ASGI de l'API : un processus sert des centaines de requêtes en parallèle
+# Lancement : uvicorn asgi_students:app --host 0.0.0.0 --port $PORT
+#
+# /api/devis et /api/facture sont traitées en asynchrone : le logo est téléchargé sans
+# bloquer (httpx, connexions réutilisées, limite par hôte) et le rendu part dans un
+# exécuteur. Les autres routes sont celles de app_students (Flask), exécutées dans des threads.
+import asyncio
+import os
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+import httpx
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.datastructures import Headers
+from werkzeug.http import dump_options_header, parse_etags, quote_etag
+
+from app_students import app as flask_app, body_too_large_message, MAX_BODY_BYTES
+from auth import AuthError, RateLimited, api_auth
+from admission import request_deadline
+from asset_fetcher import AssetTooLarge, asset_fetcher
+from logo_cache import logo_cache, LOGO_FETCH_TIMEOUT
+from metrics import stage
+from payloads import PayloadError, build_devis, build_facture, resolve_theme, resolve_format
+from render_cache import document_fingerprint, render_cache
+from render_pool import RenderUnavailable, RENDER_POOL_SIZE, RENDER_QUEUE_MAX
+from rendering import render_bytes, FORMATS_SUPPORTES, MIMETYPES, download_name
+
+# Configuration (modifiable par variables d'environnement)
+# Threads de rendu : ils attendent le pool de processus (ou rendent eux-mêmes s'il est désactivé)
+ASGI_RENDER_THREADS = int(os.environ.get('ASGI_RENDER_THREADS',
+                                         (RENDER_POOL_SIZE + RENDER_QUEUE_MAX) or (os.cpu_count() or 1)))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 16))  # routes Flask
+ASGI_INLINE_BODY_MAX = int(os.environ.get('ASGI_INLINE_BODY_MAX', 64 * 1024))  # octets
+LOGO_FETCH_MAX_CONNECTIONS = int(os.environ.get('LOGO_FETCH_MAX_CONNECTIONS', 100))
+LOGO_FETCH_PER_HOST = int(os.environ.get('LOGO_FETCH_PER_HOST', 8))
+
+_render_executor = ThreadPoolExecutor(max_workers=max(1, ASGI_RENDER_THREADS), thread_name_prefix='asgi-render')
+_wsgi_executor = ThreadPoolExecutor(max_workers=max(1, ASGI_WSGI_THREADS), thread_name_prefix='asgi-wsgi')
+
+# Routes servies en asynchrone : (méthode, chemin) -> (type de document, constructeur)
+ROUTES_ASYNC = {
+    ('POST', '/api/devis'): ('devis', build_devis),
+    ('POST', '/api/facture'): ('facture', build_facture),
+}
+
+
+class AsyncLogoFetcher:
+    """
+    Téléchargement asynchrone des logos vers le cache partagé (logo_cache) :
+    connexions HTTP réutilisées, au plus per_host téléchargements par hôte, et un
+    seul téléchargement pour plusieurs requêtes qui attendent le même logo.
+    """
+
+    def __init__(self, max_connections=LOGO_FETCH_MAX_CONNECTIONS, per_host=LOGO_FETCH_PER_HOST,
+                 timeout=LOGO_FETCH_TIMEOUT):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.timeout = timeout
+        # Créés dans la boucle d'événements du serveur, au premier téléchargement
+        self._client = None
+        self._hosts = {}
+        self._pending = {}
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,  # comme requests.get
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        slot = self._hosts.get(host)
+        if slot is None:
+            slot = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def get(self, url):
+        """Octets du logo (ou None), téléchargé si le cache n'a pas de version fraîche"""
+        content, stale, must_fetch = logo_cache.lookup(url)
+        if not must_fetch:
+            return content
+
+        task = self._pending.get(url)
+        if task is None:
+            task = self._pending[url] = asyncio.ensure_future(self._download(url, stale))
+            task.add_done_callback(lambda _: self._pending.pop(url, None))
+        # shield : une requête annulée n'interrompt pas le téléchargement partagé
+        return await asyncio.shield(task)
+
+    async def _download(self, url, stale):
+        try:
+            async with self._host_slot(url):
+                async with self._get_client().stream('GET', url, headers=logo_cache.revalidation_headers(stale)) as response:
+                    content = await self._read_limited(url, response)
+            fetched = logo_cache.store_response(url, response.status_code, content, response.headers, stale)
+        except Exception as e:
+            print(f"Erreur lors du téléchargement du logo: {e}")
+            fetched = None
+        return logo_cache.finish_fetch(url, stale, fetched)
+
+    async def _read_limited(self, url, response):
+        """Lecture en flux, abandonnée au-delà de la taille maximale (comme asset_fetcher)"""
+        max_bytes = asset_fetcher.max_bytes
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise AssetTooLarge(f"Ressource trop volumineuse ({int(declared)} octets) : {url}")
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > max_bytes:
+                raise AssetTooLarge(f"Ressource trop volumineuse (> {max_bytes} octets) : {url}")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class _FlaskInstance(WsgiToAsgiInstance):
+    # asgiref exécute par défaut toutes les requêtes WSGI dans un seul thread :
+    # ici elles se répartissent sur un pool (comme gunicorn --threads)
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+                                 thread_sensitive=False, executor=_wsgi_executor)
+
+
+class _FlaskBridge(WsgiToAsgi):
+    """Application Flask exposée en ASGI"""
+
+    async def __call__(self, scope, receive, send):
+        await _FlaskInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+def _content_disposition(filename):
+    """En-tête Content-Disposition identique à celui de send_file"""
+    try:
+        filename.encode('ascii')
+        options = {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        options = {'filename': simple, 'filename*': "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")}
+    return dump_options_header('attachment', options)
+
+
+def _parse_and_build(body, builder):
+    """Décoder le JSON et construire le document (valeurs par défaut, validation, totaux)"""
+    with stage('parse_json'):
+        try:
+            data = flask_app.json.loads(body) if body else None
+        except ValueError:
+            raise PayloadError("❌ JSON invalide")
+    with stage('build_document'):
+        document = builder(data)
+    return data, document
+
+
+def _render_and_store(document, doc_type, theme, output_format, key, deadline):
+    """Rendu (pool de processus ou processus courant) puis mise en cache ; exécuté dans un thread"""
+    data = render_bytes(document, doc_type, theme, output_format, deadline=deadline)
+    render_cache.put(key, data)
+    return data
+
+
+class BodyTooLarge(Exception):
+    """Corps de requête au-delà de MAX_BODY_BYTES (réponse 413)"""
+
+
+async def _read_body(receive, headers, limit=MAX_BODY_BYTES):
+    """Lire le corps de la requête ; lève BodyTooLarge dès que la limite est dépassée"""
+    declared = headers.get('Content-Length')
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise BodyTooLarge(body_too_large_message(limit))
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge(body_too_large_message(limit))
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def _send(send, status, body=b'', headers=()):
+    raw_headers = [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers]
+    raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, payload, status, headers=()):
+    body = (flask_app.json.dumps(payload, separators=(',', ':')) + '\n').encode('utf-8')
+    await _send(send, status, body, [('Content-Type', 'application/json'), *headers])
+
+
+class DevisASGI:
+    """Application ASGI : routes de rendu asynchrones, le reste délégué à Flask"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi = _FlaskBridge(wsgi_app)
+        self.logos = AsyncLogoFetcher()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        if scope['type'] == 'http':
+            route = ROUTES_ASYNC.get((scope['method'], scope['path']))
+            if route is not None:
+                await self._render_route(route, scope, receive, send)
+                return
+
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.logos.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _render_route(self, route, scope, receive, send):
+        doc_type, builder = route
+        headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+        # Même politique CORS que Flask-CORS (toutes origines)
+        cors = [('Access-Control-Allow-Origin', '*')] if 'Origin' in headers else []
+
+        try:
+            release = api_auth.acquire(api_auth.authenticate(headers))
+        except AuthError as e:
+            await _send_json(send, {"error": str(e)}, 401, cors)
+            return
+        except RateLimited as e:
+            await _send_json(send, {"error": f"⏳ {e}"}, 429, [('Retry-After', e.retry_after), *cors])
+            return
+
+        try:
+            await self._render_document(doc_type, builder, headers, cors, receive, send)
+        finally:
+            release()
+
+    async def _render_document(self, doc_type, builder, headers, cors, receive, send):
+        deadline = request_deadline(headers)
+        loop = asyncio.get_running_loop()
+        try:
+            body = await _read_body(receive, headers)
+            # Gros documents : décodage et construction hors de la boucle d'événements
+            if len(body) > ASGI_INLINE_BODY_MAX:
+                data, document = await loop.run_in_executor(_render_executor, _parse_and_build, body, builder)
+            else:
+                data, document = _parse_and_build(body, builder)
+            theme = resolve_theme(data)
+            output_format = resolve_format(data)
+
+            if output_format not in FORMATS_SUPPORTES:
+                await _send_json(send, {"error": "Format non supporté. Utilisez 'pdf' ou 'docx'"}, 400, cors)
+                return
+
+            etag = document_fingerprint(document, doc_type, theme, output_format)
+            if parse_etags(headers.get('If-None-Match')).contains(etag):
+                await _send(send, 304, headers=[('ETag', quote_etag(etag)), *cors])
+                return
+
+            content = render_cache.get(etag)
+            cache_status = 'hit'
+            if content is None:
+                cache_status = 'miss'
+                # Le logo est déjà en cache quand le rendu (bloquant) démarre
+                if document.logo_url:
+                    with stage('logo_fetch'):
+                        await self.logos.get(document.logo_url)
+                content = await loop.run_in_executor(_render_executor, _render_and_store,
+                                                     document, doc_type, theme, output_format, etag, deadline)
+        except BodyTooLarge as e:
+            await _send_json(send, {"error": str(e)}, 413, cors)
+            return
+        except PayloadError as e:
+            await _send_json(send, {"error": str(e)}, 400, cors)
+            return
+        except RenderUnavailable as e:
+            await _send_json(send, {"error": f"⏳ {e}"}, 503, [('Retry-After', e.retry_after), *cors])
+            return
+        except Exception as e:
+            await _send_json(send, {"error": str(e)}, 500, cors)
+            return
+
+        await _send(send, 200, content, [
+            ('Content-Type', MIMETYPES[output_format]),
+            ('Content-Disposition', _content_disposition(download_name(doc_type, document.numero, theme, output_format))),
+            ('ETag', quote_etag(etag)),
+            ('X-Render-Cache', cache_status),
+            *cors,
+        ])
+
+
+app = DevisASGI(flask_app)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi_students:app', host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,148 @@
+# asset_fetcher.py - Téléchargement des ressources distantes (logos) : session partagée et limites
+import os
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configuration (modifiable par variables d'environnement)
+ASSET_MAX_BYTES = int(os.environ.get('ASSET_MAX_BYTES', 5 * 1024 * 1024))
+ASSET_FETCH_TIMEOUT = float(os.environ.get('ASSET_FETCH_TIMEOUT', os.environ.get('LOGO_FETCH_TIMEOUT', 10)))
+ASSET_PER_HOST = int(os.environ.get('ASSET_PER_HOST', 8))  # connexions simultanées par hôte
+ASSET_POOL_HOSTS = int(os.environ.get('ASSET_POOL_HOSTS', 32))  # hôtes gardés en keep-alive
+ASSET_RETRIES = int(os.environ.get('ASSET_RETRIES', 2))
+
+_CHUNK_SIZE = 16 * 1024  # petits morceaux : le délai total est vérifié entre deux lectures
+
+# Réponse complète d'un téléchargement
+FetchResult = namedtuple('FetchResult', ['status_code', 'content', 'headers'])
+
+
+class AssetFetchError(Exception):
+    """Téléchargement refusé ou abandonné (hôte saturé, trop lent)"""
+
+
+class AssetTooLarge(AssetFetchError):
+    """La ressource dépasse ASSET_MAX_BYTES"""
+
+
+class _InFlight:
+    """Téléchargement en cours, attendu par les requêtes identiques"""
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AssetFetcher:
+    """
+    Client HTTP partagé par les générateurs :
+    - une session requests (connexions keep-alive réutilisées, nouvelles tentatives
+      sur erreur de connexion ou 502/503/504)
+    - au plus per_host téléchargements simultanés par hôte
+    - lecture en flux, abandonnée dès que max_bytes ou le délai total est dépassé
+    - les demandes identiques simultanées partagent un seul téléchargement
+    """
+
+    def __init__(self, max_bytes=ASSET_MAX_BYTES, timeout=ASSET_FETCH_TIMEOUT,
+                 per_host=ASSET_PER_HOST, pool_hosts=ASSET_POOL_HOSTS, retries=ASSET_RETRIES):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.per_host = per_host
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_hosts,
+            pool_maxsize=per_host,
+            max_retries=Retry(total=retries, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                              allowed_methods=frozenset(['GET']), raise_on_status=False)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._hosts = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+        self.stats = {'downloads': 0, 'coalesced': 0, 'too_large': 0}
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+        return host, slot
+
+    def coalesce(self, key, func):
+        """
+        Exécuter func() une seule fois pour toutes les demandes simultanées de même clé :
+        les autres appelants attendent et reçoivent le même résultat (ou la même erreur).
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlight()
+
+        if not leader:
+            self.stats['coalesced'] += 1
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def fetch(self, url, headers=None, timeout=None):
+        """Télécharger url (GET) ; retourne un FetchResult, lève AssetFetchError ou une erreur requests"""
+        headers = headers or {}
+        key = (url, tuple(sorted(headers.items())))
+        return self.coalesce(key, lambda: self._download(url, headers, timeout or self.timeout))
+
+    def _download(self, url, headers, timeout):
+        host, slot = self._host_slot(url)
+        if not slot.acquire(timeout=timeout):
+            raise AssetFetchError(f"Trop de téléchargements en cours vers {host}")
+        try:
+            deadline = time.monotonic() + timeout
+            with self.session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+                declared = response.headers.get('Content-Length')
+                if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                    self.stats['too_large'] += 1
+                    raise AssetTooLarge(f"Ressource trop volumineuse ({int(declared)} octets) : {url}")
+
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        self.stats['too_large'] += 1
+                        raise AssetTooLarge(f"Ressource trop volumineuse (> {self.max_bytes} octets) : {url}")
+                    if time.monotonic() > deadline:
+                        raise AssetFetchError(f"Téléchargement trop lent (> {timeout:g} s) : {url}")
+                    chunks.append(chunk)
+
+                self.stats['downloads'] += 1
+                return FetchResult(response.status_code, b''.join(chunks), response.headers)
+        finally:
+            slot.release()
+
+
+# Instance partagée (logos des générateurs PDF et DOCX)
+asset_fetcher = AssetFetcher()
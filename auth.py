@@ -0,0 +1,354 @@
+# auth.py - Authentification par clés API : table de clés hachées, limite de débit et de
+# rendus simultanés par client (un intégrateur ne peut pas monopoliser les workers)
+#
+#   python auth.py empreinte CLE_1 CLE_2   (empreinte à mettre dans API_KEYS_FILE)
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import fcntl  # verrou inter-processus (Linux / macOS)
+except ImportError:  # Windows : compteurs propres à chaque processus
+    fcntl = None
+
+# Clés API (à stocker dans des variables d'environnement en production)
+# On accepte plusieurs noms possibles pour être tolérant (API_KEY_1 ou X_API_KEY_1)
+API_KEY_1 = (
+    os.environ.get('API_KEY_1')
+    or os.environ.get('X_API_KEY_1')
+    or 'your-secret-key-1-here'
+)
+API_KEY_2 = (
+    os.environ.get('API_KEY_2')
+    or os.environ.get('X_API_KEY_2')
+    or 'your-secret-key-2-here'
+)
+
+# Configuration (modifiable par variables d'environnement)
+API_KEYS = os.environ.get('API_KEYS', '')  # clients supplémentaires (liste JSON)
+API_KEYS_FILE = os.environ.get('API_KEYS_FILE', '')  # idem dans un fichier, relu s'il change
+API_KEYS_RELOAD = float(os.environ.get('API_KEYS_RELOAD', 5))  # secondes entre deux vérifications
+# Limites par défaut des clients de API_KEYS / API_KEYS_FILE (0 = pas de limite)
+API_RATE_LIMIT = float(os.environ.get('API_RATE_LIMIT', 20))  # requêtes par seconde
+API_RATE_BURST = float(os.environ.get('API_RATE_BURST', 2 * API_RATE_LIMIT))
+API_MAX_CONCURRENT = int(os.environ.get('API_MAX_CONCURRENT', 2 * (os.cpu_count() or 1)))
+# Client 'defaut' (API_KEY_1 / API_KEY_2) : sans limite, comme avant les clients multiples,
+# sauf API_DEFAULT_LIMITS=1 (mêmes limites que les autres clients)
+API_DEFAULT_LIMITS = os.environ.get('API_DEFAULT_LIMITS', '0').lower() in ('1', 'true', 'yes', 'oui')
+# API_LIMITS_SHARED=1 : compteurs communs à tous les workers gunicorn (fichier mappé en mémoire)
+API_LIMITS_SHARED = os.environ.get('API_LIMITS_SHARED', '0').lower() in ('1', 'true', 'yes', 'oui')
+API_LIMITS_FILE = os.environ.get('API_LIMITS_FILE', os.path.join('cache', 'api_limits.bin'))
+API_LIMITS_SLOTS = int(os.environ.get('API_LIMITS_SLOTS', 1024))
+
+# Client défini par ses deux clés ; seule l'empreinte (sha256) est gardée en mémoire
+ApiClient = namedtuple('ApiClient', ['name', 'digest', 'rate', 'burst', 'max_concurrent'])
+
+
+class AuthError(Exception):
+    """Clés absentes ou invalides (réponse 401)"""
+
+
+class RateLimited(Exception):
+    """Limite de débit ou de rendus simultanés du client atteinte (réponse 429 + Retry-After)"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def key_digest(key_1, key_2):
+    """Empreinte d'une paire de clés"""
+    return hashlib.sha256(f"{key_1}\n{key_2}".encode('utf-8')).digest()
+
+
+def make_client(name, key_1=None, key_2=None, digest=None, rate=API_RATE_LIMIT,
+                burst=API_RATE_BURST, max_concurrent=API_MAX_CONCURRENT):
+    """Client à partir de ses clés, ou de leur empreinte (hexadécimale ou octets)"""
+    if digest is None:
+        if not key_1 or not key_2:
+            raise ValueError(f"Client '{name}' : 'cle_1' et 'cle_2' (ou 'empreinte') sont obligatoires")
+        digest = key_digest(key_1, key_2)
+    elif isinstance(digest, str):
+        digest = bytes.fromhex(digest)
+    if len(digest) != hashlib.sha256().digest_size:
+        raise ValueError(f"Client '{name}' : empreinte sha256 invalide")
+    return ApiClient(name, digest, float(rate), float(burst or rate), int(max_concurrent))
+
+
+def parse_clients(entries):
+    """
+    Clients décrits en JSON :
+    [{"nom": "erp", "cle_1": "...", "cle_2": "...", "debit": 5, "rafale": 10, "simultanes": 2},
+     {"nom": "site", "empreinte": "<sha256 hexadécimal>"}]
+    """
+    if not isinstance(entries, list):
+        raise ValueError("La liste des clients doit être un tableau JSON")
+    clients = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('nom'):
+            raise ValueError("Chaque client doit être un objet avec un 'nom'")
+        # Débit propre au client : rafale de 2 secondes par défaut
+        rate = entry.get('debit', API_RATE_LIMIT)
+        burst = entry.get('rafale', 2 * rate if 'debit' in entry else API_RATE_BURST)
+        clients.append(make_client(
+            entry['nom'], entry.get('cle_1'), entry.get('cle_2'), entry.get('empreinte'),
+            rate=rate, burst=burst, max_concurrent=entry.get('simultanes', API_MAX_CONCURRENT)
+        ))
+    return clients
+
+
+class ApiKeyTable:
+    """
+    Clients autorisés, indexés par l'empreinte de leurs clés : la paire API_KEY_1 / API_KEY_2
+    ('defaut'), puis API_KEYS et API_KEYS_FILE. Le fichier est relu quand il change ;
+    une table invalide est ignorée et la précédente reste en place.
+    """
+
+    def __init__(self, path=API_KEYS_FILE, env_clients=API_KEYS, reload_interval=API_KEYS_RELOAD):
+        self.path = path
+        self.env_clients = env_clients
+        self.reload_interval = reload_interval
+
+        self._clients = {}
+        self._extra = {}  # clients ajoutés par le code (add), gardés au rechargement
+        self._mtime = None
+        self._next_check = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def _read_clients(self):
+        if API_DEFAULT_LIMITS:
+            clients = [make_client('defaut', API_KEY_1, API_KEY_2)]
+        else:
+            clients = [make_client('defaut', API_KEY_1, API_KEY_2, rate=0, burst=0, max_concurrent=0)]
+        if self.env_clients:
+            clients.extend(parse_clients(json.loads(self.env_clients)))
+        if self.path:
+            with open(self.path, 'rb') as f:
+                clients.extend(parse_clients(json.load(f)))
+        return clients
+
+    def load(self):
+        """(Re)lire la table ; retourne le nombre de clients"""
+        try:
+            mtime = os.stat(self.path).st_mtime if self.path else None
+            clients = self._read_clients()
+        except (OSError, ValueError) as e:
+            print(f"Erreur lors du chargement des clés API: {e}")
+            return len(self._clients)
+        table = {client.digest: client for client in clients}
+        table.update(self._extra)
+        self._clients, self._mtime = table, mtime
+        return len(table)
+
+    def add(self, client):
+        with self._lock:
+            self._extra[client.digest] = client
+            self._clients = {**self._clients, client.digest: client}
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if not self.path or now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            try:
+                changed = os.stat(self.path).st_mtime != self._mtime
+            except OSError:
+                changed = self._mtime is not None
+            if changed:
+                self.load()
+
+    def lookup(self, key_1, key_2):
+        """
+        Client correspondant à la paire de clés, ou None. Les clés ne sont jamais comparées
+        directement : la recherche se fait sur leur empreinte sha256, que l'appelant ne
+        peut pas orienter octet par octet (le temps de réponse ne renseigne pas sur les clés).
+        """
+        self._maybe_reload()
+        return self._clients.get(key_digest(key_1, key_2))
+
+
+# --- Limites par client -----------------------------------------------------
+
+def _admit(state, client, now):
+    """
+    Seau à jetons et rendus simultanés : met à jour state [jetons, date, en cours].
+    Retourne None si la requête est admise, sinon (limite atteinte, délai conseillé en s).
+    """
+    tokens, updated, in_flight = state
+    if client.max_concurrent > 0 and in_flight >= client.max_concurrent:
+        return 'simultanes', 1
+    if client.rate > 0:
+        tokens = min(client.burst, tokens + max(0.0, now - updated) * client.rate)
+        if tokens < 1:
+            state[0], state[1] = tokens, now
+            return 'debit', (1 - tokens) / client.rate
+        tokens -= 1
+    state[:] = [tokens, now, in_flight + 1]
+    return None
+
+
+class LocalLimiter:
+    """Compteurs propres au processus"""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client):
+        with self._lock:
+            state = self._states.get(client.digest)
+            if state is None:
+                state = self._states[client.digest] = [client.burst, time.monotonic(), 0]
+            return _admit(state, client, time.monotonic())
+
+    def release(self, client):
+        with self._lock:
+            self._states[client.digest][2] -= 1
+
+
+class SharedLimiter:
+    """
+    Compteurs communs aux workers gunicorn : table de taille fixe dans un fichier mappé
+    en mémoire, protégée par un verrou flock (section critique de quelques microsecondes).
+    """
+
+    # Empreinte (16 premiers octets), jetons, date (time.time), rendus en cours
+    _SLOT = struct.Struct('<16sddi4x')
+    # Compteur de rendus en cours d'un client inactif depuis ce délai : remis à zéro
+    # (worker arrêté pendant un rendu)
+    STALE_AFTER = 300
+
+    def __init__(self, path=API_LIMITS_FILE, slots=API_LIMITS_SLOTS):
+        self.slots = slots
+        size = self._SLOT.size * slots
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._lock = threading.Lock()
+
+    def _find(self, key):
+        """Position de l'emplacement du client (sondage linéaire), ou None si la table est pleine"""
+        start = int.from_bytes(key[:4], 'little') % self.slots
+        for i in range(self.slots):
+            offset = ((start + i) % self.slots) * self._SLOT.size
+            slot_key = self._map[offset:offset + 16]
+            if slot_key == key or slot_key == bytes(16):
+                return offset
+        return None
+
+    def _update(self, client, func):
+        key = client.digest[:16]
+        with self._lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                offset = self._find(key)
+                if offset is None:
+                    print("Erreur : table des limites API pleine (augmentez API_LIMITS_SLOTS)")
+                    return None
+                now = time.time()
+                slot_key, tokens, updated, in_flight = self._SLOT.unpack_from(self._map, offset)
+                if slot_key != key:
+                    tokens, updated, in_flight = client.burst, now, 0
+                elif in_flight and now - updated > self.STALE_AFTER:
+                    in_flight = 0
+                state = [tokens, updated, in_flight]
+                result = func(state, now)
+                self._SLOT.pack_into(self._map, offset, key, *state)
+                return result
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def acquire(self, client):
+        return self._update(client, lambda state, now: _admit(state, client, now))
+
+    def release(self, client):
+        def decrement(state, now):
+            state[2] = max(0, state[2] - 1)
+        self._update(client, decrement)
+
+
+def make_limiter(shared=API_LIMITS_SHARED):
+    if shared and fcntl is not None:
+        try:
+            return SharedLimiter()
+        except OSError as e:
+            print(f"Erreur lors de l'ouverture des compteurs partagés, compteurs locaux: {e}")
+    return LocalLimiter()
+
+
+class ApiAuth:
+    """Vérification des clés puis des limites du client, pour Flask et le serveur ASGI"""
+
+    def __init__(self, keys, limiter):
+        self.keys = keys
+        self.limiter = limiter
+        self.stats = {'rate_limited': 0, 'concurrency_limited': 0}
+
+    def authenticate(self, headers):
+        """Client authentifié par les en-têtes X-API-Key-1 / X-API-Key-2 ; lève AuthError"""
+        # On accepte X-API-Key-1 ou X_API_KEY_1 dans les headers
+        key_1 = headers.get('X-API-Key-1') or headers.get('X_API_KEY_1')
+        key_2 = headers.get('X-API-Key-2') or headers.get('X_API_KEY_2')
+        if not key_1 or not key_2:
+            raise AuthError("Clés API manquantes")
+        client = self.keys.lookup(key_1, key_2)
+        if client is None:
+            raise AuthError("Clés API invalides")
+        return client
+
+    def acquire(self, client):
+        """
+        Réserver une requête pour le client ; retourne la fonction qui libère sa place
+        (appelable plusieurs fois). Lève RateLimited si une limite est atteinte.
+        """
+        if client.rate <= 0 and client.max_concurrent <= 0:
+            # Client sans limite : rien à compter
+            return _no_release
+        refused = self.limiter.acquire(client)
+        if refused is not None:
+            limit, delay = refused
+            if limit == 'simultanes':
+                self.stats['concurrency_limited'] += 1
+                raise RateLimited(f"Trop de requêtes simultanées pour le client '{client.name}'")
+            self.stats['rate_limited'] += 1
+            raise RateLimited(f"Trop de requêtes pour le client '{client.name}', réessayez plus tard",
+                              max(1, math.ceil(delay)))
+
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                self.limiter.release(client)
+        return release
+
+
+def _no_release():
+    pass
+
+
+# Instance partagée (application Flask et serveur ASGI)
+api_auth = ApiAuth(ApiKeyTable(), make_limiter())
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'empreinte':
+        print(key_digest(sys.argv[2], sys.argv[3]).hex())
+    else:
+        print("Usage : python auth.py empreinte CLE_1 CLE_2")
+        sys.exit(2)
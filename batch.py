@@ -0,0 +1,164 @@
+# batch.py - Génération par lot : plusieurs devis/factures rendus en parallèle, renvoyés en ZIP
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from json_provider import loads
+from logo_cache import get_logo_bytes
+from payloads import BUILDERS, PayloadError, resolve_theme, resolve_format
+from rendering import render_cached, FORMATS_SUPPORTES
+from storage import safe_filename
+
+# Configuration (modifiable par variables d'environnement)
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', min(8, (os.cpu_count() or 1) + 2)))
+BATCH_MAX_DOCUMENTS = int(os.environ.get('BATCH_MAX_DOCUMENTS', 5000))
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl',
+                    'application/x-jsonlines')
+
+
+class BatchError(ValueError):
+    """Lot invalide (format, taille) : renvoyé au client en 400"""
+
+
+def iter_ndjson(stream):
+    """Lire un flux NDJSON ligne par ligne, sans le charger entièrement"""
+    for line_number, line in enumerate(iter(stream.readline, b''), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield loads(line)
+        except ValueError:
+            raise BatchError(f"❌ Ligne {line_number} : JSON invalide")
+
+
+def iter_documents(data):
+    """Accepter une liste JSON ou un objet {"documents": [...]}"""
+    if isinstance(data, dict):
+        data = data.get('documents')
+    if not isinstance(data, list):
+        raise BatchError("❌ Le corps doit être une liste de documents (ou du NDJSON)")
+    return iter(data)
+
+
+def _render_entry(index, payload):
+    """Construire et rendre un document du lot ; retourne (nom dans le ZIP, octets)"""
+    if not isinstance(payload, dict):
+        raise PayloadError("❌ Chaque document doit être un objet JSON")
+
+    doc_type = payload.get('type', 'devis')
+    builder = BUILDERS.get(doc_type)
+    if builder is None:
+        raise PayloadError(f"❌ Type de document inconnu: {doc_type}")
+
+    output_format = resolve_format(payload)
+    if output_format not in FORMATS_SUPPORTES:
+        raise PayloadError("Format non supporté. Utilisez 'pdf' ou 'docx'")
+
+    document = builder(payload)
+    theme = resolve_theme(payload)
+    # Un lot attend une place dans le pool de rendu plutôt que d'échouer
+    data, _, _ = render_cached(document, doc_type, theme, output_format, block=True)
+
+    name = f"{index + 1:05d}_{safe_filename(f'{doc_type}_{document.numero}_{theme}')}.{output_format}"
+    return name, data
+
+
+def render_batch(payloads, workers=BATCH_WORKERS, max_documents=BATCH_MAX_DOCUMENTS):
+    """
+    Rendre les documents d'un lot sur un pool de threads.
+    Produit (index, nom, octets, erreur) dans l'ordre de fin de rendu ; le nombre de
+    rendus en cours est borné, donc un lot NDJSON est consommé au rythme du pool.
+    """
+    max_in_flight = workers * 2
+    seen_logos = set()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as pool:
+        pending = {}
+
+        def drain(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    name, data = future.result()
+                    yield index, name, data, None
+                except Exception as e:
+                    yield index, None, None, str(e)
+
+        try:
+            try:
+                for index, payload in enumerate(payloads):
+                    if index >= max_documents:
+                        raise BatchError(f"❌ Lot limité à {max_documents} documents")
+
+                    # Logo partagé : téléchargé une seule fois pour tout le lot
+                    logo_url = payload.get('logo_url') if isinstance(payload, dict) else None
+                    if logo_url and logo_url not in seen_logos:
+                        seen_logos.add(logo_url)
+                        get_logo_bytes(logo_url)
+
+                    pending[pool.submit(_render_entry, index, payload)] = index
+                    if len(pending) >= max_in_flight:
+                        yield from drain(FIRST_COMPLETED)
+            except BatchError:
+                # Lecture du lot interrompue : les documents déjà lancés sont livrés
+                while pending:
+                    yield from drain(FIRST_COMPLETED)
+                raise
+
+            while pending:
+                yield from drain(FIRST_COMPLETED)
+        except GeneratorExit:
+            # Client déconnecté : inutile de rendre le reste
+            for future in pending:
+                future.cancel()
+            raise
+
+
+class _ChunkSink:
+    """Flux inscriptible non positionnable : zipfile y écrit, on vide au fil de l'eau"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(results):
+    """
+    Produire une archive ZIP morceau par morceau : chaque entrée est envoyée dès
+    que son document est rendu. Les erreurs sont listées dans erreurs.json.
+    """
+    sink = _ChunkSink()
+    errors = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        try:
+            for index, name, data, error in results:
+                if error is not None:
+                    errors.append({'index': index, 'error': error})
+                    continue
+                archive.writestr(name, data)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        except BatchError as e:
+            # Le flux est déjà commencé : on signale l'arrêt dans l'archive
+            errors.append({'index': None, 'error': str(e)})
+
+        if errors:
+            errors.sort(key=lambda e: -1 if e['index'] is None else e['index'])
+            archive.writestr('erreurs.json', json.dumps(errors, ensure_ascii=False, indent=2))
+    yield sink.drain()
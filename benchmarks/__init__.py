@@ -0,0 +1,5 @@
+# benchmarks - Mesures de performance des générateurs et des routes HTTP
+#
+# Lancement depuis la racine du projet :
+#   python -m benchmarks run --output bench.json
+#   python -m benchmarks compare avant.json apres.json
@@ -0,0 +1,157 @@
+# __main__.py - Ligne de commande des benchmarks (python -m benchmarks ...)
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _isolate_state(tmp):
+    """Caches et fichiers générés dans un dossier temporaire (avant tout import de l'application)"""
+    os.environ.setdefault('LOGO_CACHE_DIR', os.path.join(tmp, 'logos'))
+    os.environ.setdefault('RENDER_CACHE_DIR', os.path.join(tmp, 'renders'))
+    os.environ.setdefault('GENERATED_FOLDER', os.path.join(tmp, 'generated'))
+    os.environ.setdefault('JOBS_DB', os.path.join(tmp, 'jobs.sqlite3'))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _print_result(result):
+    if result['kind'] == 'cold':
+        print(f"{result['name']:<60} import {result['import_ms']:>9.1f} ms  "
+              f"1er rendu {result['first_render_ms']:>9.1f} ms  2e {result['second_render_ms']:>9.1f} ms")
+    else:
+        rate = result.get('docs_per_sec') or result.get('requests_per_sec') or 0
+        print(f"{result['name']:<60} p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+              f"p99 {result['p99_ms']:>9.1f} ms  {rate:>8.1f}/s  RSS {result['peak_rss_mb']} Mo")
+
+
+def run(args):
+    from benchmarks.fixtures import ITEM_COUNTS, THEMES
+    from benchmarks.generators import GENERATORS, bench_cold, bench_warm
+    from benchmarks.measure import peak_rss_mb
+    from benchmarks.stub_server import LogoServer
+
+    names = args.generators or list(GENERATORS)
+    item_counts = args.items or ([1, 10, 100] if args.quick else ITEM_COUNTS)
+    themes = args.themes or (['bleu'] if args.quick else THEMES)
+    progress = None if args.silent else _print_result
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'render_pool_size': os.environ.get('RENDER_POOL_SIZE'),
+            'quick': args.quick,
+        },
+        'results': [],
+    }
+
+    with LogoServer() as logo_server:
+        logo_url = '' if args.no_logo else logo_server.url
+        if 'cold' in args.suites:
+            report['results'] += bench_cold(names, logo_url, progress=progress)
+        if 'warm' in args.suites:
+            report['results'] += bench_warm(names, item_counts, themes, logo_url,
+                                            repeat=args.repeat, min_time=args.min_time, progress=progress)
+        if 'routes' in args.suites:
+            from benchmarks.routes import bench_routes
+            from render_pool import render_pool
+            for concurrency in args.concurrency:
+                report['results'] += bench_routes(args.route_repeat, concurrency, logo_url, progress=progress)
+            # Les workers du pool ne sont comptés qu'une fois terminés
+            render_pool.shutdown()
+        report['meta']['logo_requests'] = logo_server.requests
+
+    report['meta']['peak_rss_mb'] = peak_rss_mb()
+    report['meta']['peak_rss_children_mb'] = peak_rss_mb(children=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Résultats écrits dans {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+
+
+def compare(args):
+    """Comparer deux fichiers de résultats (même nom de mesure)"""
+    with open(args.before, encoding='utf-8') as f:
+        before = {r['name']: r for r in json.load(f)['results']}
+    with open(args.after, encoding='utf-8') as f:
+        after = {r['name']: r for r in json.load(f)['results']}
+
+    metric = args.metric
+    regressions = 0
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name].get(metric), after[name].get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        flag = ''
+        if change > args.threshold:
+            flag = '  ⚠️ plus lent'
+            regressions += 1
+        elif change < -args.threshold:
+            flag = '  ✅ plus rapide'
+        print(f"{name:<60} {old:>10.1f} -> {new:>10.1f} ({change:+6.1f} %){flag}")
+
+    only_before, only_after = set(before) - set(after), set(after) - set(before)
+    if only_before or only_after:
+        print(f"Mesures non comparées : {len(only_before)} seulement avant, {len(only_after)} seulement après")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Benchmarks des générateurs de devis / factures")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Lancer les mesures")
+    run_parser.add_argument('--suites', nargs='+', choices=['cold', 'warm', 'routes'],
+                            default=['cold', 'warm', 'routes'])
+    run_parser.add_argument('--generators', nargs='+',
+                            choices=['pdf_devis', 'pdf_facture', 'docx_devis', 'docx_facture'])
+    run_parser.add_argument('--items', nargs='+', type=int, help="Nombres d'articles (défaut: 1 10 100 1000)")
+    run_parser.add_argument('--themes', nargs='+')
+    run_parser.add_argument('--repeat', type=int, default=5, help="Rendus mesurés par cas (à chaud)")
+    run_parser.add_argument('--min-time', type=float, default=0.0, help="Durée minimale par cas (s)")
+    run_parser.add_argument('--route-repeat', type=int, default=20, help="Requêtes par scénario HTTP")
+    run_parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4])
+    run_parser.add_argument('--no-logo', action='store_true', help="Ne pas mesurer les variantes avec logo")
+    run_parser.add_argument('--quick', action='store_true', help="Sous-ensemble rapide (thème bleu, <= 100 articles)")
+    run_parser.add_argument('--silent', action='store_true')
+    run_parser.add_argument('--output', '-o', help="Fichier JSON de résultats")
+
+    compare_parser = commands.add_parser('compare', help="Comparer deux fichiers de résultats")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--metric', default='p50_ms')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="Seuil de variation (%%)")
+    compare_parser.add_argument('--fail-on-regression', action='store_true')
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return compare(args)
+
+    with tempfile.TemporaryDirectory(prefix='bench-') as tmp:
+        _isolate_state(tmp)
+        run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
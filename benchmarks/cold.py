@@ -0,0 +1,36 @@
+# cold.py - Un rendu à froid, exécuté dans un interpréteur neuf par generators.bench_cold
+import json
+import sys
+import time
+
+from benchmarks.measure import peak_rss_mb
+
+
+def main(name, count, logo_url):
+    started = time.perf_counter()
+    from benchmarks.generators import GENERATORS, load_generator, render_once
+    from benchmarks.fixtures import make_document
+    generator = load_generator(name)
+    import_ms = (time.perf_counter() - started) * 1000
+
+    document = make_document(GENERATORS[name][0], count, True, logo_url)
+
+    t0 = time.perf_counter()
+    size = render_once(generator, document, 'bleu')
+    first_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    render_once(generator, document, 'bleu')
+    second_ms = (time.perf_counter() - t0) * 1000
+
+    print(json.dumps({
+        'import_ms': round(import_ms, 3),
+        'first_render_ms': round(first_ms, 3),
+        'second_render_ms': round(second_ms, 3),
+        'bytes': size,
+        'peak_rss_mb': peak_rss_mb(),
+    }))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else '')
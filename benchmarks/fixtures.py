@@ -0,0 +1,57 @@
+# fixtures.py - Données de test réalistes pour les mesures
+from payloads import BUILDERS
+
+THEMES = ['bleu', 'vert', 'rouge', 'violet', 'orange', 'noir']
+ITEM_COUNTS = [1, 10, 100, 1000]
+
+
+def make_items(count, details=True):
+    """count articles ; un sur deux a des détails, un sur quatre une remise"""
+    items = []
+    for index in range(count):
+        item = {
+            'description': f"Prestation {index + 1} - développement et intégration",
+            'quantite': index % 5 + 1,
+            'prix_unitaire': 150.0 + index * 12.5,
+            'tva_taux': 20 if index % 3 else 5.5,
+        }
+        if details and index % 2 == 0:
+            item['details'] = [
+                "Analyse des besoins et cahier des charges",
+                "Développement et tests",
+                "Mise en production et formation",
+            ]
+        if index % 4 == 1:
+            item['remise'] = 25.0
+        items.append(item)
+    return items
+
+
+def make_payload(doc_type='devis', count=10, details=True, logo_url='', theme='bleu', numero=None):
+    """Corps JSON d'une requête de génération"""
+    payload = {
+        'type': doc_type,
+        'theme': theme,
+        'numero': numero or f"BENCH-{doc_type[0].upper()}-{count:04d}",
+        'date_emission': '01/01/2025',
+        'date_expiration': '31/01/2025',
+        'date_echeance': '31/01/2025',
+        'client_nom': 'Client Benchmark SAS',
+        'client_adresse': '10 rue de la Mesure',
+        'client_ville': '75001 Paris, FR',
+        'client_siret': '12345678900012',
+        'client_tva': 'FR00123456789',
+        'client_email': 'compta@client.example',
+        'texte_intro': "Suite à notre échange, voici notre proposition.",
+        'logo_url': logo_url,
+        'items': make_items(count, details),
+    }
+    if doc_type == 'facture':
+        payload['numero_commande'] = 'CMD-2025-001'
+        payload['reference_devis'] = 'D-2025-001'
+    return payload
+
+
+def make_document(doc_type='devis', count=10, details=True, logo_url=''):
+    """Objet Devis / Facture prêt à être rendu"""
+    return BUILDERS[doc_type](make_payload(doc_type, count, details, logo_url))
@@ -0,0 +1,101 @@
+# generators.py - Mesures des générateurs PDF / DOCX (rendus à froid et à chaud)
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from io import BytesIO
+
+from benchmarks.fixtures import ITEM_COUNTS, THEMES, make_document
+from benchmarks.measure import peak_rss_mb, summarize, time_calls
+
+# Nom court -> (type de document, format, nom du générateur)
+GENERATORS = {
+    'pdf_devis': ('devis', 'pdf', 'generate_pdf_devis'),
+    'pdf_facture': ('facture', 'pdf', 'generate_pdf_facture'),
+    'docx_devis': ('devis', 'docx', 'generate_docx_devis'),
+    'docx_facture': ('facture', 'docx', 'generate_docx_facture'),
+}
+
+
+def load_generator(name):
+    """Importer le générateur (import différé : mesuré à part pour les rendus à froid)"""
+    _, output_format, function = GENERATORS[name]
+    module = __import__('pdf_generator_students' if output_format == 'pdf' else 'docx_generator')
+    return getattr(module, function)
+
+
+def render_once(generator, document, theme):
+    """Un rendu complet en mémoire ; retourne la taille du document"""
+    return len(generator(document, theme=theme, output=BytesIO()).getvalue())
+
+
+def bench_warm(names, item_counts=ITEM_COUNTS, themes=THEMES, logo_url='',
+               repeat=5, min_time=0.0, progress=None):
+    """
+    Rendus à chaud : un rendu de préchauffage puis repeat rendus mesurés,
+    pour chaque générateur x nombre d'articles x détails x thème x logo.
+    """
+    results = []
+    logos = [False, True] if logo_url else [False]
+    for name in names:
+        doc_type, output_format, _ = GENERATORS[name]
+        generator = load_generator(name)
+        for count in item_counts:
+            # Les gros documents sont mesurés moins souvent
+            runs = max(1, repeat // 5) if count >= 1000 else repeat
+            for details in (False, True):
+                for with_logo in logos:
+                    document = make_document(doc_type, count, details, logo_url if with_logo else '')
+                    for theme in themes:
+                        size = render_once(generator, document, theme)
+                        durations, total, _ = time_calls(
+                            lambda: render_once(generator, document, theme), runs, min_time)
+                        result = {
+                            'name': f"warm/{name}/items={count}/details={int(details)}"
+                                    f"/logo={int(with_logo)}/{theme}",
+                            'kind': 'warm',
+                            'generator': name,
+                            'items': count,
+                            'details': details,
+                            'logo': with_logo,
+                            'theme': theme,
+                            'bytes': size,
+                            **summarize(durations, total),
+                            'peak_rss_mb': peak_rss_mb(),
+                        }
+                        results.append(result)
+                        if progress:
+                            progress(result)
+    return results
+
+
+def bench_cold(names, logo_url='', count=10, progress=None):
+    """
+    Rendus à froid : chaque mesure dans un nouvel interpréteur, caches vides
+    (import des modules, premier rendu, second rendu).
+    """
+    results = []
+    logos = [False, True] if logo_url else [False]
+    for name in names:
+        for with_logo in logos:
+            with tempfile.TemporaryDirectory(prefix='bench-cold-') as tmp:
+                env = dict(os.environ, LOGO_CACHE_DIR=os.path.join(tmp, 'logos'),
+                           RENDER_CACHE_DIR=os.path.join(tmp, 'renders'),
+                           GENERATED_FOLDER=os.path.join(tmp, 'generated'))
+                command = [sys.executable, '-m', 'benchmarks.cold', name, str(count),
+                           logo_url if with_logo else '']
+                completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+            measures = json.loads(completed.stdout.strip().splitlines()[-1])
+            result = {
+                'name': f"cold/{name}/items={count}/logo={int(with_logo)}",
+                'kind': 'cold',
+                'generator': name,
+                'items': count,
+                'logo': with_logo,
+                **measures,
+            }
+            results.append(result)
+            if progress:
+                progress(result)
+    return results
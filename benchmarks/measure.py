@@ -0,0 +1,54 @@
+# measure.py - Chronométrage, percentiles et mémoire maximale (RSS)
+import resource
+import sys
+import time
+
+
+def percentile(sorted_values, q):
+    """Percentile q (0-100) par interpolation linéaire sur des valeurs triées"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def peak_rss_mb(children=False):
+    """Mémoire résidente maximale du processus (ou de ses enfants) en Mo"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def summarize(durations, total_time=None, documents=None):
+    """Statistiques d'une série de durées (secondes) ; latences renvoyées en ms"""
+    values = sorted(durations)
+    total_time = total_time if total_time is not None else sum(values)
+    documents = documents if documents is not None else len(values)
+    return {
+        'n': len(values),
+        'min_ms': round(values[0] * 1000, 3) if values else None,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else None,
+        'p50_ms': round(percentile(values, 50) * 1000, 3) if values else None,
+        'p95_ms': round(percentile(values, 95) * 1000, 3) if values else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 3) if values else None,
+        'max_ms': round(values[-1] * 1000, 3) if values else None,
+        'docs_per_sec': round(documents / total_time, 2) if total_time else None,
+    }
+
+
+def time_calls(func, repeat, min_time=0.0):
+    """
+    Appeler func au moins repeat fois (et au moins min_time secondes).
+    Retourne (durées, temps total, dernier résultat).
+    """
+    durations = []
+    result = None
+    started = time.perf_counter()
+    while len(durations) < repeat or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - t0)
+    return durations, time.perf_counter() - started, result
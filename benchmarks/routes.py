@@ -0,0 +1,120 @@
+# routes.py - Mesures de bout en bout des routes Flask (client de test, sans réseau)
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixtures import make_payload
+from benchmarks.measure import peak_rss_mb, summarize
+
+# Numéros uniques pour toute l'exécution (préfixe propre à chaque lancement)
+_RUN_ID = uuid.uuid4().hex[:6]
+_numeros = itertools.count()
+_numeros_lock = threading.Lock()
+
+
+def api_headers(app_module):
+    """
+    En-têtes d'un client de mesure sans limite de débit ni de requêtes simultanées
+    (les limites par client fausseraient les mesures en concurrence)
+    """
+    from auth import make_client
+
+    key_1, key_2 = f"bench-{_RUN_ID}-1", f"bench-{_RUN_ID}-2"
+    app_module.api_auth.keys.add(make_client('benchmark', key_1, key_2, rate=0, max_concurrent=0))
+    return {'X-API-Key-1': key_1, 'X-API-Key-2': key_2}
+
+
+def scenarios(logo_url=''):
+    """
+    Scénarios mesurés : (nom, méthode, chemin, fabrique du corps, documents par requête).
+    Les scénarios "miss" changent de numéro à chaque requête pour éviter le cache de rendu.
+    """
+    def unique(doc_type, fmt, count):
+        def body():
+            with _numeros_lock:
+                n = next(_numeros)
+            payload = make_payload(doc_type, count, True, logo_url, numero=f"BENCH-{_RUN_ID}-{n:08d}")
+            payload['format'] = fmt
+            return payload
+        return body
+
+    def fixed(doc_type, fmt, count):
+        payload = make_payload(doc_type, count, True, logo_url)
+        payload['format'] = fmt
+        return lambda: payload
+
+    def batch(size):
+        def body():
+            return [unique('devis' if i % 2 else 'facture', 'pdf', 10)() for i in range(size)]
+        return body
+
+    return [
+        ('GET /health', 'GET', '/health', None, 0),
+        ('POST /api/devis pdf items=10 miss', 'POST', '/api/devis', unique('devis', 'pdf', 10), 1),
+        ('POST /api/devis pdf items=100 miss', 'POST', '/api/devis', unique('devis', 'pdf', 100), 1),
+        ('POST /api/devis pdf items=10 hit', 'POST', '/api/devis', fixed('devis', 'pdf', 10), 1),
+        ('POST /api/devis pdf items=10 304', 'POST', '/api/devis', fixed('devis', 'pdf', 10), 0),
+        ('POST /api/devis docx items=10 miss', 'POST', '/api/devis', unique('devis', 'docx', 10), 1),
+        ('POST /api/facture pdf items=10 miss', 'POST', '/api/facture', unique('facture', 'pdf', 10), 1),
+        ('POST /api/facture docx items=10 miss', 'POST', '/api/facture', unique('facture', 'docx', 10), 1),
+        ('POST /api/batch 20 docs', 'POST', '/api/batch', batch(20), 20),
+    ]
+
+
+def bench_routes(repeat=20, concurrency=1, logo_url='', progress=None):
+    """Envoyer repeat requêtes par scénario (concurrency clients en parallèle)"""
+    import app_students
+
+    app_students.app.config['TESTING'] = True
+    headers = api_headers(app_students)
+    results = []
+
+    for name, method, path, make_body, documents in scenarios(logo_url):
+        request_headers = dict(headers)
+        if name.endswith(' 304'):
+            # Récupérer l'ETag une première fois, puis le renvoyer
+            with app_students.app.test_client() as client:
+                etag = client.post(path, json=make_body(), headers=headers).headers.get('ETag')
+            request_headers['If-None-Match'] = etag
+
+        def one_request():
+            with app_students.app.test_client() as client:
+                body = make_body() if make_body else None
+                t0 = time.perf_counter()
+                if method == 'GET':
+                    response = client.get(path, headers=request_headers)
+                else:
+                    response = client.post(path, json=body, headers=request_headers)
+                # Consommer la réponse (streaming pour /api/batch)
+                size = len(response.get_data())
+                return time.perf_counter() - t0, response.status_code, size
+
+        one_request()  # préchauffage (pool de rendu, cache du logo)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(lambda _: one_request(), range(repeat)))
+        total = time.perf_counter() - started
+
+        statuses = {}
+        for _, status, _ in outcomes:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        result = {
+            'name': f"route/{name}/c={concurrency}",
+            'kind': 'route',
+            'route': name,
+            'concurrency': concurrency,
+            'statuses': statuses,
+            'bytes': outcomes[-1][2],
+            **summarize([duration for duration, _, _ in outcomes], total,
+                        documents=max(documents, 1) * repeat),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        if not documents:
+            result['docs_per_sec'] = None
+            result['requests_per_sec'] = round(repeat / total, 2)
+        results.append(result)
+        if progress:
+            progress(result)
+    return results
@@ -0,0 +1,75 @@
+# stub_server.py - Serveur HTTP local servant un logo (aucun accès réseau pendant les mesures)
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+
+
+def make_logo(width=800, height=400):
+    """Logo PNG de test (dimensions proches d'un vrai logo d'entreprise)"""
+    image = Image.new('RGBA', (width, height), (44, 62, 80, 255))
+    for x in range(0, width, 40):
+        for y in range(0, height, 40):
+            if (x + y) // 40 % 2:
+                image.paste((52, 152, 219, 255), (x, y, x + 40, y + 40))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class LogoServer:
+    """Serveur de logo démarré dans un thread : with LogoServer() as server: server.url"""
+
+    def __init__(self, logo=None):
+        self.logo = logo or make_logo()
+        self.etag = '"%s"' % hashlib.sha256(self.logo).hexdigest()[:16]
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if self.headers.get('If-None-Match') == stub.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(stub.logo)))
+                self.send_header('ETag', stub.etag)
+                self.end_headers()
+                self.wfile.write(stub.logo)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name='bench-logo', daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/logo.png"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
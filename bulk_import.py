@@ -0,0 +1,345 @@
+# bulk_import.py - Import en masse d'un fichier NDJSON (export ERP) : rendu de chaque document
+# vers un dossier ou une archive tar, avec reprise après interruption.
+#
+#   python bulk_import.py factures.jsonl --output-dir factures/
+#   python bulk_import.py factures.jsonl --tar factures.tar
+#   python bulk_import.py factures.jsonl --tar - > factures.tar   (flux, sans reprise)
+import argparse
+import json
+import os
+import sys
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from json_provider import loads
+from payloads import BUILDERS, PayloadError, resolve_theme, resolve_format
+from rendering import render_bytes, FORMATS_SUPPORTES
+from storage import atomic_write, safe_filename
+
+# Configuration (modifiable par variables d'environnement)
+BULK_WORKERS = int(os.environ.get('BULK_WORKERS', os.cpu_count() or 1))
+BULK_CHECKPOINT_EVERY = int(os.environ.get('BULK_CHECKPOINT_EVERY', 100))  # documents
+
+ERRORS_FILENAME = 'erreurs.jsonl'
+
+
+class BulkImportError(Exception):
+    """Import impossible (point de reprise incohérent, sortie invalide)"""
+
+
+def iter_ndjson_lines(stream, offset=0, line_number=0):
+    """
+    Lire un fichier NDJSON ligne par ligne à partir d'une position (en octets).
+    Produit (numéro de ligne, position après la ligne, données ou None, erreur ou None).
+    """
+    stream.seek(offset)
+    for line in iter(stream.readline, b''):
+        line_number += 1
+        offset += len(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, offset, loads(line), None
+        except ValueError:
+            yield line_number, offset, None, "JSON invalide"
+
+
+def prepare_document(payload, doc_type='facture', defaults=None):
+    """
+    Valider et construire un document à partir d'une ligne.
+    Retourne (objet Devis/Facture, type, thème, format) ; lève PayloadError.
+    """
+    if not isinstance(payload, dict):
+        raise PayloadError("Chaque ligne doit être un objet JSON")
+    for key, value in (defaults or {}).items():
+        payload.setdefault(key, value)
+
+    doc_type = payload.get('type', doc_type)
+    builder = BUILDERS.get(doc_type)
+    if builder is None:
+        raise PayloadError(f"Type de document inconnu: {doc_type}")
+
+    output_format = resolve_format(payload)
+    if output_format not in FORMATS_SUPPORTES:
+        raise PayloadError("Format non supporté. Utilisez 'pdf' ou 'docx'")
+
+    return builder(payload), doc_type, resolve_theme(payload), output_format
+
+
+# --- Destinations ------------------------------------------------------------
+
+class DirectoryOutput:
+    """Un fichier par document dans un dossier ; erreurs dans erreurs.jsonl"""
+
+    resumable = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.checkpoint_path = os.path.join(os.path.abspath(directory), '.checkpoint.json')
+        self.errors_path = os.path.join(directory, ERRORS_FILENAME)
+        self._errors = None
+
+    def open(self, state=None):
+        os.makedirs(self.directory, exist_ok=True)
+        self._errors = open(self.errors_path, 'ab')
+        # Reprise : oublier les erreurs écrites après le dernier point de reprise
+        self._errors.truncate(state['errors_offset'] if state is not None else 0)
+        self._errors.seek(0, os.SEEK_END)
+
+    def add(self, name, data):
+        atomic_write(os.path.join(self.directory, name), data)
+
+    def add_error(self, error):
+        self._errors.write(json.dumps(error, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def position(self):
+        """Positions à enregistrer dans le point de reprise (après écriture sur disque)"""
+        self._errors.flush()
+        os.fsync(self._errors.fileno())
+        return {'errors_offset': self._errors.tell()}
+
+    def close(self):
+        if self._errors is not None:
+            self._errors.close()
+
+
+class TarOutput:
+    """Archive tar (fichier ou flux) ; erreurs dans l'archive (erreurs.jsonl) à la fin"""
+
+    def __init__(self, path=None, stream=None):
+        self.path = path
+        self.stream = stream
+        self.resumable = stream is None
+        self.checkpoint_path = os.path.abspath(path) + '.checkpoint.json' if path else None
+        self.errors_path = os.path.abspath(path) + '.erreurs.jsonl' if path else None
+        self._file = None
+        self._tar = None
+        self._errors = None
+
+    def open(self, state=None):
+        if self.stream is not None:
+            # Flux non positionnable (stdout) : mode tar "streaming"
+            self._tar = tarfile.open(fileobj=self.stream, mode='w|')
+            self._errors = BytesIO()
+            return
+
+        if state is not None:
+            # Reprise : l'archive est tronquée au dernier document validé
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(state['tar_offset'])
+            self._file.seek(state['tar_offset'])
+        else:
+            self._file = open(self.path, 'wb')
+        self._tar = tarfile.open(fileobj=self._file, mode='w')
+
+        self._errors = open(self.errors_path, 'ab')
+        self._errors.truncate(state['errors_offset'] if state is not None else 0)
+        self._errors.seek(0, os.SEEK_END)
+
+    def add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        self._tar.addfile(info, BytesIO(data))
+
+    def add_error(self, error):
+        self._errors.write(json.dumps(error, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def position(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._errors.flush()
+        os.fsync(self._errors.fileno())
+        return {'tar_offset': self._tar.offset, 'errors_offset': self._errors.tell()}
+
+    def close(self):
+        if self._tar is None:
+            return
+        # La liste des erreurs termine l'archive
+        if self.stream is not None:
+            errors = self._errors.getvalue()
+        else:
+            self._errors.close()
+            with open(self.errors_path, 'rb') as f:
+                errors = f.read()
+        if errors:
+            self.add(ERRORS_FILENAME, errors)
+        self._tar.close()
+        if self._file is not None:
+            self._file.close()
+
+
+# --- Points de reprise -------------------------------------------------------
+
+def _source_identity(source):
+    stat = os.stat(source)
+    return {'source': os.path.abspath(source), 'source_size': stat.st_size}
+
+
+def load_checkpoint(output, source):
+    """Dernier point de reprise valide pour ce fichier source (ou None)"""
+    if not output.resumable or not os.path.exists(output.checkpoint_path):
+        return None
+    with open(output.checkpoint_path, encoding='utf-8') as f:
+        state = json.load(f)
+    identity = _source_identity(source)
+    if state.get('source') != identity['source'] or state.get('source_size', 0) > identity['source_size']:
+        raise BulkImportError(f"Le point de reprise {output.checkpoint_path} concerne un autre fichier "
+                              "(utilisez --restart pour recommencer)")
+    return state
+
+
+def save_checkpoint(output, state):
+    atomic_write(output.checkpoint_path, json.dumps(state, indent=2).encode('utf-8'))
+
+
+# --- Import ------------------------------------------------------------------
+
+def bulk_import(source, output, doc_type='facture', defaults=None, workers=BULK_WORKERS,
+                checkpoint_every=BULK_CHECKPOINT_EVERY, restart=False, progress=None):
+    """
+    Importer un fichier NDJSON : lecture paresseuse, construction et validation ligne par
+    ligne, rendu sur un pool borné (au plus 2 x workers documents en mémoire).
+    Les résultats sont écrits dans l'ordre du fichier, ce qui permet d'enregistrer un
+    point de reprise (position dans le fichier et dans la sortie) tous les checkpoint_every
+    documents. Retourne un résumé (dict).
+    """
+    state = None if restart else load_checkpoint(output, source)
+    if state is not None and state.get('termine'):
+        return state
+
+    stats = {
+        'lignes': state['lignes'] if state else 0,
+        'rendus': state['rendus'] if state else 0,
+        'erreurs': state['erreurs'] if state else 0,
+    }
+    offset = state['offset'] if state else 0
+    output.open(state)
+    max_in_flight = max(1, workers) * 2
+    pending = deque()
+    started = time.time()
+    since_checkpoint = 0
+
+    def checkpoint(done=False):
+        if output.resumable:
+            save_checkpoint(output, {
+                **_source_identity(source),
+                'offset': offset,
+                **stats,
+                **output.position(),
+                'termine': done,
+                'maj_le': time.strftime('%Y-%m-%d %H:%M:%S'),
+            })
+
+    def commit_head():
+        """Écrire le plus ancien document en cours (ordre du fichier)"""
+        nonlocal offset, since_checkpoint
+        line_number, end_offset, name, numero, future, error = pending.popleft()
+        if future is not None:
+            try:
+                data = future.result()
+            except Exception as e:
+                error = str(e)
+        if error is None:
+            output.add(name, data)
+            stats['rendus'] += 1
+        else:
+            output.add_error({'ligne': line_number, 'numero': numero, 'erreur': error})
+            stats['erreurs'] += 1
+        stats['lignes'] = line_number
+        offset = end_offset
+        since_checkpoint += 1
+        if since_checkpoint >= checkpoint_every:
+            checkpoint()
+            since_checkpoint = 0
+        if progress:
+            progress(stats)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='bulk') as pool, \
+                open(source, 'rb') as stream:
+            for line_number, end_offset, payload, error in iter_ndjson_lines(stream, offset, stats['lignes']):
+                numero = payload.get('numero') if isinstance(payload, dict) else None
+                name = future = None
+                if error is None:
+                    try:
+                        document, line_type, theme, output_format = prepare_document(payload, doc_type, defaults)
+                        numero = document.numero
+                        name = (f"{line_number:06d}_"
+                                f"{safe_filename(f'{line_type}_{numero}_{theme}')}.{output_format}")
+                        # Rendu dans le pool de processus (attend une place : pas de 503 ici)
+                        future = pool.submit(render_bytes, document, line_type, theme, output_format, block=True)
+                    except PayloadError as e:
+                        error = str(e)
+                pending.append((line_number, end_offset, name, numero, future, error))
+
+                # Contre-pression : on ne lit la suite qu'une fois de la place libérée
+                while pending and (len(pending) >= max_in_flight or pending[0][4] is None
+                                   or pending[0][4].done()):
+                    commit_head()
+
+            while pending:
+                commit_head()
+    except BaseException:
+        # Interruption : le dernier point de reprise reste valide
+        for *_, future, _ in pending:
+            if future is not None:
+                future.cancel()
+        output.close()
+        raise
+
+    checkpoint(done=True)
+    output.close()
+    stats['duree'] = round(time.time() - started, 1)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importer un fichier NDJSON de factures/devis et générer les documents")
+    parser.add_argument('source', help="Fichier NDJSON (un document JSON par ligne)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--output-dir', help="Dossier de sortie (un fichier par document)")
+    target.add_argument('--tar', help="Archive tar de sortie ('-' pour la sortie standard)")
+    parser.add_argument('--type', default='facture', choices=sorted(BUILDERS), help="Type par défaut")
+    parser.add_argument('--format', help="Format par défaut (pdf ou docx)")
+    parser.add_argument('--theme', help="Thème par défaut")
+    parser.add_argument('--workers', type=int, default=BULK_WORKERS)
+    parser.add_argument('--checkpoint-every', type=int, default=BULK_CHECKPOINT_EVERY)
+    parser.add_argument('--restart', action='store_true', help="Ignorer le point de reprise et tout recommencer")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        output = DirectoryOutput(args.output_dir)
+    elif args.tar == '-':
+        output = TarOutput(stream=sys.stdout.buffer)
+    else:
+        output = TarOutput(args.tar)
+
+    defaults = {key: value for key, value in (('format', args.format), ('theme', args.theme)) if value}
+
+    def progress(stats):
+        if (stats['rendus'] + stats['erreurs']) % 1000 == 0:
+            print(f"📄 ligne {stats['lignes']} : {stats['rendus']} rendus, {stats['erreurs']} erreurs",
+                  file=sys.stderr)
+
+    try:
+        stats = bulk_import(args.source, output, args.type, defaults, args.workers,
+                            args.checkpoint_every, args.restart, progress)
+    except (BulkImportError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("⏸️ Import interrompu : relancez la même commande pour reprendre", file=sys.stderr)
+        return 130
+
+    print(f"✅ Import terminé : {stats['rendus']} documents, {stats['erreurs']} erreurs", file=sys.stderr)
+    return 0 if not stats['erreurs'] else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,25 @@
 # docx_generator.py - Version améliorée avec support des factures, thèmes colorés et logos
 from docx import Document
-from docx.shared import Pt, Cm, RGBColor, Inches
+from docx.shared import Pt, Cm, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+from lxml import etree
+import copy
 import os
-import requests
+import re
+import threading
+import zipfile
+from collections import namedtuple
 from io import BytesIO
+from xml.sax.saxutils import escape
+from logo_images import VARIANTES, display_size, get_normalized_logo
+from metrics import stage
+from output_sink import OutputSink
+from totals import to_cents, to_euros
 
 # Thèmes de couleurs pour DOCX (format RGB)
 THEMES_COULEURS_DOCX = {
@@ -55,10 +67,11 @@ def download_and_add_logo(doc, logo_url):
         return None
     
     try:
-        # Télécharger l'image avec un timeout
-        response = requests.get(logo_url, timeout=10)
-        if response.status_code == 200:
-            img_data = BytesIO(response.content)
+        # Récupérer l'image via le cache partagé
+        normalized = get_normalized_logo(logo_url, 'docx')
+        if normalized:
+            img_data = BytesIO(normalized.content)
+            width, height = display_size(VARIANTES['docx'], normalized.source_width, normalized.source_height)
             
             # Créer un paragraphe pour le logo aligné à droite
             logo_paragraph = doc.add_paragraph()
@@ -66,7 +79,7 @@ def download_and_add_logo(doc, logo_url):
             
             # Ajouter l'image avec une taille maximale
             run = logo_paragraph.runs[0] if logo_paragraph.runs else logo_paragraph.add_run()
-            picture = run.add_picture(img_data, width=Inches(1.5))  # 1.5 pouces de largeur max
+            picture = run.add_picture(img_data, width=Pt(width), height=Pt(height))  # 1.5 pouces de largeur max
             
             return logo_paragraph
     except Exception as e:
@@ -75,19 +88,28 @@ def download_and_add_logo(doc, logo_url):
     
     return None
 
+
+def add_header_logo(logo_paragraph, logo_url):
+    """Ajouter le logo (réduit) dans la cellule de droite de l'en-tête"""
+    if not logo_url:
+        return
+    try:
+        # Logo réduit à la taille affichée (pas l'original en pleine résolution)
+        normalized = get_normalized_logo(logo_url, 'docx_header')
+        if normalized:
+            img_data = BytesIO(normalized.content)
+            width, height = display_size(VARIANTES['docx_header'], normalized.source_width, normalized.source_height)
+            run = logo_paragraph.add_run()
+            run.add_picture(img_data, width=Pt(width), height=Pt(height))  # 1.2 pouces de largeur
+    except Exception as e:
+        print(f"Erreur lors du téléchargement du logo: {e}")
+
 def create_header_with_logo_and_title(doc, logo_url, title):
     """Créer l'en-tête avec titre à gauche et logo à droite"""
     # Créer un tableau invisible pour aligner titre (gauche) et logo (droite)
     header_table = doc.add_table(rows=1, cols=2)
     header_table.style = 'Table Grid'
     
-    # Supprimer les bordures du tableau
-    for row in header_table.rows:
-        for cell in row.cells:
-            for paragraph in cell.paragraphs:
-                for run in paragraph.runs:
-                    run.font.color.rgb = RGBColor(0, 0, 0)
-    
     # Cellule de gauche : Titre
     title_cell = header_table.cell(0, 0)
     title_paragraph = title_cell.paragraphs[0]
@@ -100,17 +122,7 @@ def create_header_with_logo_and_title(doc, logo_url, title):
     logo_cell = header_table.cell(0, 1)
     logo_paragraph = logo_cell.paragraphs[0]
     logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    
-    # Télécharger et ajouter le logo
-    if logo_url:
-        try:
-            response = requests.get(logo_url, timeout=10)
-            if response.status_code == 200:
-                img_data = BytesIO(response.content)
-                run = logo_paragraph.add_run()
-                run.add_picture(img_data, width=Inches(1.2))  # 1.2 pouces de largeur
-        except Exception as e:
-            print(f"Erreur lors du téléchargement du logo: {e}")
+    add_header_logo(logo_paragraph, logo_url)
     
     # Supprimer les bordures du tableau
     tbl = header_table._tbl
@@ -126,13 +138,95 @@ def create_header_with_logo_and_title(doc, logo_url, title):
     
     return header_table
 
-def generate_docx_devis(devis, theme='bleu'):
-    """Générer un DOCX de devis modifiable avec thème coloré et logo"""
-    # Récupérer les couleurs du thème
-    couleurs = THEMES_COULEURS_DOCX.get(theme, THEMES_COULEURS_DOCX['bleu'])
+# --- Squelettes précompilés -------------------------------------------------
+#
+# Tout ce qui ne dépend pas des données (styles, en-tête sans bordures, tableaux
+# mis en forme, libellés, titres) est construit une fois par (type, thème) et par
+# processus. Chaque rendu recharge le squelette puis ne fait que remplir les blocs.
+
+# Au-delà de ce nombre d'articles, les lignes du tableau sont écrites directement
+# en XML dans le .docx (voir _save_streaming)
+DOCX_STREAM_MIN_ITEMS = int(os.environ.get('DOCX_STREAM_MIN_ITEMS', 100))
+
+# Squelette : le .docx sans données, la position de chaque bloc à remplir dans le corps
+# et le XML des lignes modèles du tableau des articles (article, remise)
+DocxSkeleton = namedtuple('DocxSkeleton', ['blob', 'blocks', 'row_xml'])
+
+_SKELETONS = {}
+_skeletons_lock = threading.Lock()
+
+ENTETES_ARTICLES = ['Description', 'Qté', 'Prix unitaire', 'TVA (%)', 'Total HT']
+LIBELLES_DEVIS = ['Numéro de devis:', 'Date d\'émission:', 'Date d\'expiration:']
+LIBELLES_TOTAUX = ['Total HT', 'TVA (20%)', 'TOTAL TTC']
+LIBELLES_BANQUE = ['Banque:', 'IBAN:', 'BIC:']
+LIGNES_INFOS_FACTURE = 6
+
+MENTIONS_LEGALES = 'TVA sur les encaissements. En cas de retard de paiement, seront exigibles, conformément à l\'article L441-10 du code de commerce, une indemnité calculée sur la base de trois fois le taux de l\'intérêt légal en vigueur ainsi qu\'une indemnité forfaitaire pour frais de recouvrement de 40 euros.'
+
+def _add_labels_table(doc, labels, style):
+    """Tableau libellé (gras) / valeur ; la valeur est un run vide, rempli au rendu"""
+    table = doc.add_table(rows=len(labels), cols=2)
+    table.style = style
+    for i, label in enumerate(labels):
+        table.cell(i, 0).text = label
+        table.cell(i, 0).paragraphs[0].runs[0].bold = True
+        table.cell(i, 1).paragraphs[0].add_run()
+    return table
+
+def _add_items_table(doc, couleurs, doc_type):
+    """Tableau des articles : en-têtes colorés, puis les lignes modèles copiées pour chaque article"""
+    items_table = doc.add_table(rows=1, cols=5)
+    items_table.style = 'Table Grid'
+    if doc_type == 'devis':
+        items_table.alignment = WD_TABLE_ALIGNMENT.CENTER
     
-    filename = os.path.join('generated', f'devis_{devis.numero}_{theme}.docx')
+    # En-têtes avec fond coloré selon le thème
+    header_cells = items_table.rows[0].cells
+    for i, header in enumerate(ENTETES_ARTICLES):
+        header_cells[i].text = header
+        run = header_cells[i].paragraphs[0].runs[0]
+        run.bold = True
+        run.font.color.rgb = RGBColor(255, 255, 255)  # Blanc
+        set_cell_background(header_cells[i], couleurs['header_bg'])
+        if doc_type == 'devis' and i > 0:
+            header_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    
+    # Ligne modèle d'un article : cellules numériques alignées à droite
+    cells = items_table.add_row().cells
+    for i in range(1, 5):
+        cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    
+    # Ligne modèle d'une remise (devis) : montant en rouge
+    if doc_type == 'devis':
+        remise_cells = items_table.add_row().cells
+        remise_cells[3].text = 'Remise'
+        remise_cells[4].paragraphs[0].add_run().font.color.rgb = RGBColor(231, 76, 60)  # Rouge
+        remise_cells[3].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        remise_cells[4].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    return items_table
+
+def _add_totals_table(doc, couleurs):
+    totals_table = doc.add_table(rows=3, cols=2)
+    totals_table.style = 'Light List'
+    for i, label in enumerate(LIBELLES_TOTAUX):
+        totals_table.cell(i, 0).text = label
+        value_run = totals_table.cell(i, 1).paragraphs[0].add_run()
+        totals_table.cell(i, 0).paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        totals_table.cell(i, 1).paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        
+        # Ligne TOTAL TTC en gras, couleur du thème
+        if i == 2:
+            for run in (totals_table.cell(i, 0).paragraphs[0].runs[0], value_run):
+                run.bold = True
+                run.font.size = Pt(12)
+                run.font.color.rgb = couleurs['principale']
+    return totals_table
+
+def build_docx_skeleton(doc_type, theme):
+    """Construire le squelette d'un devis ou d'une facture pour un thème"""
+    couleurs = THEMES_COULEURS_DOCX[theme]
     doc = Document()
+    blocks = {}
     
     # Styles du document
     style = doc.styles['Normal']
@@ -140,203 +234,324 @@ def generate_docx_devis(devis, theme='bleu'):
     font.name = 'Arial'
     font.size = Pt(10)
     
-    # NOUVEAU: En-tête avec titre et logo
-    create_header_with_logo_and_title(doc, devis.logo_url, "DEVIS")
+    # En-tête avec titre ; le logo est ajouté au rendu
+    blocks['entete'] = create_header_with_logo_and_title(doc, None, doc_type.upper())._tbl
     
     # Nom de l'entreprise avec couleur du thème
     company = doc.add_paragraph()
-    company.add_run(devis.fournisseur_nom.upper()).bold = True
+    run = company.add_run()
+    run.bold = True
     company.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    company.runs[0].font.size = Pt(16)
-    company.runs[0].font.color.rgb = couleurs['principale']
+    run.font.size = Pt(16)
+    run.font.color.rgb = couleurs['principale']
+    blocks['entreprise'] = company._p
     
     doc.add_paragraph()  # Espace
     
-    # Informations du devis
-    info_table = doc.add_table(rows=3, cols=2)
-    info_table.style = 'Light List'
-    
-    # Remplir le tableau d'informations
-    info_data = [
-        ('Numéro de devis:', devis.numero),
-        ('Date d\'émission:', devis.date_emission),
-        ('Date d\'expiration:', devis.date_expiration)
-    ]
-    
-    for i, (label, value) in enumerate(info_data):
-        info_table.cell(i, 0).text = label
-        info_table.cell(i, 1).text = value
-        # Mettre en gras les labels
-        info_table.cell(i, 0).paragraphs[0].runs[0].bold = True
+    # Informations du document (lignes de la facture remplies selon les valeurs présentes)
+    if doc_type == 'devis':
+        info_table = _add_labels_table(doc, LIBELLES_DEVIS, 'Light List')
+    else:
+        info_table = doc.add_table(rows=LIGNES_INFOS_FACTURE, cols=2)
+        info_table.style = 'Light List'
+    blocks['informations'] = info_table._tbl
     
     doc.add_paragraph()  # Espace
     
     # Informations Fournisseur / Client
     doc.add_heading('ÉMETTEUR', level=2)
-    doc.add_paragraph(f'{devis.fournisseur_nom}\n{devis.fournisseur_adresse}\n{devis.fournisseur_ville}')
-    doc.add_paragraph(f'Email: {devis.fournisseur_email}\nTél: {devis.fournisseur_telephone}\nSIRET: {devis.fournisseur_siret}')
-    
+    blocks['emetteur'] = doc.add_paragraph()._p
+    blocks['emetteur_contact'] = doc.add_paragraph()._p
     doc.add_heading('CLIENT', level=2)
-    doc.add_paragraph(f'{devis.client_nom}\n{devis.client_adresse}\n{devis.client_ville}')
-    doc.add_paragraph(f'SIRET: {devis.client_siret}\nN° TVA: {devis.client_tva}')
-    if devis.client_email:
-        doc.add_paragraph(f'Email: {devis.client_email}')
-    if devis.client_telephone:
-        doc.add_paragraph(f'Tél: {devis.client_telephone}')
+    blocks['client'] = doc.add_paragraph()._p
+    blocks['client_legal'] = doc.add_paragraph()._p
     
+    if doc_type == 'devis':
+        # Paragraphes facultatifs : retirés au rendu s'ils sont vides
+        blocks['client_email'] = doc.add_paragraph()._p
+        blocks['client_telephone'] = doc.add_paragraph()._p
+        doc.add_paragraph()  # Espace
+        blocks['intro'] = doc.add_paragraph()._p
+        blocks['intro_espace'] = doc.add_paragraph()._p
+    
+    blocks['articles'] = _add_items_table(doc, couleurs, doc_type)._tbl
+    
+    doc.add_paragraph()  # Espace
+    blocks['totaux'] = _add_totals_table(doc, couleurs)._tbl
     doc.add_paragraph()  # Espace
     
-    # Texte d'introduction si présent
-    if devis.texte_intro:
-        doc.add_paragraph(devis.texte_intro)
-        doc.add_paragraph()
+    # Conditions de paiement
+    doc.add_heading('CONDITIONS DE PAIEMENT', level=2)
+    blocks['conditions'] = doc.add_paragraph()._p
+    penalites = doc.add_paragraph()
+    penalites.add_run().font.size = Pt(8)
+    blocks['penalites'] = penalites._p
     
-    # Tableau des articles
-    items_table = doc.add_table(rows=1, cols=5)
-    items_table.style = 'Table Grid'
-    items_table.alignment = WD_TABLE_ALIGNMENT.CENTER
+    doc.add_paragraph()  # Espace
     
-    # En-têtes avec fond coloré selon le thème
-    headers = ['Description', 'Qté', 'Prix unitaire', 'TVA (%)', 'Total HT']
-    header_cells = items_table.rows[0].cells
-    for i, header in enumerate(headers):
-        header_cells[i].text = header
-        # Mettre en gras et colorer avec le thème
-        run = header_cells[i].paragraphs[0].runs[0]
-        run.bold = True
-        run.font.color.rgb = RGBColor(255, 255, 255)  # Blanc
-        set_cell_background(header_cells[i], couleurs['header_bg'])
-        # Alignement
-        if i > 0:
-            header_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    # Informations bancaires
+    doc.add_heading('COORDONNÉES BANCAIRES', level=2)
+    blocks['banque'] = _add_labels_table(doc, LIBELLES_BANQUE, 'Light Grid')._tbl
     
-    # Articles
-    for item in devis.items:
-        row = items_table.add_row()
-        cells = row.cells
+    if doc_type == 'devis':
+        # Texte de conclusion (facultatif)
+        blocks['conclusion_espace'] = doc.add_paragraph()._p
+        blocks['conclusion'] = doc.add_paragraph()._p
         
+        # Signature
+        doc.add_paragraph()
+        doc.add_paragraph()
+        doc.add_paragraph('Bon pour accord')
+        doc.add_paragraph('Date et signature:')
+        doc.add_paragraph('_______________________')
+    else:
+        # Mentions légales
+        doc.add_paragraph()
+        doc.add_paragraph()
+        legal = doc.add_paragraph()
+        legal.add_run('Mentions légales: ').bold = True
+        legal.add_run(MENTIONS_LEGALES)
+        legal.runs[1].font.size = Pt(8)
+    
+    templates = blocks['articles'].tr_lst[1:]
+    row_xml = tuple(_row_fragments(tr, len(ENTETES_ARTICLES) if i == 0 else 1) for i, tr in enumerate(templates))
+    
+    body = doc.element.body
+    buffer = BytesIO()
+    doc.save(buffer)
+    return DocxSkeleton(buffer.getvalue(), {name: body.index(element) for name, element in blocks.items()}, row_xml)
+
+def get_docx_skeleton(doc_type, theme):
+    """Squelette du thème (bleu si inconnu), construit au premier usage dans ce processus"""
+    if theme not in THEMES_COULEURS_DOCX:
+        theme = 'bleu'
+    key = (doc_type, theme)
+    skeleton = _SKELETONS.get(key)
+    if skeleton is None:
+        with _skeletons_lock:
+            skeleton = _SKELETONS.get(key)
+            if skeleton is None:
+                with stage('docx_skeleton'):
+                    skeleton = _SKELETONS[key] = build_docx_skeleton(doc_type, theme)
+    return skeleton
+
+def preload_docx_skeletons():
+    """Construire tous les squelettes (préchauffage des workers)"""
+    for doc_type in ('devis', 'facture'):
+        for theme in THEMES_COULEURS_DOCX:
+            get_docx_skeleton(doc_type, theme)
+
+def _open_skeleton(doc_type, theme):
+    """Nouveau document à partir du squelette, ses blocs à remplir et le squelette"""
+    skeleton = get_docx_skeleton(doc_type, theme)
+    doc = Document(BytesIO(skeleton.blob))
+    body = doc.element.body
+    return doc, {name: body[index] for name, index in skeleton.blocks.items()}, skeleton
+
+def _set_text(p, text):
+    """Texte d'un paragraphe vide (comme doc.add_paragraph(text))"""
+    if text:
+        p.add_r().text = text
+
+def _set_run_text(p, text):
+    """Texte du run préparé dans le squelette (mise en forme conservée)"""
+    p.r_lst[0].text = text
+
+def _fill_values(tbl, values):
+    """Colonne des valeurs d'un tableau libellé / valeur"""
+    for tr, value in zip(tbl.tr_lst, values):
+        _set_run_text(tr.tc_lst[1].p_lst[0], value)
+
+def _fill_optional(body, p, text):
+    """Paragraphe facultatif : rempli, ou retiré si le texte est vide"""
+    if text:
+        _set_text(p, text)
+    else:
+        body.remove(p)
+
+def _fill_items(tbl, rows, with_discounts):
+    """Une ligne par article (et par remise), copiée des lignes modèles du squelette"""
+    templates = tbl.tr_lst[1:]
+    for tr in templates:
+        tbl.remove(tr)
+    item_template = templates[0]
+    discount_template = templates[1] if with_discounts else None
+    
+    for description, details, quantite, prix_unitaire, tva_taux, remise, total_ht in rows:
         # Description avec détails
-        desc_text = item.description
-        if item.details:
-            desc_text += '\n' + '\n'.join([f'• {detail}' for detail in item.details])
-        cells[0].text = desc_text
+        desc_text = description
+        if details:
+            desc_text += '\n' + '\n'.join([f'• {detail}' for detail in details])
         
-        # Données numériques
-        cells[1].text = str(item.quantite)
-        cells[2].text = f'{item.prix_unitaire:.2f} €'
-        cells[3].text = f'{item.tva_taux} %'
-        cells[4].text = f'{item.total_ht:.2f} €'
-        
-        # Alignement des cellules numériques
-        for i in range(1, 5):
-            cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        tr = copy.deepcopy(item_template)
+        texts = (desc_text, str(quantite), f'{prix_unitaire:.2f} €', f'{tva_taux} %', f'{to_euros(total_ht):.2f} €')
+        for tc, text in zip(tr.tc_lst, texts):
+            tc.p_lst[0].add_r().text = text
+        tbl.append(tr)
         
         # Remise si applicable
-        if item.remise > 0:
-            remise_row = items_table.add_row()
-            remise_cells = remise_row.cells
-            remise_cells[3].text = 'Remise'
-            remise_cells[4].text = f'-{item.remise:.2f} €'
-            remise_cells[4].paragraphs[0].runs[0].font.color.rgb = RGBColor(231, 76, 60)  # Rouge
-            remise_cells[3].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            remise_cells[4].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    
-    doc.add_paragraph()  # Espace
-    
-    # Totaux
-    totals_table = doc.add_table(rows=3, cols=2)
-    totals_table.style = 'Light List'
-    
-    totals_data = [
-        ('Total HT', f'{devis.total_ht:.2f} €'),
-        ('TVA (20%)', f'{devis.total_tva:.2f} €'),
-        ('TOTAL TTC', f'{devis.total_ttc:.2f} €')
-    ]
-    
-    for i, (label, value) in enumerate(totals_data):
-        totals_table.cell(i, 0).text = label
-        totals_table.cell(i, 1).text = value
-        totals_table.cell(i, 0).paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        totals_table.cell(i, 1).paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        # Mettre en gras et colorer la ligne TOTAL TTC avec couleur du thème
-        if i == 2:
-            for j in range(2):
-                run = totals_table.cell(i, j).paragraphs[0].runs[0]
-                run.bold = True
-                run.font.size = Pt(12)
-                run.font.color.rgb = couleurs['principale']
+        if discount_template is not None and remise > 0:
+            tr = copy.deepcopy(discount_template)
+            _set_run_text(tr.tc_lst[4].p_lst[0], f'-{to_euros(to_cents(remise)):.2f} €')
+            tbl.append(tr)
+
+# --- Écriture directe des lignes d'articles ----------------------------------
+#
+# Pour les gros tableaux, les lignes ne passent pas par l'arbre lxml : le XML de
+# chaque ligne est produit à partir des lignes modèles du squelette et écrit par
+# morceaux dans word/document.xml, directement dans l'archive. Mémoire bornée
+# (un morceau de lignes à la fois) et temps linéaire.
+
+_TEXT_TOKEN = '__TEXTE__'
+_ITEMS_MARKER = 'articles'
+_STREAM_CHUNK_ROWS = 256
+
+_NAMESPACE_DECLARATION = re.compile(r' xmlns:\w+="[^"]*"')
+_RUN_BREAKS = re.compile(r'([\t\r\n])')
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+def _row_fragments(tr, cell_count):
+    """
+    XML d'une ligne modèle découpé autour du texte de ses cellules : cell_count
+    premières cellules pour une ligne d'article, dernière cellule (montant) pour une remise.
+    """
+    tr = copy.deepcopy(tr)
+    if cell_count == 1:
+        tr.tc_lst[-1].p_lst[0].r_lst[0].text = _TEXT_TOKEN
+    else:
+        for tc in tr.tc_lst[:cell_count]:
+            tc.p_lst[0].add_r().text = _TEXT_TOKEN
+    # Les espaces de noms sont déclarés sur la racine de document.xml
+    xml = _NAMESPACE_DECLARATION.sub('', etree.tostring(tr, encoding='unicode'))
+    return tuple(xml.split(f'<w:t>{_TEXT_TOKEN}</w:t>'))
+
+def _run_content_xml(text):
+    """Contenu XML d'un run, identique à run.text = text (tabulations et sauts de ligne compris)"""
+    if _XML_INVALID.search(text):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+    parts = []
+    for piece in _RUN_BREAKS.split(text):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\r', '\n'):
+            parts.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    return ''.join(parts)
+
+def _row_xml(fragments, texts):
+    parts = [fragments[0]]
+    for text, fragment in zip(texts, fragments[1:]):
+        parts.append(_run_content_xml(text))
+        parts.append(fragment)
+    return ''.join(parts)
+
+def _iter_rows_xml(rows, row_xml, with_discounts):
+    """XML des lignes d'articles (et de remises), par morceaux de _STREAM_CHUNK_ROWS articles"""
+    item_fragments = row_xml[0]
+    discount_fragments = row_xml[1] if with_discounts else None
+    chunk = []
+    for description, details, quantite, prix_unitaire, tva_taux, remise, total_ht in rows:
+        desc_text = description
+        if details:
+            desc_text += '\n' + '\n'.join([f'• {detail}' for detail in details])
+        chunk.append(_row_xml(item_fragments, (
+            desc_text, str(quantite), f'{prix_unitaire:.2f} €', f'{tva_taux} %', f'{to_euros(total_ht):.2f} €'
+        )))
+        if discount_fragments is not None and remise > 0:
+            chunk.append(_row_xml(discount_fragments, (f'-{to_euros(to_cents(remise)):.2f} €',)))
+        if len(chunk) >= _STREAM_CHUNK_ROWS:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+def _save_streaming(doc, tbl, rows, row_xml, target, with_discounts):
+    """
+    Enregistrer le document avec un repère à la place des lignes d'articles, puis
+    recopier l'archive en écrivant les lignes au repère dans word/document.xml.
+    """
+    for tr in tbl.tr_lst[1:]:
+        tbl.remove(tr)
+    tbl.append(etree.Comment(_ITEMS_MARKER))
+    buffer = BytesIO()
+    doc.save(buffer)
+    
+    marker = f'<!--{_ITEMS_MARKER}-->'.encode('utf-8')
+    with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as package:
+        for info in source.infolist():
+            if info.filename != 'word/document.xml':
+                package.writestr(info, source.read(info))
+                continue
+            head, tail = source.read(info).split(marker, 1)
+            with package.open(info, 'w') as stream:
+                stream.write(head)
+                for chunk in _iter_rows_xml(rows, row_xml, with_discounts):
+                    stream.write(chunk)
+                stream.write(tail)
+
+def _save(doc, blocks, skeleton, items, target, with_discounts):
+    """Ajouter les articles et enregistrer (écriture directe pour les gros tableaux)"""
+    if len(items) >= DOCX_STREAM_MIN_ITEMS:
+        with stage('docx_save'):
+            _save_streaming(doc, blocks['articles'], items.rows(), skeleton.row_xml, target, with_discounts)
+        return
+    _fill_items(blocks['articles'], items.rows(), with_discounts)
+    with stage('docx_save'):
+        doc.save(target)
+
+def _fill_common(doc, blocks, document):
+    """Blocs communs au devis et à la facture"""
+    add_header_logo(Paragraph(blocks['entete'].tr_lst[0].tc_lst[1].p_lst[0], doc._body), document.logo_url)
+    _set_run_text(blocks['entreprise'], document.fournisseur_nom.upper())
     
-    doc.add_paragraph()  # Espace
+    _set_text(blocks['emetteur'], f'{document.fournisseur_nom}\n{document.fournisseur_adresse}\n{document.fournisseur_ville}')
+    _set_text(blocks['emetteur_contact'], f'Email: {document.fournisseur_email}\nTél: {document.fournisseur_telephone}\nSIRET: {document.fournisseur_siret}')
+    _set_text(blocks['client'], f'{document.client_nom}\n{document.client_adresse}\n{document.client_ville}')
+    _set_text(blocks['client_legal'], f'SIRET: {document.client_siret}\nN° TVA: {document.client_tva}')
     
-    # Conditions de paiement
-    doc.add_heading('CONDITIONS DE PAIEMENT', level=2)
-    doc.add_paragraph(devis.conditions_paiement)
-    doc.add_paragraph(devis.penalites_retard).runs[0].font.size = Pt(8)
+    _fill_values(blocks['totaux'], [f'{document.total_ht:.2f} €', f'{document.total_tva:.2f} €', f'{document.total_ttc:.2f} €'])
     
-    doc.add_paragraph()  # Espace
+    _set_text(blocks['conditions'], document.conditions_paiement)
+    _set_run_text(blocks['penalites'], document.penalites_retard)
+    _fill_values(blocks['banque'], [document.banque_nom, document.banque_iban, document.banque_bic])
+
+def generate_docx_devis(devis, theme='bleu', output=None):
+    """Générer un DOCX de devis modifiable avec thème coloré et logo (fichier ou flux si output est fourni)"""
+    sink = OutputSink(output, f'devis_{devis.numero}_{theme}.docx')
+    doc, blocks, skeleton = _open_skeleton('devis', theme)
+    body = doc.element.body
     
-    # Informations bancaires
-    doc.add_heading('COORDONNÉES BANCAIRES', level=2)
-    bank_table = doc.add_table(rows=3, cols=2)
-    bank_table.style = 'Light Grid'
+    _fill_common(doc, blocks, devis)
+    _fill_values(blocks['informations'], [devis.numero, devis.date_emission, devis.date_expiration])
     
-    bank_data = [
-        ('Banque:', devis.banque_nom),
-        ('IBAN:', devis.banque_iban),
-        ('BIC:', devis.banque_bic)
-    ]
+    _fill_optional(body, blocks['client_email'], devis.client_email and f'Email: {devis.client_email}')
+    _fill_optional(body, blocks['client_telephone'], devis.client_telephone and f'Tél: {devis.client_telephone}')
     
-    for i, (label, value) in enumerate(bank_data):
-        bank_table.cell(i, 0).text = label
-        bank_table.cell(i, 1).text = value
-        bank_table.cell(i, 0).paragraphs[0].runs[0].bold = True
+    # Texte d'introduction si présent
+    _fill_optional(body, blocks['intro'], devis.texte_intro)
+    if not devis.texte_intro:
+        body.remove(blocks['intro_espace'])
     
     # Texte de conclusion
-    if devis.texte_conclusion:
-        doc.add_paragraph()
-        doc.add_paragraph(devis.texte_conclusion)
+    _fill_optional(body, blocks['conclusion'], devis.texte_conclusion)
+    if not devis.texte_conclusion:
+        body.remove(blocks['conclusion_espace'])
     
-    # Signature
-    doc.add_paragraph()
-    doc.add_paragraph()
-    doc.add_paragraph('Bon pour accord')
-    doc.add_paragraph('Date et signature:')
-    doc.add_paragraph('_______________________')
-    
-    # Sauvegarder
-    doc.save(filename)
-    return filename
+    # Articles, puis sauvegarde
+    _save(doc, blocks, skeleton, devis.items, sink.target, with_discounts=True)
+    return sink.finish()
 
-def generate_docx_facture(facture, theme='bleu'):
-    """Générer un DOCX de facture modifiable avec thème coloré et logo"""
+def generate_docx_facture(facture, theme='bleu', output=None):
+    """Générer un DOCX de facture modifiable avec thème coloré et logo (fichier ou flux si output est fourni)"""
     # Récupérer les couleurs du thème
     couleurs = THEMES_COULEURS_DOCX.get(theme, THEMES_COULEURS_DOCX['bleu'])
     
-    filename = os.path.join('generated', f'facture_{facture.numero}_{theme}.docx')
-    doc = Document()
-    
-    # Styles du document
-    style = doc.styles['Normal']
-    font = style.font
-    font.name = 'Arial'
-    font.size = Pt(10)
-    
-    # NOUVEAU: En-tête avec titre et logo
-    create_header_with_logo_and_title(doc, facture.logo_url, "FACTURE")
-    
-    # Nom de l'entreprise avec couleur du thème
-    company = doc.add_paragraph()
-    company.add_run(facture.fournisseur_nom.upper()).bold = True
-    company.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    company.runs[0].font.size = Pt(16)
-    company.runs[0].font.color.rgb = couleurs['principale']
-    
-    doc.add_paragraph()  # Espace
+    sink = OutputSink(output, f'facture_{facture.numero}_{theme}.docx')
+    doc, blocks, skeleton = _open_skeleton('facture', theme)
     
-    # Informations de la facture
-    info_table = doc.add_table(rows=6, cols=2)
-    info_table.style = 'Light List'
+    _fill_common(doc, blocks, facture)
     
     # Données de la facture
     info_data = [
@@ -348,16 +563,20 @@ def generate_docx_facture(facture, theme='bleu'):
         ('Réf. devis:', facture.reference_devis)
     ]
     
+    info_table = Table(blocks['informations'], doc._body)
+    rows = info_table._tbl.tr_lst
     row_index = 0
     for label, value in info_data:
         if value:  # N'ajouter que si la valeur existe
-            info_table.cell(row_index, 0).text = label
-            info_table.cell(row_index, 1).text = value
-            info_table.cell(row_index, 0).paragraphs[0].runs[0].bold = True
+            label_cell = _Cell(rows[row_index].tc_lst[0], info_table)
+            value_cell = _Cell(rows[row_index].tc_lst[1], info_table)
+            label_cell.text = label
+            value_cell.text = value
+            label_cell.paragraphs[0].runs[0].bold = True
             
             # Colorer le statut selon sa valeur
             if label == 'Statut:':
-                run = info_table.cell(row_index, 1).paragraphs[0].runs[0]
+                run = value_cell.paragraphs[0].runs[0]
                 if value == 'En retard':
                     run.font.color.rgb = RGBColor(231, 76, 60)  # Rouge
                 elif value == 'Payée':
@@ -369,106 +588,9 @@ def generate_docx_facture(facture, theme='bleu'):
             row_index += 1
     
     # Supprimer les lignes vides
-    for i in range(row_index, 6):
-        info_table._element.remove(info_table.rows[row_index]._element)
-    
-    doc.add_paragraph()  # Espace
-    
-    # Informations Fournisseur / Client
-    doc.add_heading('ÉMETTEUR', level=2)
-    doc.add_paragraph(f'{facture.fournisseur_nom}\n{facture.fournisseur_adresse}\n{facture.fournisseur_ville}')
-    doc.add_paragraph(f'Email: {facture.fournisseur_email}\nTél: {facture.fournisseur_telephone}\nSIRET: {facture.fournisseur_siret}')
-    
-    doc.add_heading('CLIENT', level=2)
-    doc.add_paragraph(f'{facture.client_nom}\n{facture.client_adresse}\n{facture.client_ville}')
-    doc.add_paragraph(f'SIRET: {facture.client_siret}\nN° TVA: {facture.client_tva}')
-    
-    # Articles (même structure que devis)
-    items_table = doc.add_table(rows=1, cols=5)
-    items_table.style = 'Table Grid'
-    
-    # En-têtes avec couleur du thème
-    headers = ['Description', 'Qté', 'Prix unitaire', 'TVA (%)', 'Total HT']
-    header_cells = items_table.rows[0].cells
-    for i, header in enumerate(headers):
-        header_cells[i].text = header
-        run = header_cells[i].paragraphs[0].runs[0]
-        run.bold = True
-        run.font.color.rgb = RGBColor(255, 255, 255)
-        set_cell_background(header_cells[i], couleurs['header_bg'])
-    
-    # Ajouter les articles
-    for item in facture.items:
-        row = items_table.add_row()
-        cells = row.cells
-        
-        desc_text = item.description
-        if item.details:
-            desc_text += '\n' + '\n'.join([f'• {detail}' for detail in item.details])
-        
-        cells[0].text = desc_text
-        cells[1].text = str(item.quantite)
-        cells[2].text = f'{item.prix_unitaire:.2f} €'
-        cells[3].text = f'{item.tva_taux} %'
-        cells[4].text = f'{item.total_ht:.2f} €'
-        
-        for i in range(1, 5):
-            cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    
-    # Totaux
-    doc.add_paragraph()
-    totals_table = doc.add_table(rows=3, cols=2)
-    totals_table.style = 'Light List'
-    
-    totals_data = [
-        ('Total HT', f'{facture.total_ht:.2f} €'),
-        ('TVA (20%)', f'{facture.total_tva:.2f} €'),
-        ('TOTAL TTC', f'{facture.total_ttc:.2f} €')
-    ]
-    
-    for i, (label, value) in enumerate(totals_data):
-        totals_table.cell(i, 0).text = label
-        totals_table.cell(i, 1).text = value
-        totals_table.cell(i, 0).paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        totals_table.cell(i, 1).paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        if i == 2:  # Total TTC avec couleur du thème
-            for j in range(2):
-                run = totals_table.cell(i, j).paragraphs[0].runs[0]
-                run.bold = True
-                run.font.size = Pt(12)
-                run.font.color.rgb = couleurs['principale']
-    
-    # Conditions et informations bancaires
-    doc.add_paragraph()
-    doc.add_heading('CONDITIONS DE PAIEMENT', level=2)
-    doc.add_paragraph(facture.conditions_paiement)
-    doc.add_paragraph(facture.penalites_retard).runs[0].font.size = Pt(8)
-    
-    doc.add_paragraph()
-    doc.add_heading('COORDONNÉES BANCAIRES', level=2)
-    bank_table = doc.add_table(rows=3, cols=2)
-    bank_table.style = 'Light Grid'
-    
-    bank_data = [
-        ('Banque:', facture.banque_nom),
-        ('IBAN:', facture.banque_iban),
-        ('BIC:', facture.banque_bic)
-    ]
+    for tr in rows[row_index:]:
+        info_table._tbl.remove(tr)
     
-    for i, (label, value) in enumerate(bank_data):
-        bank_table.cell(i, 0).text = label
-        bank_table.cell(i, 1).text = value
-        bank_table.cell(i, 0).paragraphs[0].runs[0].bold = True
-    
-    # Mentions légales
-    doc.add_paragraph()
-    doc.add_paragraph()
-    legal = doc.add_paragraph()
-    legal.add_run('Mentions légales: ').bold = True
-    legal.add_run('TVA sur les encaissements. En cas de retard de paiement, seront exigibles, conformément à l\'article L441-10 du code de commerce, une indemnité calculée sur la base de trois fois le taux de l\'intérêt légal en vigueur ainsi qu\'une indemnité forfaitaire pour frais de recouvrement de 40 euros.')
-    legal.runs[1].font.size = Pt(8)
-    
-    # Sauvegarder
-    doc.save(filename)
-    return filename
+    # Articles, puis sauvegarde
+    _save(doc, blocks, skeleton, facture.items, sink.target, with_discounts=False)
+    return sink.finish()
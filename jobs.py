@@ -0,0 +1,301 @@
+# jobs.py - Rendus asynchrones : file de travaux locale, état partagé dans SQLite
+import ipaddress
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+
+from payloads import BUILDERS, PayloadError, resolve_theme, resolve_format
+from rendering import render_cached, FORMATS_SUPPORTES, download_name
+from storage import storage
+
+# Configuration (modifiable par variables d'environnement)
+JOBS_DB = os.environ.get('JOBS_DB', os.path.join('cache', 'jobs.sqlite3'))
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+JOBS_QUEUE_MAX = int(os.environ.get('JOBS_QUEUE_MAX', 1000))
+JOBS_RETENTION = int(os.environ.get('JOBS_RETENTION', 24 * 3600))  # secondes
+CALLBACK_TIMEOUT = float(os.environ.get('JOBS_CALLBACK_TIMEOUT', 10))
+# Hôtes autorisés pour callback_url, séparés par des virgules (".exemple.fr" : sous-domaines).
+# Vide : tout hôte public ; les adresses locales et privées sont toujours refusées.
+JOBS_CALLBACK_HOSTS = tuple(
+    host.strip().lower() for host in os.environ.get('JOBS_CALLBACK_HOSTS', '').split(',') if host.strip()
+)
+
+# Statuts d'un travail
+EN_ATTENTE = 'en_attente'
+EN_COURS = 'en_cours'
+TERMINE = 'termine'
+ECHEC = 'echec'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    statut TEXT NOT NULL,
+    progression INTEGER NOT NULL DEFAULT 0,
+    type TEXT NOT NULL,
+    theme TEXT NOT NULL,
+    format TEXT NOT NULL,
+    numero TEXT,
+    nom_fichier TEXT,
+    chemin TEXT,
+    taille INTEGER,
+    erreur TEXT,
+    callback_url TEXT,
+    cree_le REAL NOT NULL,
+    maj_le REAL NOT NULL
+)
+"""
+
+
+class JobQueueFull(Exception):
+    """Trop de travaux en attente (réponse 503)"""
+
+
+def _callback_host_allowed(host):
+    for allowed in JOBS_CALLBACK_HOSTS:
+        if host == allowed or (allowed.startswith('.') and host.endswith(allowed)):
+            return True
+    return False
+
+
+def _is_internal_address(address):
+    """Adresse IP non publique (boucle locale, réseau privé, lien local, métadonnées...)"""
+    try:
+        return not ipaddress.ip_address(address.split('%', 1)[0]).is_global
+    except ValueError:
+        return False
+
+
+def validate_callback_url(callback_url):
+    """
+    URL de notification d'un travail : http(s) avec un hôte autorisé, ou None.
+    Lève PayloadError : le serveur ne doit pas pouvoir être utilisé pour appeler
+    des adresses internes.
+    """
+    if callback_url is None or callback_url == '':
+        return None
+    if not isinstance(callback_url, str):
+        raise PayloadError("❌ 'callback_url' doit être une URL http ou https")
+    try:
+        parts = urlsplit(callback_url.strip())
+        scheme, host = parts.scheme, parts.hostname
+        parts.port  # port invalide : ValueError
+    except ValueError:
+        scheme = host = None
+    if scheme not in ('http', 'https') or not host:
+        raise PayloadError("❌ 'callback_url' doit être une URL http ou https")
+    if JOBS_CALLBACK_HOSTS:
+        if not _callback_host_allowed(host):
+            raise PayloadError(f"❌ Hôte de 'callback_url' non autorisé : {host}")
+    elif host == 'localhost' or host.endswith('.localhost') or _is_internal_address(host):
+        raise PayloadError(f"❌ 'callback_url' ne peut pas viser une adresse locale ou privée : {host}")
+    return callback_url.strip()
+
+
+def _resolves_internal(host):
+    """Le nom résout vers une adresse non publique (vérifié au moment de la notification)"""
+    try:
+        addresses = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    except OSError:
+        return False  # la requête échouera d'elle-même
+    return any(_is_internal_address(address[4][0]) for address in addresses)
+
+
+class JobStore:
+    """État des travaux dans SQLite : visible par tous les workers gunicorn"""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    with sqlite3.connect(self.path, timeout=10) as conn:
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.execute(_SCHEMA)
+                    self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, job_id, doc_type, theme, output_format, numero, nom_fichier, callback_url=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, statut, progression, type, theme, format, numero, nom_fichier,"
+                " callback_url, cree_le, maj_le) VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, EN_ATTENTE, doc_type, theme, output_format, numero, nom_fichier,
+                 callback_url, now, now)
+            )
+
+    def update(self, job_id, **fields):
+        fields['maj_le'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def purge(self, older_than):
+        """Supprimer les travaux terminés depuis plus de older_than secondes"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE statut IN (?, ?) AND maj_le < ?",
+                         (TERMINE, ECHEC, time.time() - older_than))
+
+
+class JobManager:
+    """
+    File de travaux en mémoire traitée par des threads ; l'état et le résultat sont
+    persistés (SQLite + generated/) pour être consultés depuis n'importe quel worker.
+    """
+
+    def __init__(self, store=None, workers=JOBS_WORKERS, max_queue=JOBS_QUEUE_MAX):
+        self.store = store or JobStore()
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'jobs-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, data, callback_url=None):
+        """
+        Valider les données, créer le travail et le mettre en file.
+        Lève PayloadError (données invalides) ou JobQueueFull.
+        """
+        if not isinstance(data, dict):
+            raise PayloadError("❌ Aucune donnée reçue")
+        callback_url = validate_callback_url(callback_url)
+
+        doc_type = data.get('type', 'devis')
+        builder = BUILDERS.get(doc_type)
+        if builder is None:
+            raise PayloadError(f"❌ Type de document inconnu: {doc_type}")
+
+        output_format = resolve_format(data)
+        if output_format not in FORMATS_SUPPORTES:
+            raise PayloadError("Format non supporté. Utilisez 'pdf' ou 'docx'")
+
+        # Construction immédiate : les erreurs de données sont renvoyées tout de suite
+        document = builder(data)
+        theme = resolve_theme(data)
+
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, doc_type, theme, output_format, document.numero,
+                          download_name(doc_type, document.numero, theme, output_format),
+                          callback_url)
+        try:
+            self._queue.put_nowait((job_id, document, doc_type, theme, output_format, callback_url))
+        except queue.Full:
+            self.store.update(job_id, statut=ECHEC, erreur="File de travaux pleine")
+            raise JobQueueFull("Trop de travaux en attente, réessayez plus tard")
+
+        self._ensure_workers()
+        self._maybe_purge()
+        return job_id
+
+    def _maybe_purge(self):
+        """Oublier de temps en temps les travaux anciens (au plus toutes les 10 minutes)"""
+        now = time.time()
+        if now - self._last_purge < 600:
+            return
+        self._last_purge = now
+        try:
+            self.store.purge(JOBS_RETENTION)
+        except sqlite3.Error as e:
+            print(f"Erreur lors de la purge des travaux: {e}")
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._process(*job)
+            except Exception as e:
+                print(f"❌ Erreur travail {job[0]}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job_id, document, doc_type, theme, output_format, callback_url):
+        self.store.update(job_id, statut=EN_COURS, progression=10)
+        try:
+            data, _, _ = render_cached(document, doc_type, theme, output_format, block=True)
+            self.store.update(job_id, progression=90)
+            path = storage.store(download_name(doc_type, document.numero, theme, output_format), data)
+        except Exception as e:
+            self.store.update(job_id, statut=ECHEC, erreur=str(e))
+        else:
+            self.store.update(job_id, statut=TERMINE, progression=100, chemin=path, taille=len(data))
+
+        if callback_url:
+            self._notify(job_id, callback_url)
+
+    def _notify(self, job_id, callback_url):
+        """Prévenir le client (webhook) que le travail est fini"""
+        job = self.store.get(job_id)
+        host = urlsplit(callback_url).hostname
+        # Sans liste d'hôtes, un nom public peut résoudre vers une adresse interne
+        if not JOBS_CALLBACK_HOSTS and _resolves_internal(host):
+            print(f"Erreur lors de la notification du travail {job_id}: {host} résout vers une adresse interne")
+            return
+        try:
+            # Pas de redirection : elle pourrait viser une adresse interne
+            requests.post(callback_url, json=public_view(job), timeout=CALLBACK_TIMEOUT, allow_redirects=False)
+        except Exception as e:
+            print(f"Erreur lors de la notification du travail {job_id}: {e}")
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def result_path(self, job):
+        """Chemin du fichier résultat s'il existe encore (sinon None : expiré)"""
+        path = job.get('chemin')
+        if path and os.path.exists(path):
+            storage.touch(path)
+            return path
+        return None
+
+
+def public_view(job):
+    """Représentation JSON d'un travail renvoyée aux clients"""
+    view = {
+        'id': job['id'],
+        'statut': job['statut'],
+        'progression': job['progression'],
+        'type': job['type'],
+        'theme': job['theme'],
+        'format': job['format'],
+        'numero': job['numero'],
+        'cree_le': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(job['cree_le'])),
+        'maj_le': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(job['maj_le'])),
+        'status_url': f"/api/jobs/{job['id']}",
+    }
+    if job['statut'] == TERMINE:
+        view['file_url'] = f"/api/jobs/{job['id']}/file"
+        view['taille'] = job['taille']
+    if job['erreur']:
+        view['erreur'] = job['erreur']
+    return view
+
+
+# Instance partagée
+job_manager = JobManager()
@@ -0,0 +1,65 @@
+# json_provider.py - JSON rapide (orjson, si installé) pour l'API, repli sur le module json standard
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # facultatif : pip install orjson
+except ImportError:
+    orjson = None
+
+# JSON_FAST=0 : module json standard même si orjson est installé
+JSON_FAST = os.environ.get('JSON_FAST', '1').lower() not in ('0', 'false', 'no', 'non')
+
+FAST_JSON_ENABLED = orjson is not None and JSON_FAST
+
+_COMPACT = {'separators': (',', ':')}
+
+
+def loads(data):
+    """Décoder un document JSON (str ou bytes) ; lève ValueError s'il est invalide"""
+    if FAST_JSON_ENABLED:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Fournisseur JSON de Flask basé sur orjson : request.json, jsonify et app.json.
+    Même sortie que le fournisseur standard (clés triées, compacte, saut de ligne
+    final), sauf les caractères non ASCII écrits en UTF-8 au lieu de \\uXXXX.
+    Les options propres au module json (indent...) repassent par le module standard.
+    """
+
+    if orjson is not None:
+        _options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def _dumps_bytes(self, obj, option=0):
+        # default : dates au format HTTP, Decimal, UUID... comme le fournisseur standard
+        return orjson.dumps(obj, default=self.default, option=self._options | option)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs and kwargs != _COMPACT:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Mode debug : sortie indentée du fournisseur standard
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj, orjson.OPT_APPEND_NEWLINE), mimetype=self.mimetype)
+
+
+def install_json_provider(app):
+    """Utiliser orjson pour l'application si disponible (sinon le fournisseur standard reste en place)"""
+    if FAST_JSON_ENABLED:
+        app.json_provider_class = FastJSONProvider
+        app.json = FastJSONProvider(app)
+    return app.json
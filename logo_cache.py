@@ -0,0 +1,357 @@
+# logo_cache.py - Cache des logos partagé par les générateurs PDF et DOCX
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from asset_fetcher import asset_fetcher
+from metrics import stage
+from storage import atomic_write
+
+# Configuration (modifiable par variables d'environnement)
+LOGO_CACHE_DIR = os.environ.get('LOGO_CACHE_DIR', os.path.join('cache', 'logos'))
+LOGO_CACHE_TTL = int(os.environ.get('LOGO_CACHE_TTL', 3600))  # secondes avant revalidation
+LOGO_CACHE_NEGATIVE_TTL = int(os.environ.get('LOGO_CACHE_NEGATIVE_TTL', 60))  # échecs mémorisés
+LOGO_CACHE_MAX_ITEMS = int(os.environ.get('LOGO_CACHE_MAX_ITEMS', 128))
+LOGO_CACHE_MAX_BYTES = int(os.environ.get('LOGO_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+LOGO_CACHE_DISK_BYTES = int(os.environ.get('LOGO_CACHE_DISK_BYTES', 128 * 1024 * 1024))
+LOGO_FETCH_TIMEOUT = float(os.environ.get('LOGO_FETCH_TIMEOUT', 10))
+
+# Blob sans index depuis ce délai (s) : orphelin, supprimable (sinon écriture en cours)
+_ORPHAN_AGE = 60
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _listdir(directory):
+    try:
+        return os.listdir(directory)
+    except OSError:
+        return []
+
+
+class LogoEntry:
+    """Logo en cache : contenu et métadonnées HTTP pour la revalidation"""
+    __slots__ = ('url', 'content', 'digest', 'etag', 'last_modified', 'fetched_at')
+
+    def __init__(self, url, content, digest, etag='', last_modified='', fetched_at=0.0):
+        self.url = url
+        self.content = content
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, ttl, now=None):
+        return ((now or time.time()) - self.fetched_at) < ttl
+
+    def to_index(self):
+        return {
+            'url': self.url,
+            'sha256': self.digest,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'fetched_at': self.fetched_at,
+            'size': len(self.content),
+        }
+
+
+class LogoCache:
+    """
+    Cache à deux niveaux pour les logos, indexé par URL :
+    - un LRU en mémoire borné (nombre d'entrées et octets) propre au processus
+    - un stockage disque adressé par contenu (sha256), partagé entre les workers,
+      borné en octets : les URL les moins récemment utilisées sont oubliées
+
+    Après le TTL, l'entrée est revalidée avec If-None-Match / If-Modified-Since :
+    un 304 ne retélécharge rien. En cas d'erreur réseau, l'ancienne version est servie.
+    """
+
+    def __init__(self, directory=LOGO_CACHE_DIR, ttl=LOGO_CACHE_TTL,
+                 max_items=LOGO_CACHE_MAX_ITEMS, max_bytes=LOGO_CACHE_MAX_BYTES,
+                 disk_bytes=LOGO_CACHE_DISK_BYTES, negative_ttl=LOGO_CACHE_NEGATIVE_TTL, timeout=LOGO_FETCH_TIMEOUT, fetcher=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk_bytes = disk_bytes
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.fetcher = fetcher or asset_fetcher
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_used = None  # calculé au premier besoin
+        self._failures = {}
+        self._lock = threading.Lock()
+
+        # Statistiques simples (hits mémoire / disque, revalidations, téléchargements)
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'revalidated': 0,
+                      'downloads': 0, 'errors': 0, 'evictions': 0}
+
+    # --- Chemins sur disque -------------------------------------------------
+
+    def _index_path(self, url):
+        return os.path.join(self.directory, 'index', _sha256(url.encode('utf-8')) + '.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, 'blobs', digest[:2], digest)
+
+    # --- Niveau mémoire -----------------------------------------------------
+
+    def _memory_get(self, url):
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+            return entry
+
+    def _memory_put(self, entry):
+        size = len(entry.content)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(entry.url, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous.content)
+            self._memory[entry.url] = entry
+            self._memory_bytes += size
+            # Éviction LRU
+            while self._memory and (len(self._memory) > self.max_items
+                                    or self._memory_bytes > self.max_bytes):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.content)
+
+    # --- Niveau disque ------------------------------------------------------
+
+    def _disk_get(self, url):
+        index_path = self._index_path(url)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._blob_path(meta['sha256']), 'rb') as f:
+                content = f.read()
+            os.utime(index_path, None)  # ordre LRU (mtime de l'index = dernier accès)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        if _sha256(content) != meta['sha256']:
+            return None  # blob corrompu : on retélécharge
+
+        return LogoEntry(url, content, meta['sha256'], meta.get('etag', ''),
+                         meta.get('last_modified', ''), meta.get('fetched_at', 0.0))
+
+    def _disk_put(self, entry, write_blob=True):
+        written = 0
+        try:
+            blob_path = self._blob_path(entry.digest)
+            if write_blob and not os.path.exists(blob_path):
+                atomic_write(blob_path, entry.content)
+                written += len(entry.content)
+            index = json.dumps(entry.to_index()).encode('utf-8')
+            atomic_write(self._index_path(entry.url), index)
+            written += len(index)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du cache logo: {e}")
+            return
+
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = self._disk_usage()[0]
+            else:
+                self._disk_used += written
+            over_quota = self.disk_bytes and self._disk_used > self.disk_bytes
+        if over_quota:
+            self._disk_evict()
+
+    def _disk_usage(self):
+        """(octets utilisés, index [(dernier accès, taille, chemin, sha256)], blobs {sha256: (taille, mtime)})"""
+        indexes = []
+        index_dir = os.path.join(self.directory, 'index')
+        for name in _listdir(index_dir):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(index_dir, name)
+            try:
+                st = os.stat(path)
+                with open(path, 'r', encoding='utf-8') as f:
+                    digest = json.load(f)['sha256']
+            except (OSError, ValueError, KeyError):
+                digest = None  # index illisible : supprimé en premier
+                st = None
+            indexes.append((st.st_mtime if st else 0.0, st.st_size if st else 0, path, digest))
+
+        blobs = {}
+        blob_dir = os.path.join(self.directory, 'blobs')
+        for prefix in _listdir(blob_dir):
+            for name in _listdir(os.path.join(blob_dir, prefix)):
+                if name.startswith('.'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(blob_dir, prefix, name))
+                except OSError:
+                    continue
+                blobs[name] = (st.st_size, st.st_mtime)
+
+        used = sum(size for _, size, _, _ in indexes) + sum(size for size, _ in blobs.values())
+        return used, indexes, blobs
+
+    def _disk_evict(self):
+        """Oublier les URL les moins récemment utilisées jusqu'à 90 % du quota"""
+        total, indexes, blobs = self._disk_usage()
+        target = self.disk_bytes * 0.9
+        references = {}
+        for _, _, _, digest in indexes:
+            references[digest] = references.get(digest, 0) + 1
+
+        def remove_blob(digest):
+            nonlocal total
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                return
+            total -= blobs[digest][0]
+
+        # Blobs qu'aucun index ne référence plus
+        now = time.time()
+        for digest, (_, mtime) in blobs.items():
+            if digest not in references and now - mtime > _ORPHAN_AGE:
+                remove_blob(digest)
+
+        # Puis les URL les moins récemment utilisées (un blob part avec son dernier index)
+        indexes.sort(key=lambda index: index[0])
+        for _, size, path, digest in indexes:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats['evictions'] += 1
+            references[digest] -= 1
+            if not references[digest] and digest in blobs:
+                remove_blob(digest)
+
+        with self._lock:
+            self._disk_used = total
+
+    # --- Réseau -------------------------------------------------------------
+
+    def revalidation_headers(self, stale):
+        """En-têtes conditionnels pour revalider une entrée périmée"""
+        headers = {}
+        if stale is not None:
+            if stale.etag:
+                headers['If-None-Match'] = stale.etag
+            if stale.last_modified:
+                headers['If-Modified-Since'] = stale.last_modified
+        return headers
+
+    def store_response(self, url, status_code, content, headers, stale=None):
+        """Enregistrer la réponse HTTP d'un téléchargement ; retourne une LogoEntry ou None"""
+        if status_code == 304 and stale is not None:
+            self.stats['revalidated'] += 1
+            stale.fetched_at = time.time()
+            self._disk_put(stale, write_blob=False)
+            return stale
+
+        if status_code == 200 and content:
+            self.stats['downloads'] += 1
+            entry = LogoEntry(url, content, _sha256(content),
+                              headers.get('ETag', ''),
+                              headers.get('Last-Modified', ''),
+                              time.time())
+            self._disk_put(entry)
+            return entry
+
+        return None
+
+    def _fetch(self, url, stale=None):
+        """Télécharger (ou revalider) le logo ; retourne une LogoEntry ou None"""
+        response = self.fetcher.fetch(url, headers=self.revalidation_headers(stale), timeout=self.timeout)
+        return self.store_response(url, response.status_code, response.content, response.headers, stale)
+
+    # --- API publique -------------------------------------------------------
+
+    def lookup(self, url):
+        """
+        Partie de get() sans réseau : retourne (contenu, entrée périmée, à télécharger).
+        Si à télécharger est vrai, appeler ensuite finish_fetch() avec le résultat.
+        """
+        if not url:
+            return None, None, False
+
+        now = time.time()
+
+        entry = self._memory_get(url)
+        if entry is not None and entry.is_fresh(self.ttl, now):
+            self.stats['memory_hits'] += 1
+            return entry.content, entry, False
+
+        # Un autre worker a peut-être déjà téléchargé ou revalidé le logo
+        disk_entry = self._disk_get(url)
+        if disk_entry is not None and (entry is None or disk_entry.fetched_at > entry.fetched_at):
+            entry = disk_entry
+        if entry is not None and entry.is_fresh(self.ttl, now):
+            self.stats['disk_hits'] += 1
+            self._memory_put(entry)
+            return entry.content, entry, False
+
+        # Échec récent : inutile de rebloquer le rendu pendant le timeout
+        failed_at = self._failures.get(url)
+        if entry is None and failed_at is not None and now - failed_at < self.negative_ttl:
+            return None, None, False
+
+        return None, entry, True
+
+    def finish_fetch(self, url, stale, fetched):
+        """Mémoriser le résultat d'un téléchargement (fetched : LogoEntry ou None)"""
+        if fetched is None:
+            self.stats['errors'] += 1
+            self._failures[url] = time.time()
+            # Servir la version périmée plutôt que rien
+            return stale.content if stale is not None else None
+
+        self._failures.pop(url, None)
+        self._memory_put(fetched)
+        return fetched.content
+
+    def get(self, url):
+        """Retourner les octets du logo pour cette URL (ou None si indisponible)"""
+        content, entry, must_fetch = self.lookup(url)
+        if not must_fetch:
+            return content
+
+        # Requêtes simultanées pour le même logo : un seul téléchargement
+        return self.fetcher.coalesce(('logo', url), lambda: self._fetch_and_finish(url, entry))
+
+    def _fetch_and_finish(self, url, entry):
+        try:
+            fetched = self._fetch(url, stale=entry)
+        except Exception as e:
+            print(f"Erreur lors du téléchargement du logo: {e}")
+            fetched = None
+
+        return self.finish_fetch(url, entry, fetched)
+
+    def clear_memory(self):
+        """Vider le niveau mémoire (le disque est conservé)"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._failures.clear()
+
+
+# Instance partagée par les générateurs
+logo_cache = LogoCache()
+
+
+def get_logo_bytes(logo_url):
+    """Récupérer le logo via le cache partagé"""
+    with stage('logo_fetch'):
+        return logo_cache.get(logo_url)
@@ -0,0 +1,225 @@
+# logo_images.py - Logos normalisés (Pillow) : réduits une fois à la taille d'impression, puis mis en cache
+import hashlib
+import math
+import os
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from logo_cache import LOGO_CACHE_DIR, get_logo_bytes
+from metrics import stage
+from storage import atomic_write
+
+# Configuration (modifiable par variables d'environnement)
+LOGO_DPI = int(os.environ.get('LOGO_DPI', 300))  # résolution d'impression visée
+LOGO_VARIANTS_DIR = os.environ.get('LOGO_VARIANTS_DIR', os.path.join(LOGO_CACHE_DIR, 'variants'))
+LOGO_VARIANTS_MAX_ITEMS = int(os.environ.get('LOGO_VARIANTS_MAX_ITEMS', 64))
+LOGO_VARIANTS_DISK_BYTES = int(os.environ.get('LOGO_VARIANTS_DISK_BYTES', 64 * 1024 * 1024))
+LOGO_JPEG_QUALITY = int(os.environ.get('LOGO_JPEG_QUALITY', 90))
+
+# À incrémenter si la normalisation change (les variantes sur disque sont alors ignorées)
+_PIPELINE_VERSION = 1
+
+_CM = 72 / 2.54  # points par centimètre
+_INCH = 72       # points par pouce
+_EXIF_ORIENTATION = 0x0112
+
+# Cadre d'affichage de chaque usage, en points (None : pas de limite)
+LogoVariant = namedtuple('LogoVariant', ['max_width', 'max_height'])
+
+VARIANTES = {
+    'pdf': LogoVariant(4 * _CM, 2.5 * _CM),      # en-tête PDF : 4 cm × 2,5 cm
+    'docx_header': LogoVariant(1.2 * _INCH, None),  # en-tête DOCX : 1,2 pouce de large
+    'docx': LogoVariant(1.5 * _INCH, None),         # logo seul DOCX : 1,5 pouce de large
+}
+
+# Logo prêt à intégrer : octets PNG/JPEG réduits et dimensions (pixels) de l'original,
+# qui servent à calculer la taille d'affichage exactement comme avant la réduction
+NormalizedLogo = namedtuple('NormalizedLogo', ['content', 'width', 'height', 'source_width', 'source_height'])
+
+# En-tête des fichiers sur disque : dimensions réduites puis d'origine
+_HEADER = struct.Struct('<IIII')
+
+
+def display_size(variant, source_width, source_height):
+    """Taille d'affichage (points) dans le cadre de la variante, proportions conservées"""
+    if variant.max_height is None:
+        return variant.max_width, variant.max_width * source_height / source_width
+    # Hauteur maximale d'abord, puis la largeur si le logo est trop large
+    width, height = variant.max_height * source_width / source_height, variant.max_height
+    if width > variant.max_width:
+        width, height = variant.max_width, variant.max_width * source_height / source_width
+    return width, height
+
+
+def _has_alpha(image):
+    if image.mode not in ('RGBA', 'LA'):
+        return False
+    return image.getchannel('A').getextrema()[0] < 255
+
+
+def normalize_logo(data, variant, dpi=LOGO_DPI):
+    """
+    Décoder le logo, le réduire à la résolution d'impression de la variante (jamais
+    agrandi) et le réencoder : PNG s'il a de la transparence ou peu de couleurs, JPEG sinon.
+    """
+    image = Image.open(BytesIO(data))
+    # Photo prise de côté (EXIF) : dimensions après rotation
+    rotated = image.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8)
+    source_width, source_height = image.size[::-1] if rotated else image.size
+    width, height = display_size(variant, source_width, source_height)
+    target = (max(1, math.ceil(width / _INCH * dpi)), max(1, math.ceil(height / _INCH * dpi)))
+
+    if image.format == 'JPEG':
+        # Décodage JPEG directement à l'échelle 1/2, 1/4 ou 1/8 si c'est suffisant
+        image.draft('RGB', target[::-1] if rotated else target)
+    if image.mode in ('P', '1', 'I', 'I;16', 'F'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    elif image.mode == 'CMYK':
+        image = image.convert('RGB')
+    image = ImageOps.exif_transpose(image)
+
+    # thumbnail : rééchantillonnage LANCZOS, jamais d'agrandissement
+    image.thumbnail(target, Image.LANCZOS, reducing_gap=3.0)
+
+    output = BytesIO()
+    if _has_alpha(image):
+        image.save(output, format='PNG', optimize=True)
+    else:
+        if image.mode in ('RGBA', 'LA'):
+            image = image.convert(image.mode[:-1])
+        if image.getcolors(256) is not None:
+            # Logo en aplats : PNG sans perte, plus petit qu'un JPEG
+            image.save(output, format='PNG', optimize=True)
+        else:
+            image.save(output, format='JPEG', quality=LOGO_JPEG_QUALITY, optimize=True)
+
+    return NormalizedLogo(output.getvalue(), image.width, image.height, source_width, source_height)
+
+
+class LogoVariantCache:
+    """
+    Variantes normalisées des logos, indexées par le contenu de l'original (sha256),
+    la variante et la résolution : LRU en mémoire, et disque partagé entre les workers
+    (LRU borné en octets, comme le cache des rendus).
+    """
+
+    def __init__(self, directory=LOGO_VARIANTS_DIR, max_items=LOGO_VARIANTS_MAX_ITEMS, dpi=LOGO_DPI,
+                 disk_bytes=LOGO_VARIANTS_DISK_BYTES):
+        self.directory = directory
+        self.max_items = max_items
+        self.dpi = dpi
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._disk_used = None  # calculé au premier besoin
+        self._lock = threading.Lock()
+
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'normalized': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _disk_get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.utime(path, None)  # ordre LRU (mtime = dernier accès)
+            width, height, source_width, source_height = _HEADER.unpack_from(blob)
+        except (OSError, struct.error):
+            return None
+        return NormalizedLogo(blob[_HEADER.size:], width, height, source_width, source_height)
+
+    def _disk_put(self, key, logo):
+        try:
+            header = _HEADER.pack(logo.width, logo.height, logo.source_width, logo.source_height)
+            atomic_write(self._path(key), header + logo.content)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du cache des logos normalisés: {e}")
+            return
+
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = sum(size for _, size, _ in self._disk_usage())
+            else:
+                self._disk_used += len(header) + len(logo.content)
+            over_quota = self.disk_bytes and self._disk_used > self.disk_bytes
+        if over_quota:
+            self._disk_evict()
+
+    def _disk_usage(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _disk_evict(self):
+        """Supprimer les variantes les moins récemment utilisées jusqu'à 90 % du quota"""
+        entries = sorted(self._disk_usage())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats['evictions'] += 1
+        with self._lock:
+            self._disk_used = total
+
+    def _remember(self, key, logo):
+        with self._lock:
+            self._memory[key] = logo
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, data, variant_name):
+        """Variante normalisée des octets du logo (NormalizedLogo)"""
+        digest = hashlib.sha256(data).hexdigest()
+        key = f"{digest}-{variant_name}-{self.dpi}-v{_PIPELINE_VERSION}"
+
+        with self._lock:
+            logo = self._memory.get(key)
+            if logo is not None:
+                self._memory.move_to_end(key)
+        if logo is not None:
+            self.stats['memory_hits'] += 1
+            return logo
+
+        logo = self._disk_get(key)
+        if logo is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            with stage('logo_normalize'):
+                logo = normalize_logo(data, VARIANTES[variant_name], self.dpi)
+            self.stats['normalized'] += 1
+            self._disk_put(key, logo)
+        self._remember(key, logo)
+        return logo
+
+
+# Instance partagée par les générateurs
+logo_variants = LogoVariantCache()
+
+
+def get_normalized_logo(logo_url, variant_name):
+    """Logo réduit pour cet usage (NormalizedLogo), ou None si indisponible"""
+    data = get_logo_bytes(logo_url)
+    if not data:
+        return None
+    return logo_variants.get(data, variant_name)
@@ -0,0 +1,203 @@
+# metrics.py - Mesures internes (durée de chaque étape, caches, rendus en cours) au format Prometheus
+import bisect
+import os
+import threading
+import time
+
+# Configuration (modifiable par variables d'environnement)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no', 'non')
+
+# Bornes des histogrammes : durées (secondes) et tailles (octets)
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Histogramme cumulatif à bornes fixes. observe() ne fait qu'incrémenter des
+    compteurs : le texte Prometheus n'est construit qu'au moment d'une lecture.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valeurs des labels -> [compteurs par borne, somme, nombre]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Valeur instantanée ; si callback est fourni, elle est lue au moment de l'export"""
+
+    def __init__(self, name, documentation, callback=None, kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def expose(self):
+        value = self.value
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception as e:
+                print(f"Erreur lors de la lecture de la métrique {self.name}: {e}")
+                return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    """Ensemble des métriques exportées par GET /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'devis_stage_duration_seconds',
+    "Durée de chaque étape du traitement (pdf_build inclut pdf_footer)",
+    ['stage']))
+RENDER_SECONDS = registry.register(Histogram(
+    'devis_render_duration_seconds', "Durée totale d'un rendu (pool compris)", ['type', 'format']))
+OUTPUT_BYTES = registry.register(Histogram(
+    'devis_output_size_bytes', "Taille des documents produits", ['type', 'format'], SIZE_BUCKETS))
+RENDERS_IN_FLIGHT = registry.register(Gauge(
+    'devis_renders_in_flight', "Rendus en cours (pool ou processus web)"))
+
+# Étapes mesurées dans un worker du pool, renvoyées au processus web avec le document
+_capture = threading.local()
+
+
+class stage:
+    """
+    Chronométrer une étape : with stage('logo_fetch'): ...
+    Classe plutôt que générateur : coût de l'ordre de la microseconde.
+    """
+    __slots__ = ('name', '_start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if METRICS_ENABLED:
+            observe_stage(self.name, time.perf_counter() - self._start)
+        return False
+
+
+def observe_stage(name, duration):
+    STAGE_SECONDS.observe(duration, name)
+    captured = getattr(_capture, 'stages', None)
+    if captured is not None:
+        captured.append((name, duration))
+
+
+def start_capture():
+    """Côté worker : mémoriser les étapes du rendu en cours pour les renvoyer"""
+    _capture.stages = []
+
+
+def stop_capture():
+    stages, _capture.stages = getattr(_capture, 'stages', None) or [], None
+    return stages
+
+
+def merge_stages(stages):
+    """Côté web : enregistrer les étapes mesurées dans un worker du pool"""
+    if METRICS_ENABLED:
+        for name, duration in stages:
+            STAGE_SECONDS.observe(duration, name)
+
+
+def observe_render(doc_type, output_format, duration, size):
+    if METRICS_ENABLED:
+        RENDER_SECONDS.observe(duration, doc_type, output_format)
+        OUTPUT_BYTES.observe(size, doc_type, output_format)
+
+
+def register_cache_stats(prefix, documentation, stats, hit_keys, miss_keys):
+    """Exporter les compteurs d'un cache (dict stats) et son taux de succès"""
+    for key in stats:
+        registry.register(Gauge(f"{prefix}_{key}_total", f"{documentation} : {key}",
+                                callback=lambda key=key: stats[key], kind='counter'))
+
+    def hit_ratio():
+        hits = sum(stats[k] for k in hit_keys)
+        total = hits + sum(stats[k] for k in miss_keys)
+        return round(hits / total, 4) if total else 0.0
+
+    registry.register(Gauge(f"{prefix}_hit_ratio", f"{documentation} : taux de succès", callback=hit_ratio))
+
+
+def expose():
+    """Texte au format d'exposition Prometheus"""
+    return registry.expose()
@@ -1,5 +1,11 @@
 # models.py
+from array import array
+
+from totals import group_by_rate, line_cents, lines_cents, to_euros, totals_from_buckets
+
 class DevisItem:
+    __slots__ = ('description', 'details', 'quantite', 'prix_unitaire', 'tva_taux', 'remise')
+
     def __init__(self, description, details=None, quantite=1, prix_unitaire=0, tva_taux=20, remise=0):
         self.description = description
         self.details = details or []
@@ -7,9 +13,253 @@ class DevisItem:
         self.prix_unitaire = prix_unitaire
         self.tva_taux = tva_taux
         self.remise = remise
-        self.total_ht = (quantite * prix_unitaire) - remise
 
-class Devis:
+    @property
+    def total_ht(self):
+        # Calculé à la lecture : reste juste si quantite ou prix_unitaire change
+        return (self.quantite * self.prix_unitaire) - self.remise
+
+# Bits de LineItems.entiers : la valeur d'origine était un entier (affichage "2" et non "2.0")
+_QTE_INT, _PRIX_INT, _TVA_INT, _REMISE_INT = 1, 2, 4, 8
+
+_CHAMPS_ARTICLE = frozenset(DevisItem.__slots__)
+
+class LineItems:
+    """
+    Articles d'un devis / d'une facture stockés en colonnes : les valeurs numériques
+    sont dans des array('d') (8 octets par valeur) au lieu d'un objet par article.
+    append(DevisItem) reste possible ; les générateurs lisent rows() directement.
+
+    Les totaux (totals()) sont calculés au premier appel, puis tenus à jour à chaque
+    ajout, modification ou suppression d'article : O(1) par opération. Le total HT
+    de chaque ligne vient du même calcul (centimes arrondis) : les lignes affichées
+    s'additionnent exactement au total HT du document.
+    """
+    __slots__ = ('descriptions', 'details', 'quantites', 'prix_unitaires', 'tva_taux',
+                 'remises', 'entiers', '_centimes', '_buckets', '_totaux')
+
+    def __init__(self):
+        self.descriptions = []
+        self.details = []
+        self.quantites = array('d')
+        self.prix_unitaires = array('d')
+        self.tva_taux = array('d')
+        self.remises = array('d')
+        self.entiers = array('B')
+        self._reset_totals()
+
+    def _reset_totals(self):
+        # Totaux pas encore calculés : le premier totals() les calcule en un passage
+        self._centimes = None  # total HT de chaque ligne (centimes)
+        self._buckets = None   # {taux: [nombre de lignes, total HT en centimes]}
+        self._totaux = None    # Totals en cache (None : à recalculer depuis _buckets)
+
+    @staticmethod
+    def _encode(quantite, prix_unitaire, tva_taux, remise):
+        return ((_QTE_INT if type(quantite) is int else 0)
+                | (_PRIX_INT if type(prix_unitaire) is int else 0)
+                | (_TVA_INT if type(tva_taux) is int else 0)
+                | (_REMISE_INT if type(remise) is int else 0))
+
+    def _track(self, taux, cents, sign):
+        """Ajouter (sign=1) ou retirer (sign=-1) une ligne des totaux par taux"""
+        bucket = self._buckets.get(taux)
+        if bucket is None:
+            bucket = self._buckets[taux] = [0, 0]
+        bucket[0] += sign
+        bucket[1] += sign * cents
+        if not bucket[0]:
+            del self._buckets[taux]
+        self._totaux = None
+
+    def add(self, description, details=None, quantite=1, prix_unitaire=0, tva_taux=20, remise=0):
+        """Ajouter un article sans créer d'objet DevisItem"""
+        flags = self._encode(quantite, prix_unitaire, tva_taux, remise)
+        # Les arrays refusent les valeurs non numériques (même erreur qu'avant pour "2")
+        self.quantites.append(quantite)
+        self.prix_unitaires.append(prix_unitaire)
+        self.tva_taux.append(tva_taux)
+        self.remises.append(remise)
+        self.descriptions.append(description)
+        self.details.append(details or ())
+        self.entiers.append(flags)
+        if self._centimes is not None:
+            cents = line_cents(quantite, prix_unitaire, remise)
+            self._centimes.append(cents)
+            self._track(self.tva_taux[-1], cents, 1)
+
+    @classmethod
+    def from_lists(cls, description, details, quantite, prix_unitaire, tva_taux, remise):
+        """Créer les articles à partir de colonnes déjà validées (une liste par champ)"""
+        items = cls()
+        items.descriptions = description
+        items.details = [d or () for d in details]
+        items.quantites = array('d', quantite)
+        items.prix_unitaires = array('d', prix_unitaire)
+        items.tva_taux = array('d', tva_taux)
+        items.remises = array('d', remise)
+        items.entiers = array('B', [
+            (_QTE_INT if type(q) is int else 0) | (_PRIX_INT if type(p) is int else 0)
+            | (_TVA_INT if type(t) is int else 0) | (_REMISE_INT if type(r) is int else 0)
+            for q, p, t, r in zip(quantite, prix_unitaire, tva_taux, remise)
+        ])
+        return items
+
+    def append(self, item):
+        self.add(item.description, item.details, item.quantite, item.prix_unitaire,
+                 item.tva_taux, item.remise)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def update(self, index, **changes):
+        """
+        Modifier un article en place : items.update(3, quantite=5).
+        Champs : description, details, quantite, prix_unitaire, tva_taux, remise.
+        """
+        inconnus = set(changes) - _CHAMPS_ARTICLE
+        if inconnus:
+            raise TypeError(f"Champ(s) d'article inconnu(s) : {', '.join(sorted(inconnus))}")
+        description, details, quantite, prix_unitaire, tva_taux, remise, _ = self.row(index)
+        description = changes.get('description', description)
+        details = changes.get('details', details)
+        quantite = changes.get('quantite', quantite)
+        prix_unitaire = changes.get('prix_unitaire', prix_unitaire)
+        tva_taux = changes.get('tva_taux', tva_taux)
+        remise = changes.get('remise', remise)
+
+        flags = self._encode(quantite, prix_unitaire, tva_taux, remise)
+        old_rate = self.tva_taux[index]
+        self.quantites[index] = quantite
+        self.prix_unitaires[index] = prix_unitaire
+        self.tva_taux[index] = tva_taux
+        self.remises[index] = remise
+        self.descriptions[index] = description
+        self.details[index] = details or ()
+        self.entiers[index] = flags
+        if self._centimes is not None:
+            cents = line_cents(quantite, prix_unitaire, remise)
+            self._track(old_rate, self._centimes[index], -1)
+            self._track(self.tva_taux[index], cents, 1)
+            self._centimes[index] = cents
+
+    def __setitem__(self, index, item):
+        """Remplacer un article par un DevisItem"""
+        self.update(index, description=item.description, details=item.details,
+                    quantite=item.quantite, prix_unitaire=item.prix_unitaire,
+                    tva_taux=item.tva_taux, remise=item.remise)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for i in sorted(range(*index.indices(len(self))), reverse=True):
+                del self[i]
+            return
+        if self._centimes is not None:
+            self._track(self.tva_taux[index], self._centimes[index], -1)
+            del self._centimes[index]
+        for column in (self.descriptions, self.details, self.quantites, self.prix_unitaires,
+                       self.tva_taux, self.remises, self.entiers):
+            del column[index]
+
+    def remove(self, index):
+        """Supprimer l'article à la position index"""
+        del self[index]
+
+    def totals(self):
+        """Totaux exacts (totals.Totals, en centimes), jamais périmés"""
+        if self._centimes is None:
+            self._centimes = array('q', lines_cents(self))
+            self._buckets = group_by_rate(self.tva_taux, self._centimes)
+            self._totaux = None
+        if self._totaux is None:
+            self._totaux = totals_from_buckets(self._buckets)
+        return self._totaux
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    def __bool__(self):
+        return bool(self.descriptions)
+
+    def rows(self):
+        """
+        Parcourir les articles sans créer d'objet :
+        (description, details, quantite, prix_unitaire, tva_taux, remise, total_ht)
+        total_ht en centimes (int), arrondi comme les totaux : afficher avec to_euros()
+        """
+        self.totals()
+        for row in zip(self.descriptions, self.details, self.quantites, self.prix_unitaires,
+                       self.tva_taux, self.remises, self._centimes, self.entiers):
+            yield _restore_ints(row) if row[7] else row[:7]
+
+    def row(self, index):
+        """Un article sous forme de tuple (même format que rows())"""
+        self.totals()
+        row = (self.descriptions[index], self.details[index], self.quantites[index],
+               self.prix_unitaires[index], self.tva_taux[index], self.remises[index],
+               self._centimes[index], self.entiers[index])
+        return _restore_ints(row) if row[7] else row[:7]
+
+    def __getitem__(self, index):
+        """Copie de l'article : pour modifier le document, utiliser update() ou items[i] = ..."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return DevisItem(*self.row(index)[:6])
+
+    def __iter__(self):
+        """Compatibilité : produit des DevisItem (copies)"""
+        for row in self.rows():
+            yield DevisItem(*row[:6])
+
+    def to_columns(self):
+        """Représentation compacte et sérialisable (pickle) des colonnes"""
+        return (self.descriptions, self.details, self.quantites, self.prix_unitaires,
+                self.tva_taux, self.remises, self.entiers)
+
+    @classmethod
+    def from_columns(cls, columns):
+        items = cls()
+        (items.descriptions, items.details, items.quantites, items.prix_unitaires,
+         items.tva_taux, items.remises, items.entiers) = columns
+        return items
+
+
+def _restore_ints(row):
+    description, details, q, p, t, r, total, flags = row
+    return (description, details,
+            int(q) if flags & _QTE_INT else q,
+            int(p) if flags & _PRIX_INT else p,
+            int(t) if flags & _TVA_INT else t,
+            int(r) if flags & _REMISE_INT else r,
+            total)
+
+
+class _AvecTotaux:
+    """Totaux d'un document, lus dans ses articles (toujours à jour)"""
+
+    @property
+    def totaux(self):
+        """Centimes exacts, ventilés par taux de TVA (totals.Totals)"""
+        return self.items.totals()
+
+    @property
+    def total_ht(self):
+        return to_euros(self.totaux.ht)
+
+    @property
+    def total_tva(self):
+        return to_euros(self.totaux.tva)
+
+    @property
+    def total_ttc(self):
+        return to_euros(self.totaux.ttc)
+
+    def calculate_totals(self):
+        # Compatibilité : les totaux sont tenus à jour par les articles
+        return self.totaux
+
+class Devis(_AvecTotaux):
     def __init__(self, numero, date_emission, date_expiration, 
                  fournisseur_nom, fournisseur_adresse, fournisseur_ville, fournisseur_email, fournisseur_siret,
                  client_nom, client_adresse, client_ville, client_siret, client_tva,
@@ -47,17 +297,9 @@ class Devis:
         self.texte_intro = kwargs.get('texte_intro', '')
         self.texte_conclusion = kwargs.get('texte_conclusion', '')
         
-        self.items = []
-        self.total_ht = 0
-        self.total_tva = 0
-        self.total_ttc = 0
-    
-    def calculate_totals(self):
-        self.total_ht = sum(item.total_ht for item in self.items)
-        self.total_tva = sum((item.total_ht * item.tva_taux / 100) for item in self.items)
-        self.total_ttc = self.total_ht + self.total_tva
+        self.items = LineItems()
 
-class Facture:
+class Facture(_AvecTotaux):
     def __init__(self, numero, date_emission, date_echeance,
                  fournisseur_nom, fournisseur_adresse, fournisseur_ville, fournisseur_email, fournisseur_siret,
                  client_nom, client_adresse, client_ville, client_siret, client_tva,
@@ -98,12 +340,4 @@ class Facture:
         self.conditions_paiement = kwargs.get('conditions_paiement', '')
         self.penalites_retard = kwargs.get('penalites_retard', '')
         
-        self.items = []
-        self.total_ht = 0
-        self.total_tva = 0
-        self.total_ttc = 0
-    
-    def calculate_totals(self):
-        self.total_ht = sum(item.total_ht for item in self.items)
-        self.total_tva = sum((item.total_ht * item.tva_taux / 100) for item in self.items)
-        self.total_ttc = self.total_ht + self.total_tva
+        self.items = LineItems()
@@ -0,0 +1,69 @@
+# output_sink.py - Destination des documents générés (flux mémoire ou fichier)
+import os
+from io import BytesIO
+from storage import storage
+
+# Conserver une copie sur disque des documents rendus en mémoire ?
+ARCHIVE_GENERATED = os.environ.get('ARCHIVE_GENERATED', '').lower() in ('1', 'true', 'yes', 'oui')
+
+
+class OutputSink:
+    """
+    Destination d'un rendu PDF/DOCX.
+
+    - output=None : écriture dans generated/ sous un nom unique (voir storage.py)
+    - output=chemin : écriture dans ce fichier
+    - output=flux (BytesIO, fichier ouvert...) : rendu directement dans le flux,
+      avec copie optionnelle sur disque si l'archivage est activé
+    """
+
+    def __init__(self, output=None, filename=None, archive=None):
+        self.filename = filename
+        self.archive = ARCHIVE_GENERATED if archive is None else archive
+        self.stream = None
+        self.path = None
+
+        if output is None:
+            self.path = storage.new_path(filename)
+        elif isinstance(output, (str, os.PathLike)):
+            self.path = os.fspath(output)
+        else:
+            self.stream = output
+
+        # Pour archiver un flux quelconque, on rend d'abord en mémoire
+        if self.stream is not None and self.archive and not isinstance(self.stream, BytesIO):
+            self._buffer = BytesIO()
+        else:
+            self._buffer = None
+
+    @property
+    def target(self):
+        """Objet à passer au moteur de rendu (chemin ou flux inscriptible)"""
+        if self.path is not None:
+            return self.path
+        return self._buffer if self._buffer is not None else self.stream
+
+    def archive_copy(self, data):
+        """Écrire une copie du document dans le dossier d'archivage"""
+        if not self.filename:
+            return None
+        return storage.store(self.filename, data)
+
+    def finish(self):
+        """Finaliser le rendu et retourner le chemin du fichier ou le flux"""
+        if self.path is not None:
+            if os.path.exists(self.path):
+                storage.record_write(os.path.getsize(self.path))
+            return self.path
+
+        if self._buffer is not None:
+            data = self._buffer.getvalue()
+            self.stream.write(data)
+            self.archive_copy(data)
+        elif self.archive:
+            self.archive_copy(self.stream.getvalue())
+
+        # Rembobiner pour une lecture immédiate (send_file)
+        if isinstance(self.stream, BytesIO):
+            self.stream.seek(0)
+        return self.stream
@@ -0,0 +1,272 @@
+# payloads.py - Construction des objets Devis / Facture à partir des données JSON reçues
+from collections import namedtuple
+from datetime import datetime, timedelta
+import math
+import uuid
+from models import Devis, Facture, LineItems
+
+# Thèmes disponibles
+THEMES_DISPONIBLES = ['bleu', 'vert', 'rouge', 'violet', 'orange', 'noir']
+
+
+class PayloadError(ValueError):
+    """Données invalides : le message est renvoyé tel quel au client (400)"""
+
+
+def resolve_theme(data):
+    """Récupérer et valider le thème (fallback vers le thème par défaut)"""
+    theme = data.get('theme', 'bleu')
+    if theme not in THEMES_DISPONIBLES:
+        theme = 'bleu'
+    return theme
+
+
+def resolve_format(data):
+    """Format de sortie demandé (pdf par défaut)"""
+    return str(data.get('format', 'pdf')).lower()
+
+
+# --- Schéma des documents ---------------------------------------------------
+#
+# Chaque champ est décrit une fois : nom, type et valeur par défaut (une fonction
+# pour les valeurs calculées à chaque requête, OBLIGATOIRE pour un champ requis).
+# Un champ absent ou null prend sa valeur par défaut ; les champs inconnus sont ignorés.
+
+Field = namedtuple('Field', ['name', 'kind', 'default'])
+
+OBLIGATOIRE = object()
+
+
+def _texte(value):
+    return value if isinstance(value, str) else None
+
+
+def _nombre(value):
+    # bool est un int en Python, mais pas une quantité
+    if type(value) is int or (type(value) is float and math.isfinite(value)):
+        return value
+    return None
+
+
+def _liste_textes(value):
+    if isinstance(value, (list, tuple)) and all(isinstance(text, str) for text in value):
+        return value
+    return None
+
+
+def _textes_valides(column):
+    return set(map(type, column)) <= {str}
+
+
+def _nombres_valides(column):
+    types = set(map(type, column))
+    if not types <= {int, float}:
+        return False
+    return float not in types or all(map(math.isfinite, column))
+
+
+def _listes_valides(column):
+    if not set(map(type, column)) <= {list, tuple}:
+        return False
+    return all(type(text) is str for texts in column for text in texts)
+
+
+# Type -> (contrôle d'une valeur : la valeur, ou None si invalide ; contrôle d'une
+# colonne entière en une passe ; description pour le message d'erreur)
+TYPES = {
+    'texte': (_texte, _textes_valides, "doit être du texte"),
+    'nombre': (_nombre, _nombres_valides, "doit être un nombre"),
+    'liste_textes': (_liste_textes, _listes_valides, "doit être une liste de textes"),
+}
+
+
+class Schema:
+    """
+    Schéma compilé : les valeurs par défaut fixes, les valeurs calculées, les champs
+    obligatoires et les contrôles sont rangés une fois dans des tables.
+    - values() valide et complète un objet JSON en ne parcourant que ses champs connus
+    - columns() valide une liste d'objets (les articles) colonne par colonne
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._defaults = {f.name: f.default for f in self.fields
+                          if f.default is not OBLIGATOIRE and not callable(f.default)}
+        self._factories = tuple((f.name, f.default) for f in self.fields if callable(f.default))
+        self._required = tuple(f.name for f in self.fields if f.default is OBLIGATOIRE)
+        self._checks = {f.name: TYPES[f.kind] for f in self.fields}
+
+    def values(self, data, where=None):
+        """Valeurs de tous les champs du schéma ; lève PayloadError au premier champ invalide"""
+        values = self._defaults.copy()
+        for name in self._checks.keys() & data.keys():
+            value = data[name]
+            if value is None:
+                continue
+            check, _, problem = self._checks[name]
+            converted = check(value)
+            if converted is None:
+                raise PayloadError(_field_error(where, name, problem))
+            values[name] = converted
+
+        for name in self._required:
+            if not values.get(name):
+                raise PayloadError(_field_error(where, name, "est obligatoire"))
+        for name, factory in self._factories:
+            if name not in values:
+                values[name] = factory()
+        return values
+
+    def columns(self, rows, what):
+        """
+        Valeurs de chaque champ pour une liste d'objets : {nom: liste}. Chaque colonne
+        est contrôlée en une passe ; en cas d'erreur, l'objet fautif est recherché
+        pour le message (what : "Article" -> "Article 3 : ...").
+        """
+        columns = {}
+        for field in self.fields:
+            name, default = field.name, field.default
+            column = [row.get(name) for row in rows]
+            if None in column:
+                if default is OBLIGATOIRE:
+                    self._raise_first(rows, what)
+                column = [default if value is None else value for value in column]
+            if (default is OBLIGATOIRE and not all(column)) or not self._checks[name][1](column):
+                self._raise_first(rows, what)
+            columns[name] = column
+        return columns
+
+    def _raise_first(self, rows, what):
+        for index, row in enumerate(rows, 1):
+            self.values(row, f"{what} {index}")
+
+
+def _field_error(where, name, problem):
+    if where:
+        return f"❌ {where} : le champ '{name}' {problem}"
+    return f"❌ Le champ '{name}' {problem}"
+
+
+def _aujourdhui():
+    return datetime.now().strftime('%d/%m/%Y')
+
+
+def _dans_30_jours():
+    return (datetime.now() + timedelta(days=30)).strftime('%d/%m/%Y')
+
+
+def _numero(prefix):
+    return lambda: f"{prefix}-{datetime.now().year}-{str(uuid.uuid4())[:3]}"
+
+
+PENALITES_PAR_DEFAUT = 'En cas de retard de paiement, une pénalité de 3 fois le taux d\'intérêt légal sera appliquée'
+
+SCHEMA_ARTICLE = Schema([
+    Field('description', 'texte', OBLIGATOIRE),
+    Field('details', 'liste_textes', ()),
+    Field('quantite', 'nombre', 1),
+    Field('prix_unitaire', 'nombre', 0),
+    Field('tva_taux', 'nombre', 20),
+    Field('remise', 'nombre', 0),
+])
+
+# Informations fournisseur (tout modifiable)
+CHAMPS_FOURNISSEUR = [
+    Field('fournisseur_nom', 'texte', 'Infinytia'),
+    Field('fournisseur_adresse', 'texte', '61 Rue De Lyon'),
+    Field('fournisseur_ville', 'texte', '75012 Paris, FR'),
+    Field('fournisseur_email', 'texte', 'contact@infinytia.com'),
+    Field('fournisseur_siret', 'texte', '93968736400017'),
+    Field('fournisseur_telephone', 'texte', '+33 1 23 45 67 89'),
+]
+
+# Informations client (hors nom), logo et coordonnées bancaires
+CHAMPS_CLIENT = [
+    Field('client_adresse', 'texte', ''),
+    Field('client_ville', 'texte', ''),
+    Field('client_siret', 'texte', ''),
+    Field('client_tva', 'texte', ''),
+    Field('client_telephone', 'texte', ''),
+    Field('client_email', 'texte', ''),
+    Field('logo_url', 'texte', ''),
+]
+
+CHAMPS_BANQUE = [
+    Field('banque_nom', 'texte', 'BNP Paribas'),
+    Field('banque_iban', 'texte', 'FR76 3000 4008 2800 0123 4567 890'),
+    Field('banque_bic', 'texte', 'BNPAFRPPXXX'),
+]
+
+SCHEMA_DEVIS = Schema([
+    Field('numero', 'texte', _numero('D')),
+    Field('date_emission', 'texte', _aujourdhui),
+    Field('date_expiration', 'texte', _dans_30_jours),
+    *CHAMPS_FOURNISSEUR,
+    Field('client_nom', 'texte', OBLIGATOIRE),
+    *CHAMPS_CLIENT,
+    *CHAMPS_BANQUE,
+    Field('conditions_paiement', 'texte', 'Paiement à 30 jours'),
+    Field('penalites_retard', 'texte', PENALITES_PAR_DEFAUT),
+    Field('texte_intro', 'texte', ''),
+    Field('texte_conclusion', 'texte', 'Nous restons à votre disposition pour toute information complémentaire.'),
+])
+
+SCHEMA_FACTURE = Schema([
+    Field('numero', 'texte', _numero('F')),
+    Field('date_emission', 'texte', _aujourdhui),
+    Field('date_echeance', 'texte', _dans_30_jours),
+    *CHAMPS_FOURNISSEUR,
+    Field('client_nom', 'texte', ''),
+    *CHAMPS_CLIENT,
+    *CHAMPS_BANQUE,
+    Field('conditions_paiement', 'texte', 'Paiement à réception'),
+    Field('penalites_retard', 'texte', PENALITES_PAR_DEFAUT),
+    Field('statut_paiement', 'texte', 'En attente'),
+    Field('numero_commande', 'texte', ''),
+    Field('reference_devis', 'texte', ''),
+])
+
+
+def build_items(items_data):
+    """Valider les articles et créer directement leurs colonnes (LineItems)"""
+    if not isinstance(items_data, list):
+        raise PayloadError("❌ Le champ 'items' doit être une liste d'articles")
+    if not set(map(type, items_data)) <= {dict}:
+        index = next(i for i, item_data in enumerate(items_data, 1) if type(item_data) is not dict)
+        raise PayloadError(f"❌ Article {index} : un objet est attendu")
+    columns = SCHEMA_ARTICLE.columns(items_data, "Article")
+    return LineItems.from_lists(**columns)
+
+
+def build_document(model, schema, data, items_required=False):
+    """Valider les données et créer le document (totaux calculés)"""
+    if not data:
+        raise PayloadError("❌ Aucune donnée reçue")
+    if not isinstance(data, dict):
+        raise PayloadError("❌ Les données doivent être un objet JSON")
+
+    document = model(**schema.values(data))
+
+    items_data = data.get('items')
+    if items_required and not items_data:
+        raise PayloadError("❌ Au moins un article est requis")
+    document.items = build_items(items_data or [])
+    document.calculate_totals()
+    return document
+
+
+def build_devis(data):
+    """Créer un Devis (totaux calculés) ; lève PayloadError si les données sont invalides"""
+    return build_document(Devis, SCHEMA_DEVIS, data, items_required=True)
+
+
+def build_facture(data):
+    """Créer une Facture (totaux calculés) ; lève PayloadError si les données sont invalides"""
+    return build_document(Facture, SCHEMA_FACTURE, data)
+
+
+# Type de document -> constructeur
+BUILDERS = {
+    'devis': build_devis,
+    'facture': build_facture,
+}
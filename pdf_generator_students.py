@@ -4,11 +4,18 @@ from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, HRFlowable, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm, mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 from reportlab.lib.enums import TA_RIGHT, TA_CENTER, TA_JUSTIFY, TA_LEFT
 import os
-import requests
+from collections import namedtuple
 from io import BytesIO
+from types import MappingProxyType
+from logo_images import VARIANTES, display_size, get_normalized_logo
+from metrics import stage
+from output_sink import OutputSink
+from models import LineItems
+from totals import to_cents, to_euros
 
 # Thèmes de couleurs disponibles
 THEMES_COULEURS = {
@@ -64,25 +71,36 @@ COULEUR_FOND = colors.HexColor('#ecf0f1')
 COULEUR_TEXTE = colors.HexColor('#2c3e50')
 
 class SimpleCanvas(canvas.Canvas):
-    """Canvas simple pour ajouter le footer personnalisé"""
+    """
+    Canvas simple pour ajouter le footer personnalisé.
+    Chaque page est écrite dès qu'elle est terminée : le nombre total de pages n'étant
+    connu qu'à la fin, "N/total" est un formulaire PDF (XObject) référencé par la page
+    et défini au moment de save(). Aucun état de page n'est conservé en mémoire.
+    """
     def __init__(self, *args, **kwargs):
         canvas.Canvas.__init__(self, *args, **kwargs)
         self.doc_info = {}
-        self._saved_page_states = []
+        self._page_count = 0
 
     def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
+        self._page_count += 1
+        self.draw_footer(self._page_count)
+        canvas.Canvas.showPage(self)
 
     def save(self):
-        num_pages = len(self._saved_page_states)
-        for idx, state in enumerate(self._saved_page_states):
-            self.__dict__.update(state)
-            self.draw_footer(idx + 1, num_pages)
-            canvas.Canvas.showPage(self)
-        canvas.Canvas.save(self)
-
-    def draw_footer(self, page_num, total_pages):
+        with stage('pdf_footer'):
+            total_pages = self._page_count
+            for page_num in range(1, total_pages + 1):
+                self.beginForm(self._page_number_form(page_num))
+                self.draw_page_number(page_num, total_pages)
+                self.endForm()
+            canvas.Canvas.save(self)
+
+    @staticmethod
+    def _page_number_form(page_num):
+        return f"footer_page_{page_num}"
+
+    def draw_footer(self, page_num):
         """Dessiner le footer avec les informations de l'entreprise"""
         self.saveState()
         self.setFont("Helvetica", 9)
@@ -91,39 +109,32 @@ class SimpleCanvas(canvas.Canvas):
         # Nom entreprise à gauche
         self.drawString(2*cm, 1.5*cm, f"{self.doc_info.get('company_name', '')}, SAS")
         
-        # Numéro de document et page à droite
+        # Numéro de document et page à droite (complété par save())
+        self.doForm(self._page_number_form(page_num))
+        
+        self.restoreState()
+
+    def draw_page_number(self, page_num, total_pages):
+        """Numéro de document et page "N/total", aligné à droite"""
+        self.setFont("Helvetica", 9)
+        self.setFillColor(colors.grey)
         self.drawRightString(
             A4[0] - 2*cm, 
             1.5*cm, 
             f"{self.doc_info.get('doc_number', '')} · {page_num}/{total_pages}"
         )
-        
-        self.restoreState()
 
 def download_logo(logo_url):
-    """Télécharger et traiter le logo depuis une URL"""
+    """Télécharger le logo et le préparer (réduit à la taille d'impression)"""
     if not logo_url:
         return None
     
     try:
-        # Télécharger l'image avec un timeout
-        response = requests.get(logo_url, timeout=10)
-        if response.status_code == 200:
-            img_data = BytesIO(response.content)
-            logo = Image(img_data)
-            
-            # Redimensionner le logo (hauteur max 2.5cm)
-            max_height = 2.5 * cm
-            logo.drawHeight = max_height
-            logo.drawWidth = max_height * logo.imageWidth / logo.imageHeight
-            
-            # Si le logo est trop large, le redimensionner par la largeur
-            max_width = 4 * cm
-            if logo.drawWidth > max_width:
-                logo.drawWidth = max_width
-                logo.drawHeight = max_width * logo.imageHeight / logo.imageWidth
-            
-            return logo
+        # Logo du cache partagé, déjà réduit pour l'en-tête PDF (4 cm × 2,5 cm max)
+        normalized = get_normalized_logo(logo_url, 'pdf')
+        if normalized:
+            width, height = display_size(VARIANTES['pdf'], normalized.source_width, normalized.source_height)
+            return Image(BytesIO(normalized.content), width=width, height=height)
     except Exception as e:
         print(f"Erreur lors du téléchargement du logo: {e}")
         return None
@@ -134,32 +145,19 @@ def create_header_with_logo(logo_url, title, title_size=18):
     """Créer l'en-tête avec logo et titre"""
     logo = download_logo(logo_url)
     
-    title_paragraph = Paragraph(title, ParagraphStyle('Title', 
-        fontSize=title_size, textColor=colors.black, fontName='Helvetica-Bold', leftIndent=0))
+    title_paragraph = Paragraph(title, get_title_style(title_size))
     
     if logo:
         # Créer un tableau avec titre à gauche et logo à droite
         header_data = [[title_paragraph, logo]]
         header_table = Table(header_data, colWidths=[14*cm, 4*cm])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-            ('TOPPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ]))
+        header_table.setStyle(TABLE_STYLES['header_logo'])
         return header_table
     else:
         # Pas de logo, titre seul dans un tableau
         title_data = [[title_paragraph]]
         title_table = Table(title_data, colWidths=[18*cm])
-        title_table.setStyle(TableStyle([
-            ('LEFTPADDING', (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-            ('TOPPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ]))
+        title_table.setStyle(TABLE_STYLES['header_title'])
         return title_table
 
 def create_styles(couleurs):
@@ -204,16 +202,208 @@ def create_styles(couleurs):
     
     return styles
 
-def generate_student_style_devis(data, theme='bleu'):
-    """Générer un PDF de devis avec le style étudiant"""
-    # Récupérer les couleurs du thème
-    couleurs = THEMES_COULEURS.get(theme, THEMES_COULEURS['bleu'])
-    
-    filename = os.path.join('generated', f'devis_{data["numero"]}_{theme}.pdf')
+# --- Registre des styles ----------------------------------------------------
+# Tous les styles sont construits une seule fois à l'import (donc au démarrage de
+# chaque worker) puis partagés entre les rendus : ils ne doivent pas être modifiés.
+
+# Largeurs du tableau des articles (modèle)
+ITEMS_COL_WIDTHS = [8.5*cm, 2*cm, 3*cm, 2.5*cm, 2.5*cm]
+# Largeur utile de chaque colonne (LEFTPADDING / RIGHTPADDING de 8 pt)
+ITEMS_TEXT_WIDTHS = [width - 16 for width in ITEMS_COL_WIDTHS]
+
+# Styles de tableau indépendants du thème
+TABLE_STYLES = MappingProxyType({
+    # En-tête : titre à gauche, logo à droite
+    'header_logo': TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+    ]),
+    # En-tête : titre seul
+    'header_title': TableStyle([
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ]),
+    # En-tête de facture sans logo : titre et nom de l'entreprise
+    'header_facture': TableStyle([
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]),
+    # Table invisible à deux colonnes (informations, fournisseur / client)
+    'two_columns': TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+    ]),
+    'totals': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        # Ligne sous le total TTC
+        ('LINEBELOW', (0, 2), (-1, 2), 1, colors.black),
+    ]),
+    'signature': TableStyle([
+        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]),
+})
+
+# Styles de titre par taille (16 et 18 utilisés par les générateurs)
+_TITLE_STYLES = {}
+
+
+def get_title_style(title_size):
+    """Style du titre de l'en-tête pour une taille donnée"""
+    style = _TITLE_STYLES.get(title_size)
+    if style is None:
+        style = _TITLE_STYLES[title_size] = ParagraphStyle(
+            'Title', fontSize=title_size, textColor=colors.black, fontName='Helvetica-Bold', leftIndent=0)
+    return style
+
+
+def _build_paragraph_styles(couleurs):
+    """Construire tous les styles de paragraphe utilisés par les générateurs PDF"""
+    return MappingProxyType({
+        # Informations du document et fournisseur / client
+        'LeftColumn': ParagraphStyle('LeftColumn', fontSize=10, textColor=colors.black,
+                                     fontName='Helvetica-Bold', leading=14, leftIndent=0, rightIndent=0),
+        'RightColumn': ParagraphStyle('RightColumn', fontSize=10, textColor=colors.black,
+                                      leading=14, leftIndent=0, rightIndent=0),
+        'CompanyInfo': ParagraphStyle('CompanyInfo', fontSize=10, textColor=colors.black, leftIndent=0, rightIndent=0),
+        'IntroStyle': ParagraphStyle('IntroStyle', fontSize=10, textColor=couleurs['principale'], alignment=TA_JUSTIFY),
+
+        # Tableau des articles
+        'TableHeader': ParagraphStyle('TableHeader', textColor=colors.white, fontSize=10, fontName='Helvetica-Bold'),
+        'TableHeaderCenter': ParagraphStyle('TableHeader', textColor=colors.white, fontSize=10,
+                                            alignment=TA_CENTER, fontName='Helvetica-Bold'),
+        'TableHeaderRight': ParagraphStyle('TableHeader', textColor=colors.white, fontSize=10,
+                                           alignment=TA_RIGHT, fontName='Helvetica-Bold'),
+        'ItemDesc': ParagraphStyle('ItemDesc', fontSize=9, textColor=colors.black),
+        'ItemCenter': ParagraphStyle('ItemCenter', fontSize=9, textColor=colors.black, alignment=TA_CENTER),
+        'ItemRight': ParagraphStyle('ItemRight', fontSize=9, textColor=colors.black, alignment=TA_RIGHT),
+        'ItemDetail': ParagraphStyle('DetailStyle', fontSize=9, textColor=colors.black, leftIndent=0),
+
+        # Totaux
+        'TotalsStyle': ParagraphStyle('TotalsStyle', fontSize=10, textColor=colors.black),
+        'TotalsBold': ParagraphStyle('TotalsBold', fontSize=10, textColor=colors.black, fontName='Helvetica-Bold'),
+
+        # Conditions, banque, signature et mentions
+        'CondStyle': ParagraphStyle('CondStyle', fontSize=10, textColor=colors.black, fontName='Helvetica-Bold'),
+        'BankStyle': ParagraphStyle('BankStyle', fontSize=10, textColor=colors.black, fontName='Helvetica-Bold'),
+        'TextStyle': ParagraphStyle('TextStyle', fontSize=10, textColor=colors.black),
+        'SmallText': ParagraphStyle('SmallText', fontSize=8, textColor=colors.grey, fontName='Helvetica'),
+        'SigStyle': ParagraphStyle('SigStyle', fontSize=10, textColor=colors.black, alignment=TA_CENTER),
+        'LegalText': ParagraphStyle('LegalText', fontSize=8, textColor=colors.grey, fontName='Helvetica',
+                                    alignment=TA_JUSTIFY),
+
+        # En-tête de facture sans logo
+        'MainTitle': ParagraphStyle('MainTitle', fontSize=18, textColor=colors.black, fontName='Helvetica-Bold'),
+        'CompanyName': ParagraphStyle('CompanyName', fontSize=16, textColor=couleurs['principale'],
+                                      fontName='Helvetica-Bold', alignment=TA_RIGHT),
+    })
+
+
+def _build_items_table_style(couleurs):
+    """Style du tableau des articles avec la couleur du thème pour l'en-tête"""
+    return TableStyle([
+        # En-tête avec couleur du thème
+        ('BACKGROUND', (0, 0), (-1, 0), couleurs['header_bg']),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+
+        # Corps du tableau
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        # Cellules numériques en texte simple : même interligne que les paragraphes (hauteur de ligne)
+        ('LEADING', (1, 1), (-1, -1), 12),
+
+        # Alignements
+        ('ALIGN', (1, 1), (1, -1), 'CENTER'),
+        ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+        ('ALIGN', (3, 1), (3, -1), 'CENTER'),
+        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
+
+        # Bordures grises fines
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#b2bec3')),
+
+        # Padding
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 1), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
+    ])
+
+
+# Styles d'un thème : paragraphes, tableau des articles, feuille de styles ReportLab
+ThemeStyles = namedtuple('ThemeStyles', ['paragraphs', 'items_table', 'sheet'])
+
+STYLE_REGISTRY = MappingProxyType({
+    theme: ThemeStyles(_build_paragraph_styles(couleurs), _build_items_table_style(couleurs),
+                       create_styles(couleurs))
+    for theme, couleurs in THEMES_COULEURS.items()
+})
+
+for _size in (16, 18):
+    get_title_style(_size)
+
+
+def get_theme_styles(theme):
+    """Styles partagés d'un thème (thème bleu si inconnu)"""
+    return STYLE_REGISTRY.get(theme) or STYLE_REGISTRY['bleu']
+
+
+def as_line_items(items):
+    """Articles en colonnes (LineItems) ; accepte aussi une liste de dictionnaires"""
+    if isinstance(items, LineItems):
+        return items
+    line_items = LineItems()
+    for item in items:
+        line_items.add(item['description'], item.get('details'), item.get('quantite', 1),
+                       item.get('prix_unitaire', 0), item.get('tva_taux', 20), item.get('remise', 0))
+    return line_items
+
+
+def item_cell(text, style, column):
+    """
+    Cellule du tableau des articles qui ne peut pas contenir de balisage (quantité, prix, TVA) :
+    texte simple dessiné par la table, sans mise en page de paragraphe, à la même position
+    qu'un Paragraph. Paragraph seulement si le texte ne tient pas sur une ligne (il serait coupé).
+    """
+    if stringWidth(text, style.fontName, style.fontSize) <= ITEMS_TEXT_WIDTHS[column]:
+        return text
+    return Paragraph(text, style)
+
+
+def items_header(ps):
+    """Ligne d'en-tête du tableau des articles"""
+    return [
+        Paragraph("<b>Description</b>", ps['TableHeader']),
+        Paragraph("<b>Qté</b>", ps['TableHeaderCenter']),
+        Paragraph("<b>Prix unitaire</b>", ps['TableHeaderCenter']),
+        Paragraph("<b>TVA (%)</b>", ps['TableHeaderCenter']),
+        Paragraph("<b>Total HT</b>", ps['TableHeaderRight'])
+    ]
+
+
+def generate_student_style_devis(data, theme='bleu', output=None):
+    """Générer un PDF de devis avec le style étudiant (fichier ou flux si output est fourni)"""
+    sink = OutputSink(output, f'devis_{data["numero"]}_{theme}.pdf')
     
     # Configuration du document
     doc = SimpleDocTemplate(
-        filename,
+        sink.target,
         pagesize=A4,
         rightMargin=2*cm,
         leftMargin=2*cm,
@@ -221,7 +411,8 @@ def generate_student_style_devis(data, theme='bleu'):
         bottomMargin=3*cm
     )
     
-    styles = create_styles(couleurs)
+    theme_styles = get_theme_styles(theme)
+    ps = theme_styles.paragraphs
     elements = []
     
     # En-tête avec logo et titre
@@ -237,30 +428,18 @@ def generate_student_style_devis(data, theme='bleu'):
 {data['date_emission']}<br/>
 {data['date_expiration']}"""
     
-    # Utiliser des paragraphes avec line height
-    left_style = ParagraphStyle('LeftColumn', fontSize=10, textColor=colors.black, 
-                               fontName='Helvetica-Bold', leading=14, leftIndent=0, rightIndent=0)
-    right_style = ParagraphStyle('RightColumn', fontSize=10, textColor=colors.black, 
-                                leading=14, leftIndent=0, rightIndent=0)
-    
-    # Table invisible pour aligner les deux colonnes
+    # Table invisible pour aligner les deux colonnes (paragraphes avec line height)
     info_table = Table([[
-        Paragraph(left_column_data, left_style),
-        Paragraph(right_column_data, right_style)
+        Paragraph(left_column_data, ps['LeftColumn']),
+        Paragraph(right_column_data, ps['RightColumn'])
     ]], colWidths=[9*cm, 9*cm])
-    info_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    info_table.setStyle(TABLE_STYLES['two_columns'])
     
     elements.append(info_table)
     elements.append(Spacer(1, 10*mm))
     
     # Informations Fournisseur et Client
-    company_info_style = ParagraphStyle('CompanyInfo', fontSize=10, textColor=colors.black, leftIndent=0, rightIndent=0)
+    company_info_style = ps['CompanyInfo']
     
     # Créer les contenus en une seule cellule par colonne
     fournisseur_text = f"""<b>{data['fournisseur_nom']}</b><br/>
@@ -286,157 +465,102 @@ Numéro de TVA: {data.get('client_tva', '')}"""
     ]]
     
     company_table = Table(company_data, colWidths=[9*cm, 9*cm])
-    company_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    company_table.setStyle(TABLE_STYLES['two_columns'])
     
     elements.append(company_table)
     elements.append(Spacer(1, 15*mm))
     
     # Texte d'introduction si présent
     if 'texte_intro' in data and data['texte_intro']:
-        intro_style = ParagraphStyle('IntroStyle', fontSize=10, textColor=couleurs['principale'], alignment=TA_JUSTIFY)
-        elements.append(Paragraph(data['texte_intro'], intro_style))
+        elements.append(Paragraph(data['texte_intro'], ps['IntroStyle']))
         elements.append(Spacer(1, 10*mm))
     
     # Tableau des articles avec en-tête coloré selon le thème
     items_data = []
     
     # En-tête du tableau avec la couleur du thème
-    headers = [
-        Paragraph("<b>Description</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, fontName='Helvetica-Bold')),
-        Paragraph("<b>Qté</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_CENTER, fontName='Helvetica-Bold')),
-        Paragraph("<b>Prix unitaire</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_CENTER, fontName='Helvetica-Bold')),
-        Paragraph("<b>TVA (%)</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_CENTER, fontName='Helvetica-Bold')),
-        Paragraph("<b>Total HT</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_RIGHT, fontName='Helvetica-Bold'))
-    ]
-    items_data.append(headers)
+    items_data.append(items_header(ps))
     
     # Style pour les items
-    item_desc_style = ParagraphStyle('ItemDesc', fontSize=9, textColor=colors.black)
-    item_center_style = ParagraphStyle('ItemCenter', fontSize=9, textColor=colors.black, 
-                                      alignment=TA_CENTER)
-    item_right_style = ParagraphStyle('ItemRight', fontSize=9, textColor=colors.black, 
-                                     alignment=TA_RIGHT)
-    
-    # Articles
-    for item in data['items']:
+    item_desc_style = ps['ItemDesc']
+    item_center_style = ps['ItemCenter']
+    item_right_style = ps['ItemRight']
+    
+    # Articles (lus directement dans les colonnes, sans copie en dictionnaires)
+    items = as_line_items(data['items'])
+    for description, details, quantite, prix_unitaire, tva_taux, remise, total_ht in items.rows():
         # Description principale en gras
-        desc_text = f"<b>{item['description']}</b>"
+        desc_text = f"<b>{description}</b>"
+        # Montant avant remise : ligne et remise affichées s'additionnent au total HT
+        remise_cents = to_cents(remise)
+        montant = f"{to_euros(total_ht + remise_cents):.2f} €"
         
         # Si il y a des détails, les ajouter sur des lignes séparées
-        if item.get('details'):
+        if details:
             items_data.append([
                 Paragraph(desc_text, item_desc_style),
-                Paragraph(str(item.get('quantite', 1)), item_center_style),
-                Paragraph(f"{item.get('prix_unitaire', 0):.2f} €", item_right_style),
-                Paragraph(f"{item.get('tva_taux', 20)} %", item_center_style),
-                Paragraph(f"{item.get('prix_unitaire', 0) * item.get('quantite', 1):.2f} €", item_right_style)
+                item_cell(str(quantite), item_center_style, 1),
+                item_cell(f"{prix_unitaire:.2f} €", item_right_style, 2),
+                item_cell(f"{tva_taux} %", item_center_style, 3),
+                item_cell(montant, item_right_style, 4)
             ])
             
             # Ajouter les détails sur une nouvelle ligne
-            detail_text = "<br/>".join(item['details'])
+            detail_text = "<br/>".join(details)
             items_data.append([
-                Paragraph(detail_text, ParagraphStyle('DetailStyle', fontSize=9, 
-                         textColor=colors.black, leftIndent=0)),
+                Paragraph(detail_text, ps['ItemDetail']),
                 '', '', '', ''
             ])
         else:
             # Pas de détails, juste la ligne principale
             items_data.append([
                 Paragraph(desc_text, item_desc_style),
-                Paragraph(str(item.get('quantite', 1)), item_center_style),
-                Paragraph(f"{item.get('prix_unitaire', 0):.2f} €", item_right_style),
-                Paragraph(f"{item.get('tva_taux', 20)} %", item_center_style),
-                Paragraph(f"{item.get('prix_unitaire', 0) * item.get('quantite', 1):.2f} €", item_right_style)
+                item_cell(str(quantite), item_center_style, 1),
+                item_cell(f"{prix_unitaire:.2f} €", item_right_style, 2),
+                item_cell(f"{tva_taux} %", item_center_style, 3),
+                item_cell(montant, item_right_style, 4)
             ])
         
         # Ligne de remise si applicable
-        if item.get('remise', 0) > 0:
+        if remise > 0:
             items_data.append([
                 '', '', '', 
-                Paragraph("Remise", item_right_style),
-                Paragraph(f"-{item['remise']:.2f} €", item_right_style)
+                item_cell("Remise", item_right_style, 3),
+                item_cell(f"-{to_euros(remise_cents):.2f} €", item_right_style, 4)
             ])
     
     # Créer le tableau - largeurs exactes du modèle
-    col_widths = [8.5*cm, 2*cm, 3*cm, 2.5*cm, 2.5*cm]
-    items_table = Table(items_data, colWidths=col_widths, repeatRows=1)
-    
-    # Style du tableau avec la couleur du thème pour l'en-tête
-    table_style = [
-        # En-tête avec couleur du thème
-        ('BACKGROUND', (0, 0), (-1, 0), couleurs['header_bg']),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ('TOPPADDING', (0, 0), (-1, 0), 10),
-        
-        # Corps du tableau
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        
-        # Alignements
-        ('ALIGN', (1, 1), (1, -1), 'CENTER'),
-        ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-        ('ALIGN', (3, 1), (3, -1), 'CENTER'),
-        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
-        
-        # Bordures grises fines
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#b2bec3')),
-        
-        # Padding
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
-    ]
+    items_table = Table(items_data, colWidths=ITEMS_COL_WIDTHS, repeatRows=1)
+    items_table.setStyle(theme_styles.items_table)
     
-    # Pour les lignes de détails, faire un span
+    # Pour les lignes de détails, faire un span (seules commandes propres au document)
+    table_style = []
     row_num = 1
-    for item in data['items']:
-        if item.get('details'):
+    for details, remise in zip(items.details, items.remises):
+        if details:
             # La ligne de détails doit span toutes les colonnes
             table_style.append(('SPAN', (0, row_num + 1), (-1, row_num + 1)))
             row_num += 2
         else:
             row_num += 1
         
-        if item.get('remise', 0) > 0:
+        if remise > 0:
+            # Libellé "Remise" aligné à droite (la colonne TVA est centrée)
+            table_style.append(('ALIGN', (3, row_num), (3, row_num), 'RIGHT'))
             row_num += 1
     
-    items_table.setStyle(TableStyle(table_style))
+    if table_style:
+        items_table.setStyle(table_style)
     elements.append(items_table)
     elements.append(Spacer(1, 15*mm))
     
-    # Calcul des totaux
-    total_ht = 0
-    total_tva = 0
-    
-    for item in data['items']:
-        item_total = item.get('quantite', 1) * item.get('prix_unitaire', 0)
-        if item.get('remise', 0) > 0:
-            item_total -= item['remise']
-        total_ht += item_total
-        total_tva += item_total * (item.get('tva_taux', 20) / 100)
-    
-    total_ttc = total_ht + total_tva
+    # Totaux tenus à jour par les articles (centimes exacts)
+    totaux = items.totals()
+    total_ht, total_tva, total_ttc = map(to_euros, totaux[:3])
     
     # Totaux alignés à droite
-    totals_style = ParagraphStyle('TotalsStyle', fontSize=10, textColor=colors.black)
-    totals_bold = ParagraphStyle('TotalsBold', fontSize=10, textColor=colors.black, 
-                                 fontName='Helvetica-Bold')
+    totals_style = ps['TotalsStyle']
+    totals_bold = ps['TotalsBold']
     
     totals_data = [
         [Paragraph("Total HT", totals_style), 
@@ -448,13 +572,7 @@ Numéro de TVA: {data.get('client_tva', '')}"""
     ]
     
     totals_table = Table(totals_data, colWidths=[13*cm, 4*cm])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        # Ligne sous le total TTC
-        ('LINEBELOW', (0, 2), (-1, 2), 1, colors.black),
-    ]))
+    totals_table.setStyle(TABLE_STYLES['totals'])
     
     elements.append(totals_table)
     
@@ -464,23 +582,20 @@ Numéro de TVA: {data.get('client_tva', '')}"""
     
     # Conditions de paiement
     if data.get('conditions_paiement'):
-        cond_style = ParagraphStyle('CondStyle', fontSize=10, textColor=colors.black, 
-                                   fontName='Helvetica-Bold')
-        text_style = ParagraphStyle('TextStyle', fontSize=10, textColor=colors.black)
+        cond_style = ps['CondStyle']
+        text_style = ps['TextStyle']
         
         elements.append(Paragraph("CONDITIONS DE PAIEMENT", cond_style))
         elements.append(Paragraph(data['conditions_paiement'], text_style))
         if data.get('penalites_retard'):
             elements.append(Spacer(1, 3*mm))
-            elements.append(Paragraph(data['penalites_retard'], ParagraphStyle('SmallText', 
-                fontSize=8, textColor=colors.grey, fontName='Helvetica')))
+            elements.append(Paragraph(data['penalites_retard'], ps['SmallText']))
         elements.append(Spacer(1, 10*mm))
     
     # Informations bancaires
     if data.get('banque_nom'):
-        bank_style = ParagraphStyle('BankStyle', fontSize=10, textColor=colors.black, 
-                                   fontName='Helvetica-Bold')
-        text_style = ParagraphStyle('TextStyle', fontSize=10, textColor=colors.black)
+        bank_style = ps['BankStyle']
+        text_style = ps['TextStyle']
         
         elements.append(Paragraph("COORDONNÉES BANCAIRES", bank_style))
         elements.append(Spacer(1, 3*mm))
@@ -493,14 +608,12 @@ Numéro de TVA: {data.get('client_tva', '')}"""
     
     # Texte de conclusion
     if data.get('texte_conclusion'):
-        text_style = ParagraphStyle('TextStyle', fontSize=10, textColor=colors.black)
-        elements.append(Paragraph(data['texte_conclusion'], text_style))
+        elements.append(Paragraph(data['texte_conclusion'], ps['TextStyle']))
         elements.append(Spacer(1, 10*mm))
     
     # Signature - seulement pour les devis
     elements.append(Spacer(1, 15*mm))
-    sig_style = ParagraphStyle('SigStyle', fontSize=10, textColor=colors.black, 
-                              alignment=TA_CENTER)
+    sig_style = ps['SigStyle']
     
     sig_data = [[
         Paragraph("", sig_style),  # Colonne vide
@@ -508,10 +621,7 @@ Numéro de TVA: {data.get('client_tva', '')}"""
     ]]
     
     sig_table = Table(sig_data, colWidths=[12*cm, 6*cm])
-    sig_table.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
+    sig_table.setStyle(TABLE_STYLES['signature'])
     
     elements.append(sig_table)
     
@@ -522,11 +632,12 @@ Numéro de TVA: {data.get('client_tva', '')}"""
             'doc_number': data['numero']
         }
     
-    doc.build(elements, canvasmaker=SimpleCanvas, onFirstPage=build_with_canvas)
+    with stage('pdf_build'):
+        doc.build(elements, canvasmaker=SimpleCanvas, onFirstPage=build_with_canvas)
     
-    return filename
+    return sink.finish()
 
-def generate_pdf_devis(devis, theme='bleu'):
+def generate_pdf_devis(devis, theme='bleu', output=None):
     """Générer un PDF de devis avec le thème de couleur choisi"""
     # Convertir l'objet Devis en dictionnaire
     data = {
@@ -559,31 +670,21 @@ def generate_pdf_devis(devis, theme='bleu'):
         'texte_intro': devis.texte_intro,
         'texte_conclusion': devis.texte_conclusion,
         
-        'items': []
+        # Articles transmis tels quels (stockage en colonnes, totaux en cache)
+        'items': devis.items
     }
     
-    # Convertir les items
-    for item in devis.items:
-        data['items'].append({
-            'description': item.description,
-            'details': item.details,
-            'quantite': item.quantite,
-            'prix_unitaire': item.prix_unitaire,
-            'tva_taux': item.tva_taux,
-            'remise': item.remise
-        })
-    
-    return generate_student_style_devis(data, theme)
-
-def generate_pdf_facture(facture, theme='bleu'):
-    """Générer un PDF de facture avec le thème de couleur choisi"""
+    return generate_student_style_devis(data, theme, output=output)
+
+def generate_pdf_facture(facture, theme='bleu', output=None):
+    """Générer un PDF de facture avec le thème de couleur choisi (fichier ou flux si output est fourni)"""
     couleurs = THEMES_COULEURS.get(theme, THEMES_COULEURS['bleu'])
     
-    filename = os.path.join('generated', f'facture_{facture.numero}_{theme}.pdf')
+    sink = OutputSink(output, f'facture_{facture.numero}_{theme}.pdf')
     
     # Configuration du document
     doc = SimpleDocTemplate(
-        filename,
+        sink.target,
         pagesize=A4,
         rightMargin=2*cm,
         leftMargin=2*cm,
@@ -591,7 +692,8 @@ def generate_pdf_facture(facture, theme='bleu'):
         bottomMargin=3*cm
     )
     
-    styles = create_styles(couleurs)
+    theme_styles = get_theme_styles(theme)
+    ps = theme_styles.paragraphs
     elements = []
     
     # En-tête avec logo et titre
@@ -601,18 +703,11 @@ def generate_pdf_facture(facture, theme='bleu'):
     else:
         # En-tête sans logo
         header_data = [
-            [Paragraph("FACTURE", ParagraphStyle('MainTitle', fontSize=18, textColor=colors.black, 
-                fontName='Helvetica-Bold')), 
-             Paragraph(facture.fournisseur_nom.upper(), ParagraphStyle('CompanyName', 
-                fontSize=16, textColor=couleurs['principale'], fontName='Helvetica-Bold', 
-                alignment=TA_RIGHT))]
+            [Paragraph("FACTURE", ps['MainTitle']), 
+             Paragraph(facture.fournisseur_nom.upper(), ps['CompanyName'])]
         ]
         header_table = Table(header_data, colWidths=[10*cm, 8*cm])
-        header_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
+        header_table.setStyle(TABLE_STYLES['header_facture'])
         elements.append(header_table)
     
     elements.append(Spacer(1, 5*mm))
@@ -648,30 +743,18 @@ def generate_pdf_facture(facture, theme='bleu'):
         left_column_data += "<br/><b>Réf. devis</b>"
         right_column_data += f"<br/>{facture.reference_devis}"
     
-    # Utiliser des paragraphes avec line height
-    left_style = ParagraphStyle('LeftColumn', fontSize=10, textColor=colors.black, 
-                               fontName='Helvetica-Bold', leading=14, leftIndent=0, rightIndent=0)
-    right_style = ParagraphStyle('RightColumn', fontSize=10, textColor=colors.black, 
-                                leading=14, leftIndent=0, rightIndent=0)
-    
-    # Table invisible pour aligner les deux colonnes
+    # Table invisible pour aligner les deux colonnes (paragraphes avec line height)
     info_table = Table([[
-        Paragraph(left_column_data, left_style),
-        Paragraph(right_column_data, right_style)
+        Paragraph(left_column_data, ps['LeftColumn']),
+        Paragraph(right_column_data, ps['RightColumn'])
     ]], colWidths=[9*cm, 9*cm])
-    info_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    info_table.setStyle(TABLE_STYLES['two_columns'])
     
     elements.append(info_table)
     elements.append(Spacer(1, 10*mm))
     
     # Informations Fournisseur et Client
-    company_info_style = ParagraphStyle('CompanyInfo', fontSize=10, textColor=colors.black, leftIndent=0, rightIndent=0)
+    company_info_style = ps['CompanyInfo']
     
     # Créer les contenus
     fournisseur_text = f"""<b>{facture.fournisseur_nom}</b><br/>
@@ -699,13 +782,7 @@ Numéro de TVA: {facture.client_tva}"""
     ]]
     
     company_table = Table(company_data, colWidths=[9*cm, 9*cm])
-    company_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    company_table.setStyle(TABLE_STYLES['two_columns'])
     
     elements.append(company_table)
     elements.append(Spacer(1, 15*mm))
@@ -714,112 +791,74 @@ Numéro de TVA: {facture.client_tva}"""
     items_data = []
     
     # En-tête avec couleur du thème
-    headers = [
-        Paragraph("<b>Description</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, fontName='Helvetica-Bold')),
-        Paragraph("<b>Qté</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_CENTER, fontName='Helvetica-Bold')),
-        Paragraph("<b>Prix unitaire</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_CENTER, fontName='Helvetica-Bold')),
-        Paragraph("<b>TVA (%)</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_CENTER, fontName='Helvetica-Bold')),
-        Paragraph("<b>Total HT</b>", ParagraphStyle('TableHeader', 
-            textColor=colors.white, fontSize=10, alignment=TA_RIGHT, fontName='Helvetica-Bold'))
-    ]
-    items_data.append(headers)
+    items_data.append(items_header(ps))
     
     # Styles pour les items
-    item_desc_style = ParagraphStyle('ItemDesc', fontSize=9, textColor=colors.black)
-    item_center_style = ParagraphStyle('ItemCenter', fontSize=9, textColor=colors.black, 
-                                      alignment=TA_CENTER)
-    item_right_style = ParagraphStyle('ItemRight', fontSize=9, textColor=colors.black, 
-                                     alignment=TA_RIGHT)
-    
-    # Articles
-    for item in facture.items:
-        desc_text = f"<b>{item.description}</b>"
+    item_desc_style = ps['ItemDesc']
+    item_center_style = ps['ItemCenter']
+    item_right_style = ps['ItemRight']
+    
+    # Articles (lus directement dans les colonnes)
+    for description, details, quantite, prix_unitaire, tva_taux, remise, total_ht in facture.items.rows():
+        desc_text = f"<b>{description}</b>"
         
-        if item.details:
+        if details:
             items_data.append([
                 Paragraph(desc_text, item_desc_style),
-                Paragraph(str(item.quantite), item_center_style),
-                Paragraph(f"{item.prix_unitaire:.2f} €", item_right_style),
-                Paragraph(f"{item.tva_taux} %", item_center_style),
-                Paragraph(f"{item.total_ht:.2f} €", item_right_style)
+                item_cell(str(quantite), item_center_style, 1),
+                item_cell(f"{prix_unitaire:.2f} €", item_right_style, 2),
+                item_cell(f"{tva_taux} %", item_center_style, 3),
+                item_cell(f"{to_euros(total_ht):.2f} €", item_right_style, 4)
             ])
             
-            detail_text = "<br/>".join(item.details)
+            detail_text = "<br/>".join(details)
             items_data.append([
-                Paragraph(detail_text, ParagraphStyle('DetailStyle', fontSize=9, 
-                         textColor=colors.black, leftIndent=0)),
+                Paragraph(detail_text, ps['ItemDetail']),
                 '', '', '', ''
             ])
         else:
             items_data.append([
                 Paragraph(desc_text, item_desc_style),
-                Paragraph(str(item.quantite), item_center_style),
-                Paragraph(f"{item.prix_unitaire:.2f} €", item_right_style),
-                Paragraph(f"{item.tva_taux} %", item_center_style),
-                Paragraph(f"{item.total_ht:.2f} €", item_right_style)
+                item_cell(str(quantite), item_center_style, 1),
+                item_cell(f"{prix_unitaire:.2f} €", item_right_style, 2),
+                item_cell(f"{tva_taux} %", item_center_style, 3),
+                item_cell(f"{to_euros(total_ht):.2f} €", item_right_style, 4)
             ])
         
-        if item.remise > 0:
+        if remise > 0:
             items_data.append([
                 '', '', '', 
-                Paragraph("Remise", item_right_style),
-                Paragraph(f"-{item.remise:.2f} €", item_right_style)
+                item_cell("Remise", item_right_style, 3),
+                item_cell(f"-{to_euros(to_cents(remise)):.2f} €", item_right_style, 4)
             ])
     
     # Créer le tableau
-    col_widths = [8.5*cm, 2*cm, 3*cm, 2.5*cm, 2.5*cm]
-    items_table = Table(items_data, colWidths=col_widths, repeatRows=1)
+    items_table = Table(items_data, colWidths=ITEMS_COL_WIDTHS, repeatRows=1)
+    items_table.setStyle(theme_styles.items_table)
     
-    # Style du tableau avec couleur du thème
-    table_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), couleurs['header_bg']),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ('TOPPADDING', (0, 0), (-1, 0), 10),
-        
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        
-        ('ALIGN', (1, 1), (1, -1), 'CENTER'),
-        ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-        ('ALIGN', (3, 1), (3, -1), 'CENTER'),
-        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
-        
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#b2bec3')),
-        
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
-    ]
-    
-    # Pour les lignes de détails, faire un span
+    # Pour les lignes de détails, faire un span (seules commandes propres au document)
+    table_style = []
     row_num = 1
-    for item in facture.items:
-        if item.details:
+    for details, remise in zip(facture.items.details, facture.items.remises):
+        if details:
             table_style.append(('SPAN', (0, row_num + 1), (-1, row_num + 1)))
             row_num += 2
         else:
             row_num += 1
         
-        if item.remise > 0:
+        if remise > 0:
+            # Libellé "Remise" aligné à droite (la colonne TVA est centrée)
+            table_style.append(('ALIGN', (3, row_num), (3, row_num), 'RIGHT'))
             row_num += 1
     
-    items_table.setStyle(TableStyle(table_style))
+    if table_style:
+        items_table.setStyle(table_style)
     elements.append(items_table)
     elements.append(Spacer(1, 15*mm))
     
     # Totaux
-    totals_style = ParagraphStyle('TotalsStyle', fontSize=10, textColor=colors.black)
-    totals_bold = ParagraphStyle('TotalsBold', fontSize=10, textColor=colors.black, 
-                                 fontName='Helvetica-Bold')
+    totals_style = ps['TotalsStyle']
+    totals_bold = ps['TotalsBold']
     
     totals_data = [
         [Paragraph("Total HT", totals_style), 
@@ -831,13 +870,7 @@ Numéro de TVA: {facture.client_tva}"""
     ]
     
     totals_table = Table(totals_data, colWidths=[13*cm, 4*cm])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        # Ligne sous le total TTC
-        ('LINEBELOW', (0, 2), (-1, 2), 1, colors.black),
-    ]))
+    totals_table.setStyle(TABLE_STYLES['totals'])
     
     elements.append(totals_table)
     
@@ -847,23 +880,20 @@ Numéro de TVA: {facture.client_tva}"""
     
     # Conditions de paiement
     if facture.conditions_paiement:
-        cond_style = ParagraphStyle('CondStyle', fontSize=10, textColor=colors.black, 
-                                   fontName='Helvetica-Bold')
-        text_style = ParagraphStyle('TextStyle', fontSize=10, textColor=colors.black)
+        cond_style = ps['CondStyle']
+        text_style = ps['TextStyle']
         
         elements.append(Paragraph("CONDITIONS DE PAIEMENT", cond_style))
         elements.append(Paragraph(facture.conditions_paiement, text_style))
         if facture.penalites_retard:
             elements.append(Spacer(1, 3*mm))
-            elements.append(Paragraph(facture.penalites_retard, ParagraphStyle('SmallText', 
-                fontSize=8, textColor=colors.grey, fontName='Helvetica')))
+            elements.append(Paragraph(facture.penalites_retard, ps['SmallText']))
         elements.append(Spacer(1, 10*mm))
     
     # Informations bancaires
     if facture.banque_nom:
-        bank_style = ParagraphStyle('BankStyle', fontSize=10, textColor=colors.black, 
-                                   fontName='Helvetica-Bold')
-        text_style = ParagraphStyle('TextStyle', fontSize=10, textColor=colors.black)
+        bank_style = ps['BankStyle']
+        text_style = ps['TextStyle']
         
         elements.append(Paragraph("COORDONNÉES BANCAIRES POUR LE RÈGLEMENT", bank_style))
         elements.append(Spacer(1, 3*mm))
@@ -875,8 +905,7 @@ Numéro de TVA: {facture.client_tva}"""
     # Mentions légales
     elements.append(Spacer(1, 10*mm))
     legal_text = """TVA sur les encaissements. En cas de retard de paiement, seront exigibles, conformément à l'article L441-10 du code de commerce, une indemnité calculée sur la base de trois fois le taux de l'intérêt légal en vigueur ainsi qu'une indemnité forfaitaire pour frais de recouvrement de 40 euros."""
-    elements.append(Paragraph(legal_text, ParagraphStyle('LegalText', 
-        fontSize=8, textColor=colors.grey, fontName='Helvetica', alignment=TA_JUSTIFY)))
+    elements.append(Paragraph(legal_text, ps['LegalText']))
     
     # Construire le PDF avec footer personnalisé
     def build_with_canvas(canvas_obj, doc):
@@ -885,9 +914,10 @@ Numéro de TVA: {facture.client_tva}"""
             'doc_number': facture.numero
         }
     
-    doc.build(elements, canvasmaker=SimpleCanvas, onFirstPage=build_with_canvas)
+    with stage('pdf_build'):
+        doc.build(elements, canvasmaker=SimpleCanvas, onFirstPage=build_with_canvas)
     
-    return filename
+    return sink.finish()
 
 if __name__ == "__main__":
     test_data = {
@@ -0,0 +1,205 @@
+# render_cache.py - Cache des documents rendus, indexé par une empreinte canonique des données
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from storage import atomic_write
+
+# Version de la mise en page : à incrémenter dès qu'un générateur change de rendu
+GENERATOR_VERSION = '4'
+
+# Configuration (modifiable par variables d'environnement)
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR', os.path.join('cache', 'renders'))
+RENDER_CACHE_TTL = int(os.environ.get('RENDER_CACHE_TTL', 3600))  # suit le TTL des logos
+RENDER_CACHE_MEMORY_BYTES = int(os.environ.get('RENDER_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+RENDER_CACHE_DISK_BYTES = int(os.environ.get('RENDER_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+RENDER_CACHE_ENABLED = os.environ.get('RENDER_CACHE_ENABLED', '1').lower() not in ('0', 'false', 'no', 'non')
+
+# En-tête des fichiers sur disque : date de rendu (timestamp)
+_HEADER = struct.Struct('<d')
+
+# Champs calculés, exclus de l'empreinte (ils découlent des articles)
+_CHAMPS_CALCULES = {'items', 'total_ht', 'total_tva', 'total_ttc', 'totaux'}
+
+
+def _canonical_items(items):
+    return [
+        [description, list(details or []), quantite, prix_unitaire, tva_taux, remise]
+        for description, details, quantite, prix_unitaire, tva_taux, remise, _ in items.rows()
+    ]
+
+
+def document_fingerprint(document, doc_type, theme, output_format):
+    """
+    Empreinte sha256 d'un Devis/Facture normalisé (valeurs par défaut déjà appliquées),
+    du thème, du format et de la version des générateurs.
+    Deux requêtes qui produiraient le même fichier ont la même empreinte.
+    """
+    fields = {name: value for name, value in vars(document).items()
+              if name not in _CHAMPS_CALCULES}
+    payload = {
+        'v': GENERATOR_VERSION,
+        'type': doc_type,
+        'theme': theme,
+        'format': output_format,
+        'fields': fields,
+        'items': _canonical_items(document.items),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'),
+                           ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Cache à deux niveaux des documents rendus (octets PDF/DOCX) :
+    - mémoire : LRU borné en octets, propre au processus
+    - disque : fichiers partagés entre les workers, éviction LRU au-delà du quota
+    """
+
+    def __init__(self, directory=RENDER_CACHE_DIR, ttl=RENDER_CACHE_TTL,
+                 memory_bytes=RENDER_CACHE_MEMORY_BYTES, disk_bytes=RENDER_CACHE_DISK_BYTES,
+                 enabled=RENDER_CACHE_ENABLED):
+        self.directory = directory
+        self.ttl = ttl
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+
+        self._memory = OrderedDict()  # clé -> (octets, date de rendu)
+        self._memory_used = 0
+        self._disk_used = None  # calculé au premier besoin
+        self._lock = threading.Lock()
+
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    # --- Niveau mémoire -----------------------------------------------------
+
+    def _memory_put(self, key, data, created_at):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_used -= len(previous[0])
+            self._memory[key] = (data, created_at)
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes:
+                _, (evicted, _) = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+                self.stats['evictions'] += 1
+
+    # --- Niveau disque ------------------------------------------------------
+
+    def _disk_get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                data = f.read()
+            os.utime(path, None)  # ordre LRU (mtime = dernier accès)
+        except OSError:
+            return None
+        if len(header) != _HEADER.size or not data:
+            return None
+        # La date de rendu est stockée en en-tête : mtime sert à l'ordre LRU
+        created_at, = _HEADER.unpack(header)
+        return data, created_at
+
+    def _disk_usage(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _disk_put(self, key, data, created_at):
+        try:
+            atomic_write(self._path(key), _HEADER.pack(created_at) + data)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du cache de rendu: {e}")
+            return
+
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = sum(size for _, size, _ in self._disk_usage())
+            else:
+                self._disk_used += len(data)
+            over_quota = self._disk_used > self.disk_bytes
+        if over_quota:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        """Supprimer les rendus les moins récemment utilisés jusqu'à 90 % du quota"""
+        entries = sorted(self._disk_usage())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats['evictions'] += 1
+        with self._lock:
+            self._disk_used = total
+
+    # --- API publique -------------------------------------------------------
+
+    def get(self, key):
+        """Retourner les octets rendus pour cette clé, ou None"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                if now - cached[1] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return cached[0]
+                self._memory.pop(key)
+                self._memory_used -= len(cached[0])
+
+        cached = self._disk_get(key)
+        if cached is not None and now - cached[1] < self.ttl:
+            self.stats['disk_hits'] += 1
+            self._memory_put(key, cached[0], cached[1])
+            return cached[0]
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, data):
+        """Mémoriser un rendu (mémoire + disque)"""
+        if not self.enabled or not data:
+            return
+        created_at = time.time()
+        self._memory_put(key, data, created_at)
+        self._disk_put(key, data, created_at)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+
+
+# Instance partagée
+render_cache = RenderCache()
@@ -0,0 +1,241 @@
+# render_pool.py - Pool de processus dédié au rendu PDF/DOCX (utilise tous les cœurs)
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import metrics
+from models import Devis, DevisItem, Facture, LineItems
+
+# Configuration (modifiable par variables d'environnement)
+# RENDER_POOL_SIZE=0 désactive le pool : rendu dans le processus de la requête
+RENDER_POOL_SIZE = int(os.environ.get('RENDER_POOL_SIZE', os.cpu_count() or 1))
+RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 30))
+RENDER_QUEUE_MAX = int(os.environ.get('RENDER_QUEUE_MAX', 2 * RENDER_POOL_SIZE))
+RENDER_POOL_START_METHOD = os.environ.get('RENDER_POOL_START_METHOD', 'spawn')
+# Rendus dépassés qui occupent encore un worker : à partir de ce nombre, les workers
+# sont arrêtés et le pool redémarré (0 = jamais)
+RENDER_RECYCLE_AFTER = int(os.environ.get('RENDER_RECYCLE_AFTER', max(1, RENDER_POOL_SIZE // 2)))
+
+MODELES = {
+    'devis': Devis,
+    'facture': Facture,
+}
+
+# Champs calculés, reconstruits dans le worker
+_CHAMPS_CALCULES = {'items', 'total_ht', 'total_tva', 'total_ttc', 'totaux'}
+
+
+class RenderUnavailable(Exception):
+    """Le rendu ne peut pas être servi maintenant (réponse 503 + Retry-After)"""
+    retry_after = 1
+
+
+class RenderPoolSaturated(RenderUnavailable):
+    """Trop de rendus en cours ou en attente"""
+
+
+class RenderTimeout(RenderUnavailable):
+    """Le rendu a dépassé RENDER_TIMEOUT"""
+    retry_after = 5
+
+
+# --- Spécification sérialisée d'un document ---------------------------------
+
+def document_spec(document, doc_type, theme='bleu', output_format='pdf'):
+    """Décrire un document par des types simples (transmis au worker)"""
+    return {
+        'type': doc_type,
+        'theme': theme,
+        'format': output_format,
+        'fields': {name: value for name, value in vars(document).items()
+                   if name not in _CHAMPS_CALCULES},
+        # Colonnes des articles : arrays compacts, sérialisés en un bloc
+        'items': document.items.to_columns(),
+    }
+
+
+def document_from_spec(spec):
+    """Reconstruire le Devis/Facture à partir de sa spécification"""
+    document = MODELES[spec['type']](**spec['fields'])
+    document.items = LineItems.from_columns(spec['items'])
+    document.calculate_totals()
+    return document
+
+
+# --- Côté worker ------------------------------------------------------------
+
+def _warm_worker():
+    """Initialisation du worker : imports lourds et premier rendu de chaque format"""
+    # L'import construit aussi le registre des styles PDF de tous les thèmes
+    from rendering import render_document
+    from docx_generator import preload_docx_skeletons
+
+    try:
+        preload_docx_skeletons()
+    except Exception as e:
+        print(f"Erreur lors de la préparation des squelettes DOCX: {e}")
+
+    warmup = Devis(
+        'WARMUP', '01/01/2025', '31/01/2025',
+        'Préchauffage', 'Adresse', 'Ville', 'contact@example.com', '00000000000000',
+        'Client', 'Adresse', 'Ville', '00000000000000', 'FR00000000000',
+        penalites_retard='Pénalités', conditions_paiement='Paiement à 30 jours'
+    )
+    warmup.items.append(DevisItem('Préchauffage', details=['Détail'], quantite=1, prix_unitaire=1, remise=0.5))
+    warmup.calculate_totals()
+    for output_format in ('pdf', 'docx'):
+        try:
+            render_document(warmup, 'devis', 'bleu', output_format)
+        except Exception as e:
+            print(f"Erreur lors du préchauffage du worker ({output_format}): {e}")
+
+
+def _render_spec(spec):
+    """
+    Tâche exécutée dans le worker : retourne les octets du document et la durée
+    de chaque étape (enregistrée ensuite dans les métriques du processus web)
+    """
+    from rendering import render_document
+
+    metrics.start_capture()
+    try:
+        document = document_from_spec(spec)
+        buffer = render_document(document, spec['type'], spec['theme'], spec['format'], output=BytesIO())
+    finally:
+        stages = metrics.stop_capture()
+    return buffer.getvalue(), stages
+
+
+# --- Côté application -------------------------------------------------------
+
+class RenderPool:
+    """
+    ProcessPoolExecutor avec workers préchauffés, file d'attente bornée et timeout.
+    Le pool est démarré au premier rendu.
+
+    Un rendu qui dépasse le timeout ne peut pas être interrompu : le client reçoit un 503
+    mais le worker continue le rendu et garde sa place. Quand recycle_after rendus
+    dépassés tournent encore, les workers sont arrêtés et le pool redémarré (les autres
+    rendus en cours reçoivent alors aussi un 503) : un document pathologique ne peut
+    pas bloquer tous les workers.
+    """
+
+    def __init__(self, size=RENDER_POOL_SIZE, timeout=RENDER_TIMEOUT,
+                 max_queue=RENDER_QUEUE_MAX, start_method=RENDER_POOL_START_METHOD,
+                 recycle_after=RENDER_RECYCLE_AFTER):
+        self.size = size
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.start_method = start_method
+        self.recycle_after = recycle_after
+
+        self._executor = None
+        self._lock = threading.Lock()
+        # Places disponibles : rendus en cours + rendus en attente
+        self._slots = threading.BoundedSemaphore(max(1, size + max_queue))
+        self.in_flight = 0
+        # Rendus dépassés encore en cours dans un worker
+        self._overdue = set()
+        self.stats = {'timeouts': 0, 'recycled': 0}
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_warm_worker
+                )
+            return self._executor
+
+    def _reset_executor(self, broken, terminate=False):
+        """Abandonner un exécuteur ; terminate=True arrête aussi ses workers (rendus en cours)"""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        # shutdown() n'interrompt pas les tâches en cours : on arrête les processus
+        processes = list((broken._processes or {}).values()) if terminate else []
+        broken.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def _overdue_done(self, future):
+        with self._lock:
+            self._overdue.discard(future)
+
+    def _timed_out(self, executor, future):
+        """Rendu dépassé : annulé s'il attend encore, sinon suivi jusqu'à sa fin"""
+        self.stats['timeouts'] += 1
+        if future.cancel():
+            return
+        with self._lock:
+            self._overdue.add(future)
+            overdue = len(self._overdue)
+        future.add_done_callback(self._overdue_done)
+        if self.recycle_after and overdue >= self.recycle_after:
+            print(f"Erreur : {overdue} rendus dépassés bloquent le pool, redémarrage des workers")
+            with self._lock:
+                self._overdue.clear()
+            self.stats['recycled'] += 1
+            self._reset_executor(executor, terminate=True)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def render(self, document, doc_type, theme='bleu', output_format='pdf', block=False):
+        """
+        Rendre un document dans le pool et retourner ses octets.
+        block=False : lève RenderPoolSaturated si la file est pleine (requêtes HTTP)
+        block=True : attend une place jusqu'au timeout (traitements par lot)
+        """
+        acquired = self._slots.acquire(timeout=self.timeout) if block else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise RenderPoolSaturated("Serveur de rendu saturé, réessayez plus tard")
+
+        with self._lock:
+            self.in_flight += 1
+
+        # Jusqu'à ce que le rappel de la tâche la rende, la place est libérée ici en cas d'erreur
+        try:
+            spec = document_spec(document, doc_type, theme, output_format)
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_render_spec, spec)
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                raise RenderPoolSaturated("Pool de rendu en cours de redémarrage")
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            data, stages = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self._timed_out(executor, future)
+            raise RenderTimeout(f"Rendu trop long (> {self.timeout:g} s)")
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise RenderPoolSaturated("Pool de rendu en cours de redémarrage")
+
+        metrics.merge_stages(stages)
+        return data
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Instance partagée
+render_pool = RenderPool()
@@ -0,0 +1,86 @@
+# rendering.py - Point d'entrée unique pour rendre un devis ou une facture en mémoire
+import time
+from io import BytesIO
+from pdf_generator_students import generate_pdf_devis, generate_pdf_facture
+from docx_generator import generate_docx_devis, generate_docx_facture
+from render_cache import render_cache, document_fingerprint
+from render_pool import render_pool
+from admission import admission
+from metrics import RENDERS_IN_FLIGHT, observe_render
+
+FORMATS_SUPPORTES = ['pdf', 'docx']
+
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+
+# (type de document, format) -> générateur
+GENERATEURS = {
+    ('devis', 'pdf'): generate_pdf_devis,
+    ('devis', 'docx'): generate_docx_devis,
+    ('facture', 'pdf'): generate_pdf_facture,
+    ('facture', 'docx'): generate_docx_facture,
+}
+
+
+def render_document(document, doc_type, theme='bleu', output_format='pdf', output=None):
+    """
+    Rendre un Devis ou une Facture dans un flux (BytesIO par défaut).
+    Le flux retourné est rembobiné et prêt à être envoyé avec send_file.
+    """
+    generator = GENERATEURS.get((doc_type, output_format))
+    if generator is None:
+        raise ValueError(f"Format non supporté: {output_format}")
+
+    if output is None:
+        output = BytesIO()
+    return generator(document, theme=theme, output=output)
+
+
+def render_bytes(document, doc_type, theme='bleu', output_format='pdf', block=False, deadline=None):
+    """
+    Rendre un document en octets : dans le pool de processus s'il est activé
+    (peut lever RenderUnavailable), sinon directement dans ce processus.
+    block=False (requêtes HTTP) : passe par le contrôle d'admission, à terminer avant
+    deadline (time.monotonic()) ; les traitements par lot attendent dans le pool.
+    """
+    if (doc_type, output_format) not in GENERATEURS:
+        raise ValueError(f"Format non supporté: {output_format}")
+    
+    ticket = None if block else admission.admit(output_format, len(document.items), deadline)
+    started = time.perf_counter()
+    RENDERS_IN_FLIGHT.inc()
+    try:
+        if render_pool.enabled:
+            data = render_pool.render(document, doc_type, theme, output_format, block=block)
+        else:
+            data = render_document(document, doc_type, theme, output_format).getvalue()
+    finally:
+        RENDERS_IN_FLIGHT.dec()
+        if ticket is not None:
+            ticket.release()
+    observe_render(doc_type, output_format, time.perf_counter() - started, len(data))
+    return data
+
+
+def render_cached(document, doc_type, theme='bleu', output_format='pdf', key=None, block=False, deadline=None):
+    """
+    Rendre un document en octets en passant par le cache de rendu.
+    Retourne (octets, clé/ETag, 'hit' ou 'miss').
+    """
+    if key is None:
+        key = document_fingerprint(document, doc_type, theme, output_format)
+
+    data = render_cache.get(key)
+    if data is not None:
+        return data, key, 'hit'
+
+    data = render_bytes(document, doc_type, theme, output_format, block=block, deadline=deadline)
+    render_cache.put(key, data)
+    return data, key, 'miss'
+
+
+def download_name(doc_type, numero, theme, output_format):
+    """Nom du fichier proposé au téléchargement"""
+    return f"{doc_type}_{numero}_{theme}.{output_format}"
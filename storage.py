@@ -0,0 +1,225 @@
+# storage.py - Gestion du dossier generated/ : noms uniques, sous-dossiers hachés, rétention bornée
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl  # verrou inter-processus (Linux / macOS)
+except ImportError:  # Windows : un seul nettoyeur par processus
+    fcntl = None
+
+# Configuration (modifiable par variables d'environnement)
+GENERATED_FOLDER = os.environ.get('GENERATED_FOLDER', 'generated')
+GENERATED_MAX_BYTES = int(os.environ.get('GENERATED_MAX_BYTES', 512 * 1024 * 1024))
+GENERATED_MAX_AGE = int(os.environ.get('GENERATED_MAX_AGE', 24 * 3600))  # secondes
+GENERATED_SWEEP_INTERVAL = int(os.environ.get('GENERATED_SWEEP_INTERVAL', 60))
+
+# Après une éviction, on redescend sous ce pourcentage du quota
+LOW_WATERMARK = 0.9
+
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9._-]+')
+_SAFE_EXTENSION = re.compile(r'^\.[A-Za-z0-9]{1,8}$')
+
+
+def atomic_write(path, data):
+    """Écrire un fichier de façon atomique (lecteurs concurrents dans d'autres workers)"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def safe_filename(name):
+    """Nettoyer un nom de fichier (un numéro de devis peut contenir '/' ou '..')"""
+    name = _UNSAFE_CHARS.sub('_', name).strip('._')
+    return name or 'document'
+
+
+class StorageManager:
+    """
+    Stockage borné pour les documents générés :
+    - chaque fichier reçoit un nom unique (plus de collision entre deux requêtes)
+    - les fichiers sont répartis dans des sous-dossiers hachés (ab/cd/...)
+    - un thread de fond supprime les fichiers trop vieux, puis les moins
+      récemment utilisés tant que le quota d'octets est dépassé
+    """
+
+    def __init__(self, root=GENERATED_FOLDER, max_bytes=GENERATED_MAX_BYTES,
+                 max_age=GENERATED_MAX_AGE, sweep_interval=GENERATED_SWEEP_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+
+        # Estimation des octets écrits depuis le dernier balayage
+        self._pending_bytes = 0
+        self._last_total = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Noms et chemins ----------------------------------------------------
+
+    def unique_name(self, filename):
+        """devis_D-1_bleu.pdf -> devis_D-1_bleu_<id unique>.pdf"""
+        stem, ext = os.path.splitext(filename)
+        if not _SAFE_EXTENSION.match(ext):
+            ext = ''
+        return f"{safe_filename(stem)}_{uuid.uuid4().hex[:12]}{ext}"
+
+    def path_for(self, name):
+        """Chemin haché : generated/ab/cd/<name>"""
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], name)
+
+    def new_path(self, filename):
+        """Réserver un chemin unique pour un nouveau document (dossiers créés)"""
+        path = self.path_for(self.unique_name(filename))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    # --- Écriture / lecture -------------------------------------------------
+
+    def store(self, filename, data):
+        """Écrire un document et retourner son chemin"""
+        path = self.new_path(filename)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.record_write(len(data))
+        return path
+
+    def record_write(self, size):
+        """Signaler des octets écrits ; réveille le nettoyeur si le quota est menacé"""
+        with self._lock:
+            self._pending_bytes += size
+            over_quota = self._last_total + self._pending_bytes > self.max_bytes
+        if over_quota:
+            self._wakeup.set()
+
+    def touch(self, path):
+        """Marquer un fichier comme récemment utilisé (ordre LRU)"""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    # --- Nettoyage ----------------------------------------------------------
+
+    def _scan(self):
+        """Lister (dernier accès, taille, chemin) pour tous les documents stockés"""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            # Ignorer les dossiers cachés (caches, verrous...)
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((max(st.st_mtime, st.st_atime), st.st_size, path))
+        return files
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        # Supprimer les sous-dossiers devenus vides
+        for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            if os.path.abspath(directory) == os.path.abspath(self.root):
+                break
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+        return True
+
+    def sweep(self):
+        """Appliquer la rétention (âge puis quota LRU) ; retourne le nombre de fichiers supprimés"""
+        lock_file = self._acquire_sweep_lock()
+        if lock_file is False:
+            return 0  # un autre worker est déjà en train de nettoyer
+        try:
+            now = time.time()
+            removed = 0
+            kept = []
+            for last_used, size, path in self._scan():
+                if self.max_age and now - last_used > self.max_age:
+                    removed += self._remove(path)
+                else:
+                    kept.append((last_used, size, path))
+
+            total = sum(size for _, size, _ in kept)
+            if self.max_bytes and total > self.max_bytes:
+                target = self.max_bytes * LOW_WATERMARK
+                kept.sort()  # les moins récemment utilisés d'abord
+                for last_used, size, path in kept:
+                    if total <= target:
+                        break
+                    if self._remove(path):
+                        total -= size
+                        removed += 1
+
+            with self._lock:
+                self._last_total = total
+                self._pending_bytes = 0
+            return removed
+        finally:
+            if lock_file:
+                lock_file.close()
+
+    def _acquire_sweep_lock(self):
+        """Verrou non bloquant partagé entre les workers gunicorn"""
+        if fcntl is None:
+            return None
+        os.makedirs(self.root, exist_ok=True)
+        lock_file = open(os.path.join(self.root, '.sweep.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        return lock_file
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Erreur lors du nettoyage de {self.root}: {e}")
+            self._wakeup.wait(self.sweep_interval)
+            self._wakeup.clear()
+
+    def start_sweeper(self):
+        """Démarrer le nettoyeur en arrière-plan (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='generated-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Instance partagée
+storage = StorageManager()
@@ -0,0 +1,125 @@
+# totals.py - Totaux HT / TVA / TTC en centimes exacts, ventilés par taux de TVA
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+# Montants en centimes (int) ; par_taux : tuple de (taux, ht, tva) trié par taux
+Totals = namedtuple('Totals', ['ht', 'tva', 'ttc', 'par_taux'])
+
+TOTAUX_VIDES = Totals(0, 0, 0, ())
+
+
+def _decimal(value):
+    """Valeur saisie -> Decimal (repr : 0.29 et non 0.28999999999999998)"""
+    return value if isinstance(value, Decimal) else Decimal(repr(value))
+
+
+def _round_cents(amount):
+    """Montant en centimes (Decimal) -> int, arrondi commercial (demi vers le haut)"""
+    return int(amount.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_cents(value):
+    """Montant en euros -> centimes (int)"""
+    return _round_cents(_decimal(value) * 100)
+
+
+def to_euros(cents):
+    """Centimes -> euros (float le plus proche : f"{x:.2f}" redonne les centimes exacts)"""
+    return cents / 100
+
+
+def line_cents(quantite, prix_unitaire, remise=0):
+    """Total HT d'une ligne en centimes : quantité × prix unitaire - remise"""
+    if float(quantite).is_integer():
+        prix, reste = round(prix_unitaire * 100), round(remise * 100)
+        if prix / 100 == prix_unitaire and reste / 100 == remise:
+            return int(quantite) * prix - reste
+    return _round_cents((_decimal(quantite) * _decimal(prix_unitaire) - _decimal(remise)) * 100)
+
+
+def vat_cents(ht_cents, taux):
+    """TVA en centimes d'un montant HT (centimes) au taux donné (en %)"""
+    return _round_cents(Decimal(ht_cents) * _decimal(taux) / 100)
+
+
+def _exact_cents(values):
+    """
+    Colonne de montants -> centimes (int), ou None si une valeur a plus de deux
+    décimales. c / 100 est le float le plus proche de c centimes : l'égalité garantit
+    que la valeur saisie était exactement c centimes.
+    """
+    cents = [round(value * 100) for value in values]
+    for c, value in zip(cents, values):
+        if c / 100 != value:
+            return None
+    return cents
+
+
+def _lines_fast(items):
+    """
+    Chemin rapide, colonne par colonne : quantités entières, prix et remises au
+    centime près. Tout est alors calculé en entiers, sans Decimal par ligne.
+    """
+    quantites = items.quantites
+    if not all(map(float.is_integer, quantites)):
+        return None
+    prix = _exact_cents(items.prix_unitaires)
+    if prix is None:
+        return None
+    remises = _exact_cents(items.remises)
+    if remises is None:
+        return None
+    return [int(q) * p - r for q, p, r in zip(quantites, prix, remises)]
+
+
+def _lines_exact(items):
+    """Chemin général : une ligne à la fois en Decimal"""
+    return [line_cents(q, p, r) for q, p, r in zip(items.quantites, items.prix_unitaires, items.remises)]
+
+
+def lines_cents(items):
+    """Total HT de chaque ligne en centimes (liste d'int)"""
+    lines = _lines_fast(items)
+    return lines if lines is not None else _lines_exact(items)
+
+
+def group_by_rate(rates, lines):
+    """Regrouper les lignes par taux : {taux: [nombre de lignes, total HT en centimes]}"""
+    first_rate = rates[0] if rates else None
+    if rates.count(first_rate) == len(rates):
+        # Un seul taux (cas le plus courant) : une somme, sans regroupement
+        return {first_rate: [len(lines), sum(lines)]} if lines else {}
+    buckets = {}
+    for taux, cents in zip(rates, lines):
+        bucket = buckets.get(taux)
+        if bucket is None:
+            buckets[taux] = [1, cents]
+        else:
+            bucket[0] += 1
+            bucket[1] += cents
+    return buckets
+
+
+def _rate_value(taux):
+    return int(taux) if float(taux).is_integer() else taux
+
+
+def totals_from_buckets(buckets):
+    """
+    Totaux à partir des montants HT par taux : la TVA est arrondie une fois par
+    taux, sur le total HT de ce taux. Coût proportionnel au nombre de taux.
+    """
+    par_taux = tuple(
+        (_rate_value(taux), ht, vat_cents(ht, taux))
+        for taux, (_, ht) in sorted(buckets.items())
+    )
+    total_ht = sum(ht for _, ht, _ in par_taux)
+    total_tva = sum(tva for _, _, tva in par_taux)
+    return Totals(total_ht, total_tva, total_ht + total_tva, par_taux)
+
+
+def compute_totals(items):
+    """Totaux d'une liste d'articles (LineItems), recalculés entièrement en un passage"""
+    if not items:
+        return TOTAUX_VIDES
+    return totals_from_buckets(group_by_rate(items.tva_taux, lines_cents(items)))